@@ -9,10 +9,20 @@ import warnings
 import sys
 import os
 import time
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from flask import Flask, jsonify
-# Use the installed pydataxm package instead of local module
-from pydataxm.pydataxm import ReadDB
+# ReadDB de pydataxm (o un sustituto grabado/sintético según XM_BACKEND, ver xm_replay.py)
+from xm_replay import fabrica_api_xm
+from xm_data import (ClienteXM, CacheCompartida, CacheConsultas, CatalogoXM, CircuitoXM, MetricasXM,
+                     CacheVistas, ResultadosServidor, SondaXM, FECHAS_CAPACIDAD)
+from xm_store import AgregadosCaudal, AlmacenLocal, IndiceRios
+from participacion import agregar_participacion, participacion
+from formato import format_number, format_numbers
+from submuestreo import submuestrear
+from figuras import cache_figuras, compactar_serie, memorizar_figura, modo_render
+from compresion import instalar_compresion
 warnings.filterwarnings("ignore")
 
 # Inicializar la aplicación Dash con tema Bootstrap
@@ -21,14 +31,6 @@ warnings.filterwarnings("ignore")
 LAST_UPDATE = time.strftime('%Y-%m-%d %H:%M:%S')
 
 # Funciones auxiliares para formateo de datos
-def format_number(value):
-    """Formatear números con separadores de miles usando puntos"""
-    if pd.isna(value) or not isinstance(value, (int, float)):
-        return value
-    
-    # Formatear con separador de miles usando puntos (formato colombiano)
-    return f"{value:,.2f}".replace(",", ".")
-
 def format_date(date_value):
     """Formatear fechas para mostrar solo la fecha sin hora"""
     if pd.isna(date_value):
@@ -46,9 +48,22 @@ def format_date(date_value):
     else:
         return date_value
 
+MESES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+         'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+def format_month(date_value):
+    """Nombre del mes de una fecha ('2021-04-01' -> 'abril 2021'), sin depender del locale"""
+    try:
+        fecha = pd.Timestamp(date_value)
+    except Exception:
+        return date_value
+    return f"{MESES[fecha.month - 1]} {fecha.year}"
+
 # Crear servidor Flask personalizado
 server = Flask(__name__)
 server.config['SECRET_KEY'] = 'hidrologia-mme-colombia-2025'
+# Respuestas de callbacks y /api/* comprimidas (gzip, o brotli si está instalado)
+instalar_compresion(server)
 
 # Inicializar la aplicación Dash con tema Bootstrap y servidor Flask personalizado
 app = dash.Dash(__name__, 
@@ -72,21 +87,52 @@ def health_check():
         'version': '3.3'
     }), 200
 
+@server.route('/ready')
+def readiness_check():
+    """Endpoint de disponibilidad: catálogos y ventana por defecto ya calentados"""
+    listo = all(ESTADO_CALENTAMIENTO.values())
+    return jsonify({
+        'status': 'ready' if listo else 'warming',
+        'checks': ESTADO_CALENTAMIENTO,
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+    }), 200 if listo else 503
+
 @server.route('/api/status')
 def api_status():
     """Endpoint de estado de la API XM"""
     try:
-        # Verificar si la API XM está funcionando
-        if objetoAPI is not None:
-            # Hacer una consulta rápida para verificar conectividad
-            test_data = objetoAPI.request_data('ListadoRios', 'Sistema', '2024-01-01', '2024-01-02')
-            api_status = 'connected' if test_data is not None and not test_data.empty else 'disconnected'
+        # Estado según la última sonda en segundo plano, el circuito y los catálogos
+        # (nunca se consulta XM dentro de esta petición)
+        circuito = objetoAPI.circuito.resumen() if objetoAPI is not None and objetoAPI.circuito else None
+        sonda = sonda_xm.estado() if sonda_xm is not None else None
+        if sonda is not None and sonda['estado'] != 'desconocido':
+            conectado = sonda['estado'] == 'connected'
         else:
+            conectado = objetoAPI is not None and catalogo.cargado and catalogo.ultimo_error is None
+        if not conectado:
             api_status = 'disconnected'
+        elif circuito is not None and circuito['estado'] != 'cerrado':
+            api_status = 'degraded'
+        else:
+            api_status = 'connected'
         
         return jsonify({
             'status': 'ok',
             'api_xm_status': api_status,
+            'sonda': sonda,
+            # Latencias, circuito y contadores de caché son de este worker (ver 'worker')
+            'latencias_xm': objetoAPI.metricas.resumen() if objetoAPI is not None and objetoAPI.metricas else {},
+            'catalogos': catalogo.estado(),
+            'circuito': circuito,
+            'cache': {
+                'memoria': objetoAPI.cache.estadisticas() if objetoAPI is not None and objetoAPI.cache else None,
+                'compartida': objetoAPI.cache_compartida.estadisticas()
+                              if objetoAPI is not None and objetoAPI.cache_compartida else None,
+                'resultados': resultados_servidor.estadisticas(),
+                'figuras': cache_figuras.estadisticas(),
+                'vistas': cache_vistas.estadisticas()
+            },
+            'worker': os.getpid(),
             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
         }), 200
     except Exception as e:
@@ -109,6 +155,7 @@ def app_info():
         'data_source': 'XM - Expertos en Mercados',
         'endpoints': {
             'health': '/health',
+            'ready': '/ready',
             'api_status': '/api/status',
             'app_info': '/api/info'
         }
@@ -119,34 +166,192 @@ def app_info():
 
 app.title = "Dashboard Hidrológico - Ministerio de Minas y Energía de Colombia"
 
-# Inicializar API XM
+# Inicializar API XM (ReadDB se crea en la primera consulta, no al importar)
 import traceback
 try:
-    objetoAPI = ReadDB()
-    print("API XM inicializada correctamente")
+    # ReadDB envuelto con caché en memoria, almacén local incremental e índice de ríos (ver xm_data.py).
+    # Con XM_SOLO_LECTURA=true el dashboard solo lee el almacén que llena `python server.py ingest`.
+    # La caché compartida (SQLite) evita que cada worker de gunicorn repita las mismas descargas.
+    # Si XM está lento o caído se sirven los últimos datos buscados (marcados como desactualizados)
+    almacen = AlmacenLocal()
+    usar_cache_compartida = os.environ.get('XM_CACHE_COMPARTIDA', 'True').lower() == 'true'
+    objetoAPI = ClienteXM(fabrica_api=fabrica_api_xm, almacen=almacen, cache=CacheConsultas(),
+                          cache_compartida=CacheCompartida() if usar_cache_compartida else None,
+                          indice_rios=IndiceRios(almacen=almacen), agregados=AgregadosCaudal(almacen),
+                          solo_lectura=os.environ.get('XM_SOLO_LECTURA', 'False').lower() == 'true',
+                          circuito=CircuitoXM(), servir_obsoletos=True, metricas=MetricasXM())
 except Exception as e:
     print(f"Error al inicializar API XM: {e}")
     traceback.print_exc()
     objetoAPI = None
 
+# Catálogos de referencia (ListadoRios / ListadoEmbalses) en memoria, con refresco periódico
+catalogo = CatalogoXM(objetoAPI)
+catalogo.iniciar_refresco()
 
+# Sondeo de XM en segundo plano: /api/status responde con el último resultado
+sonda_xm = None
+if objetoAPI is not None and not objetoAPI.solo_lectura:
+    # Un solo worker por host sondea; los demás leen su estado de la caché compartida
+    sonda_xm = SondaXM(objetoAPI, compartida=objetoAPI.cache_compartida)
+    sonda_xm.iniciar()
 
-# Obtener la relación río-región directamente desde la API XM
+
+# Relación río-región normalizada, servida desde el catálogo en memoria
 def get_rio_region_dict():
-    try:
-        df = objetoAPI.request_data('ListadoRios', 'Sistema', '2024-01-01', '2024-01-02')
-        if 'Values_Name' in df.columns and 'Values_HydroRegion' in df.columns:
-            # Normalizar nombres igual que antes
-            df['Values_Name'] = df['Values_Name'].str.strip().str.upper()
-            df['Values_HydroRegion'] = df['Values_HydroRegion'].str.strip().str.title()
-            return dict(sorted(zip(df['Values_Name'], df['Values_HydroRegion'])))
-        else:
-            return {}
-    except Exception as e:
-        print(f"Error obteniendo relación río-región desde la API: {e}")
+    return catalogo.rio_region
+
+def ventana_por_defecto():
+    """Rango de fechas de la vista por defecto (últimos 30 días)"""
+    return (date.today() - timedelta(days=30)).strftime('%Y-%m-%d'), date.today().strftime('%Y-%m-%d')
+
+# Pool para consultar en paralelo fuentes independientes dentro de un callback
+POOL_FUENTES = ThreadPoolExecutor(max_workers=int(os.environ.get('XM_POOL_FUENTES', 8)), thread_name_prefix='fuente-xm')
+
+# Timeout (segundos) de cada fuente; al vencerse la vista se arma con lo que llegó
+TIMEOUT_FUENTES = {
+    'caudal': float(os.environ.get('XM_TIMEOUT_CAUDAL', 60)),
+    'capacidad': float(os.environ.get('XM_TIMEOUT_CAPACIDAD', 15)),
+}
+
+# Rangos más largos que esto (días) se grafican con totales mensuales
+DIAS_SERIE_MENSUAL = int(os.environ.get('XM_DIAS_SERIE_MENSUAL', 3 * 365))
+
+def get_series_nacionales(start_date, end_date):
+    """
+    Serie nacional y serie por región de AporCaudal leídas de los agregados
+    materializados (diarias, o mensuales en rangos largos). Devuelve
+    (nacional, regiones, frecuencia).
+    """
+    dias = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days
+    frecuencia = 'M' if dias > DIAS_SERIE_MENSUAL else 'D'
+    nacional = objetoAPI.serie_agregada('nacional', start_date, end_date, frecuencia)
+    regiones = objetoAPI.serie_agregada('region', start_date, end_date, frecuencia)
+    return nacional, regiones, frecuencia
+
+def indice_fecha_region(df, frecuencia='D'):
+    """
+    Matriz fecha×región de una serie con Date, Region y Value para el modal
+    del timeline: {'regiones': [...], 'fechas': {'YYYY-MM-DD': [valor por
+    región o None]}, 'frecuencia': 'D' | 'M'}. Con 'M' cada fecha es el
+    primer día de un mes y el valor es el total del mes. Se arma una vez por
+    consulta; un clic solo busca su fecha.
+    """
+    if df is None or df.empty or not {'Date', 'Region', 'Value'}.issubset(df.columns):
         return {}
+    fechas = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+    matriz = df.groupby([fechas, 'Region'], observed=True)['Value'].sum().unstack('Region')
+    matriz = matriz.astype(object).where(matriz.notna(), None)
+    return {
+        'regiones': [str(region) for region in matriz.columns],
+        'fechas': dict(zip(matriz.index, matriz.to_numpy().tolist())),
+        'frecuencia': frecuencia,
+    }
+
+# Índices del modal guardados en el servidor; el navegador solo guarda la referencia
+resultados_servidor = ResultadosServidor()
+
+def referencia_indice_modal(consulta, data, frecuencia='D'):
+    """
+    Guardar en el servidor el índice fecha×región de una vista y devolver la
+    referencia {'token', 'consulta'} que va al dcc.Store del navegador.
+    consulta = ('nacional' | 'region', start_date, end_date, region)
+    """
+    return resultados_servidor.guardar(consulta, indice_fecha_region(data, frecuencia))
+
+def calcular_indice_modal(consulta):
+    """Recalcular el índice de una referencia que este worker no tiene guardada"""
+    tipo, start_date, end_date, region = consulta
+    if tipo == 'nacional':
+        _, regiones, frecuencia = get_series_nacionales(start_date, end_date)
+        return indice_fecha_region(regiones, frecuencia)
+    if tipo != 'region':
+        raise ValueError(f"Consulta del modal desconocida: {tipo}")
+    data = objetoAPI.request_data('AporCaudal', 'Rio', start_date, end_date)
+    if data is None or data.empty or 'Name' not in data.columns:
+        return {}
+    data = data.assign(Region=data['Name'].map(get_rio_region_dict()))
+    if region:
+        data = data[data['Region'] == region]
+    return indice_fecha_region(data)
+
+def aviso_datos_desactualizados(consultas):
+    """
+    Alerta si alguna de las consultas (coleccion, metrica, inicio, fin) se
+    respondió con datos guardados porque XM no estaba disponible
+    """
+    if objetoAPI is None:
+        return None
+    marcas = [objetoAPI.desactualizado(*consulta) for consulta in consultas]
+    marcas = [marca for marca in marcas if marca is not None]
+    if not marcas:
+        return None
+    guardados = [marca for marca in marcas if marca]
+    detalle = (f" (guardados el {time.strftime('%Y-%m-%d %H:%M', time.localtime(min(guardados)))})"
+               if guardados else "")
+    return dbc.Alert([
+        html.I(className="bi bi-clock-history me-2"),
+        f"XM no responde: se muestran los últimos datos disponibles{detalle}. "
+        "Se actualizarán automáticamente cuando XM se recupere."
+    ], color="warning", className="text-center py-2 mb-3", style={"fontSize": "0.9rem"})
+
+# Vistas ya armadas por entradas; se descartan cuando llegan datos nuevos al almacén
+cache_vistas = CacheVistas(version=objetoAPI.almacen.version
+                           if objetoAPI is not None and objetoAPI.almacen is not None else None)
+
+def vista_completa(contenido):
+    """
+    Una vista se guarda en cache_vistas solo si se armó completa: sin alertas
+    (errores, sin datos) ni tarjetas de fuentes que no respondieron
+    """
+    pendientes = [contenido]
+    while pendientes:
+        componente = pendientes.pop()
+        if isinstance(componente, (list, tuple)):
+            pendientes.extend(componente)
+            continue
+        if isinstance(componente, dbc.Alert):
+            return False
+        if 'fuente-no-disponible' in (getattr(componente, 'className', None) or ''):
+            return False
+        hijos = getattr(componente, 'children', None)
+        if hijos is not None and not isinstance(hijos, str):
+            pendientes.append(hijos)
+    return True
 
-RIO_REGION = get_rio_region_dict()
+def vista_memorizada(clave, construir, consultas):
+    """Contenido de un callback de vista desde cache_vistas, con el aviso de desactualizados al día"""
+    contenido = cache_vistas.obtener(
+        clave, construir,
+        guardable=lambda c: vista_completa(c) and aviso_datos_desactualizados(consultas) is None)
+    return con_aviso_desactualizado(contenido, consultas)
+
+def con_aviso_desactualizado(contenido, consultas):
+    """Anteponer el aviso de datos desactualizados al contenido de un callback"""
+    aviso = aviso_datos_desactualizados(consultas)
+    return contenido if aviso is None else html.Div([aviso, contenido])
+
+def consultar_fuentes(tareas):
+    """
+    Ejecuta en paralelo consultas independientes {nombre: función}, cada una con
+    su propio timeout. Devuelve los resultados que llegaron y el conjunto de
+    fuentes no disponibles (timeout o error). Las que vencen siguen corriendo
+    en segundo plano y dejan su resultado en la caché para la próxima consulta.
+    """
+    inicio = time.time()
+    futuros = {nombre: POOL_FUENTES.submit(funcion) for nombre, funcion in tareas.items()}
+    resultados, no_disponibles = {}, set()
+    for nombre, futuro in futuros.items():
+        restante = max(0, inicio + TIMEOUT_FUENTES.get(nombre, 30) - time.time())
+        try:
+            resultados[nombre] = futuro.result(timeout=restante)
+        except FuturesTimeoutError:
+            print(f"Fuente {nombre} no respondió en {TIMEOUT_FUENTES.get(nombre, 30)}s")
+            no_disponibles.add(nombre)
+        except Exception as e:
+            print(f"Error en la fuente {nombre}: {e}")
+            no_disponibles.add(nombre)
+    return resultados, no_disponibles
 
 def get_region_options():
     """
@@ -155,37 +360,40 @@ def get_region_options():
     """
     try:
         # Obtener ríos con datos de caudal recientes
-        df = objetoAPI.request_data('AporCaudal', 'Rio', (date.today() - timedelta(days=30)).strftime('%Y-%m-%d'), date.today().strftime('%Y-%m-%d'))
+        df = objetoAPI.request_data('AporCaudal', 'Rio', *ventana_por_defecto())
         if 'Name' in df.columns:
             rios_con_datos = set(df['Name'].unique())
             # Filtrar solo regiones que tienen ríos con datos
             regiones_con_datos = set()
-            for rio, region in RIO_REGION.items():
+            for rio, region in get_rio_region_dict().items():
                 if rio in rios_con_datos:
                     regiones_con_datos.add(region)
             return sorted(regiones_con_datos)
         else:
-            return sorted(set(RIO_REGION.values()))
+            return sorted(set(get_rio_region_dict().values()))
     except Exception as e:
         print(f"Error filtrando regiones con datos: {e}")
-        return sorted(set(RIO_REGION.values()))
+        return sorted(set(get_rio_region_dict().values()))
 
 
 
 
 
 
-# --- NUEVO: Función para obtener todos los ríos únicos desde la API ---
-def get_all_rios_api():
-    if objetoAPI is None:
+# --- NUEVO: Función para obtener todos los ríos conocidos ---
+def get_all_rios_api(dias_activos=None):
+    """
+    Ríos conocidos según el índice (observados en AporCaudal o listados en
+    ListadoRios), sin descargar el histórico. Con `dias_activos` devuelve solo
+    los que tienen observaciones en esos últimos días.
+    """
+    if objetoAPI is None or objetoAPI.indice_rios is None:
         return []
     try:
-        df = objetoAPI.request_data('AporCaudal', 'Rio', '2000-01-01', date.today().strftime('%Y-%m-%d'))
-        if 'Name' in df.columns:
-            rios = sorted(df['Name'].dropna().unique())
-            return rios
-        else:
-            return []
+        catalogo.asegurar_cargado()
+        if dias_activos:
+            return objetoAPI.indice_rios.activos(dias_activos)
+        return objetoAPI.indice_rios.todos()
     except Exception:
         return []
 
@@ -194,11 +402,12 @@ def get_rio_options(region=None):
         print("API XM no inicializada")
         return []
     try:
-        df = objetoAPI.request_data('AporCaudal', 'Rio', (date.today() - timedelta(days=30)).strftime('%Y-%m-%d'), date.today().strftime('%Y-%m-%d'))
+        df = objetoAPI.request_data('AporCaudal', 'Rio', *ventana_por_defecto())
         if 'Name' in df.columns:
             rios = sorted(df['Name'].dropna().unique())
             if region:
-                rios = [r for r in rios if RIO_REGION.get(r) == region]
+                rio_region = get_rio_region_dict()
+                rios = [r for r in rios if rio_region.get(r) == region]
             return rios
         else:
             return []
@@ -206,168 +415,228 @@ def get_rio_options(region=None):
         print(f"Error obteniendo opciones de Río: {e}")
         return []
 
-regiones = get_region_options()
-rios = get_rio_options()
+# Estado del calentamiento en segundo plano (reportado por /ready)
+ESTADO_CALENTAMIENTO = {'catalogos': False, 'ventana_defecto': False}
+
+# Opciones de los dropdowns calculadas al terminar el calentamiento; el layout
+# solo lee esto (nunca consulta XM ni el almacén)
+OPCIONES_LAYOUT = {'regiones': [], 'rios': []}
+
+# Cada cuánto (ms) el navegador revisa si ya hay opciones mientras el worker calienta
+INTERVALO_OPCIONES = int(os.environ.get('XM_INTERVALO_OPCIONES', 5000))
+
+def calentar_datos():
+    """Precargar catálogos y la ventana por defecto sin bloquear el arranque del worker"""
+    if objetoAPI.indice_rios is not None:
+        try:
+            objetoAPI.indice_rios.reconstruir_si_falta()
+        except Exception as e:
+            print(f"Error reconstruyendo índice de ríos: {e}")
+    while not all(ESTADO_CALENTAMIENTO.values()):
+        try:
+            if not ESTADO_CALENTAMIENTO['catalogos']:
+                ESTADO_CALENTAMIENTO['catalogos'] = catalogo.cargar()
+            if not ESTADO_CALENTAMIENTO['ventana_defecto']:
+                data = objetoAPI.request_data('AporCaudal', 'Rio', *ventana_por_defecto())
+                nacional, regiones, frecuencia = get_series_nacionales(*ventana_por_defecto())
+                if data is not None and not data.empty and not nacional.empty:
+                    OPCIONES_LAYOUT['regiones'] = get_region_options()
+                    OPCIONES_LAYOUT['rios'] = get_rio_options()
+                    ESTADO_CALENTAMIENTO['ventana_defecto'] = True
+        except Exception as e:
+            print(f"Error calentando datos XM: {e}")
+        if not all(ESTADO_CALENTAMIENTO.values()):
+            time.sleep(30)
+    print("Datos XM precargados (catálogos y ventana por defecto)")
+
+if objetoAPI is not None:
+    threading.Thread(target=calentar_datos, name='calentamiento-xm', daemon=True).start()
 
 
 
 # Layout moderno y responsive para el dashboard
-app.layout = html.Div([
-    # Container principal con clase CSS personalizada
-    dbc.Container([
-        # Header oficial del Ministerio de Minas y Energía
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    # Branding oficial del MinEnergía
+# Se sirve como función (Dash la evalúa en la primera petición de cada worker, sea
+# /health o /ready): las opciones salen de OPCIONES_LAYOUT y nunca de XM. Mientras el
+# worker calienta van vacías y las completa completar_opciones_region
+def opciones_region(regiones):
+    return ([{"label": "🌎 Todas las regiones", "value": "__ALL_REGIONS__"}] +
+            [{"label": f"📍 {r}", "value": r} for r in regiones])
+
+def serve_layout():
+    listo = all(ESTADO_CALENTAMIENTO.values())
+    regiones = OPCIONES_LAYOUT['regiones']
+    rios = OPCIONES_LAYOUT['rios']
+
+    return html.Div([
+        # Container principal con clase CSS personalizada
+        dbc.Container([
+            # Header oficial del Ministerio de Minas y Energía
+            dbc.Row([
+                dbc.Col([
                     html.Div([
+                        # Branding oficial del MinEnergía
                         html.Div([
-                            html.I(className="bi bi-lightning-charge-fill", style={"fontSize": "32px"})
-                        ], className="logo"),
-                        html.Div([
-                            html.H1("Sistema de Información Hidrológica", 
-                                   className="header-gradient mb-1",
-                                   style={"fontSize": "2.2rem", "fontWeight": "700"}),
-                            html.H2("Ministerio de Minas y Energía", 
-                                   style={"fontSize": "1.5rem", "fontWeight": "600", "color": "#ffffff", "marginBottom": "8px"}),
-                            html.P("República de Colombia - Datos Hidrológicos XM",
-                                  className="text-light mb-2",
-                                  style={"fontSize": "1.1rem", "fontWeight": "400", "opacity": "0.9"}),
-                            dbc.Badge([
-                                html.I(className="bi bi-clock me-1"),
-                                f"Última actualización: {LAST_UPDATE}"
-                            ], color="light", className="px-3 py-1", style={"color": "#003366"})
-                        ])
-                    ], className="brand-mme")
-                ], className="header-mme")
-            ], width=12)
-        ], className="mb-4"),
-
-        # Panel de controles moderno
-        dbc.Row([
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Div([
-                            html.I(className="bi bi-sliders me-2", style={"color": "#667eea"}),
-                            html.Strong("Panel de Control", style={"fontSize": "1.1rem"})
-                        ], className="mb-3 d-flex align-items-center"),
+                            html.Div([
+                                html.I(className="bi bi-lightning-charge-fill", style={"fontSize": "32px"})
+                            ], className="logo"),
+                            html.Div([
+                                html.H1("Sistema de Información Hidrológica", 
+                                       className="header-gradient mb-1",
+                                       style={"fontSize": "2.2rem", "fontWeight": "700"}),
+                                html.H2("Ministerio de Minas y Energía", 
+                                       style={"fontSize": "1.5rem", "fontWeight": "600", "color": "#ffffff", "marginBottom": "8px"}),
+                                html.P("República de Colombia - Datos Hidrológicos XM",
+                                      className="text-light mb-2",
+                                      style={"fontSize": "1.1rem", "fontWeight": "400", "opacity": "0.9"}),
+                                dbc.Badge([
+                                    html.I(className="bi bi-clock me-1"),
+                                    f"Última actualización: {LAST_UPDATE}"
+                                ], color="light", className="px-3 py-1", style={"color": "#003366"})
+                            ])
+                        ], className="brand-mme")
+                    ], className="header-mme")
+                ], width=12)
+            ], className="mb-4"),
+
+            # Panel de controles moderno
+            dbc.Row([
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Div([
+                                html.I(className="bi bi-sliders me-2", style={"color": "#667eea"}),
+                                html.Strong("Panel de Control", style={"fontSize": "1.1rem"})
+                            ], className="mb-3 d-flex align-items-center"),
                         
-                        dbc.Row([
-                            dbc.Col([
-                                html.Label([
-                                    html.I(className="bi bi-geo-alt me-2"),
-                                    "Región Hidrológica"
-                                ], className="fw-bold mb-2 d-flex align-items-center"),
-                                dcc.Dropdown(
-                                    id="region-dropdown",
-                                    options=[{"label": "🌎 Todas las regiones", "value": "__ALL_REGIONS__"}] + 
-                                           [{"label": f"📍 {r}", "value": r} for r in regiones],
-                                    placeholder="Selecciona una región...",
-                                    className="form-control-modern mb-0",
-                                    style={"fontSize": "0.95rem"}
-                                )
-                            ], lg=3, md=6, sm=12),
+                            dbc.Row([
+                                dbc.Col([
+                                    html.Label([
+                                        html.I(className="bi bi-geo-alt me-2"),
+                                        "Región Hidrológica"
+                                    ], className="fw-bold mb-2 d-flex align-items-center"),
+                                    dcc.Dropdown(
+                                        id="region-dropdown",
+                                        options=opciones_region(regiones),
+                                        placeholder="Selecciona una región...",
+                                        className="form-control-modern mb-0",
+                                        style={"fontSize": "0.95rem"}
+                                    )
+                                ], lg=3, md=6, sm=12),
                             
-                            dbc.Col([
-                                html.Label([
-                                    html.I(className="bi bi-water me-2"),
-                                    "Río Específico"
-                                ], className="fw-bold mb-2 d-flex align-items-center"),
-                                dcc.Dropdown(
-                                    id="rio-dropdown",
-                                    options=[{"label": f"🌊 {r}", "value": r} for r in rios],
-                                    placeholder="Selecciona un río...",
-                                    className="form-control-modern mb-0",
-                                    style={"fontSize": "0.95rem"}
-                                )
-                            ], lg=3, md=6, sm=12),
+                                dbc.Col([
+                                    html.Label([
+                                        html.I(className="bi bi-water me-2"),
+                                        "Río Específico"
+                                    ], className="fw-bold mb-2 d-flex align-items-center"),
+                                    dcc.Dropdown(
+                                        id="rio-dropdown",
+                                        options=[{"label": f"🌊 {r}", "value": r} for r in rios],
+                                        placeholder="Selecciona un río...",
+                                        className="form-control-modern mb-0",
+                                        style={"fontSize": "0.95rem"}
+                                    )
+                                ], lg=3, md=6, sm=12),
                             
-                            dbc.Col([
-                                html.Label([
-                                    html.I(className="bi bi-calendar-date me-2"),
-                                    "Fecha Inicio"
-                                ], className="fw-bold mb-2 d-flex align-items-center"),
-                                dcc.DatePickerSingle(
-                                    id="start-date",
-                                    date=date.today() - timedelta(days=30),
-                                    display_format="DD/MM/YYYY",
-                                    className="form-control-modern",
-                                    style={"width": "100%"}
-                                )
-                            ], lg=2, md=6, sm=12),
+                                dbc.Col([
+                                    html.Label([
+                                        html.I(className="bi bi-calendar-date me-2"),
+                                        "Fecha Inicio"
+                                    ], className="fw-bold mb-2 d-flex align-items-center"),
+                                    dcc.DatePickerSingle(
+                                        id="start-date",
+                                        date=date.today() - timedelta(days=30),
+                                        display_format="DD/MM/YYYY",
+                                        className="form-control-modern",
+                                        style={"width": "100%"}
+                                    )
+                                ], lg=2, md=6, sm=12),
                             
-                            dbc.Col([
-                                html.Label([
-                                    html.I(className="bi bi-calendar-check me-2"),
-                                    "Fecha Final"
-                                ], className="fw-bold mb-2 d-flex align-items-center"),
-                                dcc.DatePickerSingle(
-                                    id="end-date",
-                                    date=date.today(),
-                                    display_format="DD/MM/YYYY",
-                                    className="form-control-modern",
-                                    style={"width": "100%"}
-                                )
-                            ], lg=2, md=6, sm=12),
+                                dbc.Col([
+                                    html.Label([
+                                        html.I(className="bi bi-calendar-check me-2"),
+                                        "Fecha Final"
+                                    ], className="fw-bold mb-2 d-flex align-items-center"),
+                                    dcc.DatePickerSingle(
+                                        id="end-date",
+                                        date=date.today(),
+                                        display_format="DD/MM/YYYY",
+                                        className="form-control-modern",
+                                        style={"width": "100%"}
+                                    )
+                                ], lg=2, md=6, sm=12),
                             
-                            dbc.Col([
-                                html.Label("\u00A0", className="d-block"),
-                                dbc.Button([
-                                    html.I(className="bi bi-search me-2"),
-                                    "Analizar Datos"
-                                ],
-                                id="query-button",
-                                color="primary",
-                                className="w-100 btn-modern",
-                                style={"marginTop": "0.5rem", "background": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)", "border": "none"}
-                                )
-                            ], lg=2, md=12, sm=12)
-                        ], className="g-3 align-items-end")
-                    ], className="p-4")
-                ], className="card-modern shadow-lg")
-            ], width=12)
-        ], className="mb-4"),
-
-        # Área de contenido con loading moderno
-        dbc.Row([
-            dbc.Col([
-                dcc.Loading(
-                    id="loading-indicator",
-                    children=[html.Div(id="tab-content")],
-                    type="dot",
-                    color="#667eea",
-                    className="loading-spinner"
-                )
-            ], width=12)
-        ], className="mb-4"),
-
-        # Sección adicional para análisis de ríos
-        dbc.Row([
-            dbc.Col([
-                html.Hr(style={"margin": "2rem 0", "border": "2px solid #e1e8ed", "borderRadius": "2px"}),
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Div([
-                            html.I(className="bi bi-database me-2", style={"color": "#667eea"}),
-                            html.Strong("Explorador de Datos", style={"fontSize": "1.1rem"})
-                        ], className="mb-3 d-flex align-items-center")
-                    ], className="p-3")
-                ], className="card-modern")
-            ], width=12)
-        ])
-    ], className="main-container", fluid=True),
-    
-    # Modal global para todas las tablas de datos
-    dbc.Modal([
-        dbc.ModalHeader(dbc.ModalTitle(id="modal-title-dynamic", children="Detalle de datos hidrológicos"), close_button=True),
-        dbc.ModalBody([
-            html.Div(id="modal-description", className="mb-3", style={"fontSize": "0.9rem", "color": "#666"}),
-            html.Div(id="modal-table-content")
-        ]),
-    ], id="modal-rio-table", is_open=False, size="xl", backdrop=True, centered=True, style={"zIndex": 2000})
-], style={"background": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)", "minHeight": "100vh"})
+                                dbc.Col([
+                                    html.Label("\u00A0", className="d-block"),
+                                    dbc.Button([
+                                        html.I(className="bi bi-search me-2"),
+                                        "Analizar Datos"
+                                    ],
+                                    id="query-button",
+                                    color="primary",
+                                    className="w-100 btn-modern",
+                                    style={"marginTop": "0.5rem", "background": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)", "border": "none"}
+                                    )
+                                ], lg=2, md=12, sm=12)
+                            ], className="g-3 align-items-end")
+                        ], className="p-4")
+                    ], className="card-modern shadow-lg")
+                ], width=12)
+            ], className="mb-4"),
 
+            # Área de contenido con loading moderno
+            dbc.Row([
+                dbc.Col([
+                    dcc.Loading(
+                        id="loading-indicator",
+                        children=[html.Div(id="tab-content")],
+                        type="dot",
+                        color="#667eea",
+                        className="loading-spinner"
+                    )
+                ], width=12)
+            ], className="mb-4"),
+
+            # Sección adicional para análisis de ríos
+            dbc.Row([
+                dbc.Col([
+                    html.Hr(style={"margin": "2rem 0", "border": "2px solid #e1e8ed", "borderRadius": "2px"}),
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Div([
+                                html.I(className="bi bi-database me-2", style={"color": "#667eea"}),
+                                html.Strong("Explorador de Datos", style={"fontSize": "1.1rem"})
+                            ], className="mb-3 d-flex align-items-center")
+                        ], className="p-3")
+                    ], className="card-modern")
+                ], width=12)
+            ])
+        ], className="main-container", fluid=True),
+    
+        # Modal global para todas las tablas de datos
+        dbc.Modal([
+            dbc.ModalHeader(dbc.ModalTitle(id="modal-title-dynamic", children="Detalle de datos hidrológicos"), close_button=True),
+            dbc.ModalBody([
+                html.Div(id="modal-description", className="mb-3", style={"fontSize": "0.9rem", "color": "#666"}),
+                html.Div(id="modal-table-content")
+            ]),
+        ], id="modal-rio-table", is_open=False, size="xl", backdrop=True, centered=True, style={"zIndex": 2000}),
+
+        # Revisión periódica de las opciones de los dropdowns mientras el worker calienta
+        dcc.Interval(id="opciones-intervalo", interval=INTERVALO_OPCIONES, disabled=listo)
+    ], style={"background": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)", "minHeight": "100vh"})
+
+app.layout = serve_layout
+
+# Completar las regiones cuando el calentamiento termina (el layout salió sin opciones)
+@callback(
+    [Output("region-dropdown", "options"), Output("opciones-intervalo", "disabled")],
+    [Input("opciones-intervalo", "n_intervals")],
+    prevent_initial_call=True
+)
+def completar_opciones_region(n_intervals):
+    if not all(ESTADO_CALENTAMIENTO.values()):
+        return dash.no_update, False
+    return opciones_region(OPCIONES_LAYOUT['regiones']), True
 
 # Mostrar ríos en el dashboard al hacer clic en el botón
 # Callback para actualizar ríos según región seleccionada
@@ -407,22 +676,23 @@ def update_rio_options(region):
      State("region-dropdown", "value")]
 )
 def update_content(n_clicks, rio, start_date, end_date, region):
+    # n_clicks solo distingue la carga inicial de una consulta
+    return vista_memorizada(('contenido', bool(n_clicks), rio, start_date, end_date, region),
+                            lambda: construir_contenido(n_clicks, rio, start_date, end_date, region),
+                            [('AporCaudal', 'Rio', start_date, end_date),
+                             ('CapaUtilDiarEner', 'Embalse', *FECHAS_CAPACIDAD)])
+
+def construir_contenido(n_clicks, rio, start_date, end_date, region):
     # Función auxiliar para mostrar la vista por defecto (panorámica nacional)
     def show_default_view(start_date, end_date):
         try:
-            data = objetoAPI.request_data('AporCaudal', 'Rio', start_date, end_date)
-            if data is None or data.empty:
+            # Series ya agregadas (nacional y por región) en vez de las filas por río
+            nacional, regiones, frecuencia = get_series_nacionales(start_date, end_date)
+            if nacional.empty:
                 return dbc.Alert("No se encontraron datos para mostrar.", color="warning")
             
-            # Agregar información de región
-            data['Region'] = data['Name'].map(RIO_REGION)
-            
             # Mostrar contribución total por región (todas las regiones)
-            if 'Name' in data.columns and 'Value' in data.columns:
-                # Agrupar por región y fecha para crear series temporales
-                region_df = data.groupby(['Region', 'Date'])['Value'].sum().reset_index()
-                region_df = region_df[region_df['Region'].notna()]  # Filtrar regiones válidas
-                
+            if 'Value' in nacional.columns:
                 # Obtener datos de embalses para todas las regiones con estructura jerárquica
                 regiones_totales, df_completo_embalses = get_tabla_regiones_embalses()
                 
@@ -430,9 +700,9 @@ def update_content(n_clicks, rio, start_date, end_date, region):
                     html.H5("🇨🇴 Contribución Energética por Región Hidrológica de Colombia", className="text-center mb-2"),
                     html.P("Vista panorámica nacional: Series temporales comparativas de aportes de caudal por región hidrológica. Haga clic en cualquier punto para ver el detalle agregado diario de la región. Los datos incluyen todos los ríos monitoreados en el período seleccionado, agrupados por región para análisis comparativo nacional.", className="text-center text-muted mb-3", style={"fontSize": "0.9rem"}),
                     dbc.Row([
-                        dbc.Col(create_total_timeline_chart(data, "Aportes totales nacionales"), md=12)
+                        dbc.Col(create_total_timeline_chart(nacional, "Aportes totales nacionales", frecuencia), md=12)
                     ]),
-                    dcc.Store(id="region-data-store", data=data.to_dict('records')),
+                    dcc.Store(id="region-data-store", data=referencia_indice_modal(('nacional', start_date, end_date, None), regiones, frecuencia)),
                     dcc.Store(id="embalses-completo-data", data=df_completo_embalses.to_dict('records')),
                     html.Hr(),
                     html.H5("⚡ Capacidad Útil Diaria de Energía por Región Hidrológica", className="text-center mt-4 mb-2"),
@@ -492,8 +762,7 @@ def update_content(n_clicks, rio, start_date, end_date, region):
                     ], className="g-3"),
                     
                     # Stores para manejar los datos jerárquicos y estados de expansión
-                    dcc.Store(id="participacion-jerarquica-data", data=[]),
-                    dcc.Store(id="capacidad-jerarquica-data", data=[]),
+                    dcc.Store(id="arbol-embalses-data", data={}),
                     dcc.Store(id="regiones-expandidas", data=[])
                 ])
             else:
@@ -520,12 +789,42 @@ def update_content(n_clicks, rio, start_date, end_date, region):
         return show_default_view(start_date, end_date)
     
     try:
-        data = objetoAPI.request_data('AporCaudal', 'Rio', start_date, end_date)
-        if data is None or data.empty:
-            return dbc.Alert("No se encontraron datos para los parámetros seleccionados.", color="warning")
+        # Consultar en paralelo las fuentes independientes, cada una con su timeout:
+        # aportes de caudal y, si la vista la muestra, la capacidad útil de embalses
+        vista_rio = bool(rio and rio != "__ALL__")
+        if not vista_rio and region == "__ALL_REGIONS__":
+            # Vista panorámica nacional igual que al cargar la página, desde los agregados
+            nacional, regiones, frecuencia = get_series_nacionales(start_date, end_date)
+            if nacional.empty:
+                return dbc.Alert("No se encontraron datos para la región seleccionada.", color="warning")
+            return html.Div([
+                html.H5("🇨🇴 Contribución Energética por Región Hidrológica de Colombia", className="text-center mb-2"),
+                html.P("Vista panorámica nacional: Series temporales comparativas de aportes de caudal por región hidrológica. Haga clic en cualquier punto para ver el detalle agregado diario de la región. Los datos incluyen todos los ríos monitoreados en el período seleccionado, agrupados por región para análisis comparativo nacional.", className="text-center text-muted mb-3", style={"fontSize": "0.9rem"}),
+                dbc.Row([
+                    dbc.Col(create_total_timeline_chart(nacional, "Aportes totales nacionales", frecuencia), md=12)
+                ]),
+                dcc.Store(id="region-data-store", data=referencia_indice_modal(('nacional', start_date, end_date, None), regiones, frecuencia)),
+                html.Hr(),
+            ])
+        region_capacidad = region if region and region != "__ALL_REGIONS__" else None
+        tareas = {'caudal': lambda: objetoAPI.request_data('AporCaudal', 'Rio', start_date, end_date)}
+        if not vista_rio:
+            tareas['capacidad'] = lambda: get_embalses_capacidad(region_capacidad)
+        fuentes, no_disponibles = consultar_fuentes(tareas)
+        caudal_disponible = 'caudal' not in no_disponibles
+        capacidad_disponible = 'capacidad' not in no_disponibles
+
+        if not caudal_disponible and (vista_rio or not capacidad_disponible):
+            return dbc.Alert("Error al consultar los datos: la API XM no respondió a tiempo.", color="danger")
+        if caudal_disponible:
+            data = fuentes['caudal']
+            if data is None or data.empty:
+                return dbc.Alert("No se encontraron datos para los parámetros seleccionados.", color="warning")
+        else:
+            data = pd.DataFrame(columns=['Name', 'Date', 'Value'])
 
         # Si hay un río específico seleccionado (y no es 'Todos los ríos'), mostrar la serie temporal diaria de ese río
-        if rio and rio != "__ALL__":
+        if vista_rio:
             data_rio = data[data['Name'] == rio]
             if data_rio.empty:
                 return dbc.Alert("No se encontraron datos para el río seleccionado.", color="warning")
@@ -549,16 +848,16 @@ def update_content(n_clicks, rio, start_date, end_date, region):
 
         # Si no hay río seleccionado o es 'Todos los ríos', mostrar barra de contribución total por río
         # Si hay región seleccionada, filtrar por región, si no, mostrar todas las regiones
-        data['Region'] = data['Name'].map(RIO_REGION)
+        data['Region'] = data['Name'].map(get_rio_region_dict())
         
         if region and region != "__ALL_REGIONS__":
             data_filtered = data[data['Region'] == region]
             title_suffix = f"en la región {region}"
-            embalses_df = get_embalses_capacidad(region)
+            embalses_df = fuentes.get('capacidad', pd.DataFrame(columns=['Embalse', 'Capacidad Útil Diaria (GWh)']))
             # Aplicar formateo de números a la capacidad
             if not embalses_df.empty and 'Capacidad Útil Diaria (GWh)' in embalses_df.columns:
                 embalses_df_formatted = embalses_df.copy()
-                embalses_df_formatted['Capacidad Útil Diaria (GWh)'] = embalses_df['Capacidad Útil Diaria (GWh)'].apply(format_number)
+                embalses_df_formatted['Capacidad Útil Diaria (GWh)'] = format_numbers(embalses_df['Capacidad Útil Diaria (GWh)'])
                 
                 # Agregar fila TOTAL para capacidad de embalses
                 if not embalses_df_formatted.empty:
@@ -572,37 +871,19 @@ def update_content(n_clicks, rio, start_date, end_date, region):
                 embalses_df_formatted = embalses_df
             # Obtener embalses de la región específica
             try:
-                embalses_info = objetoAPI.request_data('ListadoEmbalses','Sistema','2024-01-01','2024-01-02')
-                embalses_info['Values_Name'] = embalses_info['Values_Name'].str.strip().str.upper()
-                embalses_info['Values_HydroRegion'] = embalses_info['Values_HydroRegion'].str.strip().str.title()
-                embalses_region = embalses_info[embalses_info['Values_HydroRegion'] == region]['Values_Name'].sort_values().unique()
+                embalses_region = catalogo.embalses_de_region(region)
             except Exception as e:
                 print(f"Error obteniendo embalses para el filtro: {e}")
                 embalses_region = []
         else:
-            # Si no hay región específica o es "Todas las regiones", mostrar vista nacional
-            if region == "__ALL_REGIONS__":
-                # Mostrar la vista panorámica nacional igual que al cargar la página
-                region_df = data.groupby(['Region', 'Date'])['Value'].sum().reset_index()
-                region_df = region_df[region_df['Region'].notna()]  # Filtrar regiones válidas
-                
-                return html.Div([
-                    html.H5("🇨🇴 Contribución Energética por Región Hidrológica de Colombia", className="text-center mb-2"),
-                    html.P("Vista panorámica nacional: Series temporales comparativas de aportes de caudal por región hidrológica. Haga clic en cualquier punto para ver el detalle agregado diario de la región. Los datos incluyen todos los ríos monitoreados en el período seleccionado, agrupados por región para análisis comparativo nacional.", className="text-center text-muted mb-3", style={"fontSize": "0.9rem"}),
-                    dbc.Row([
-                        dbc.Col(create_total_timeline_chart(data, "Aportes totales nacionales"), md=12)
-                    ]),
-                    dcc.Store(id="region-data-store", data=data.to_dict('records')),
-                    html.Hr(),
-                ])
-            
+            # Si no hay región específica, mostrar todas las regiones ("Todas las regiones" ya se atendió arriba)
             data_filtered = data
             title_suffix = "- Todas las regiones"
-            embalses_df = get_embalses_capacidad()
+            embalses_df = fuentes.get('capacidad', pd.DataFrame(columns=['Embalse', 'Capacidad Útil Diaria (GWh)']))
             # Aplicar formateo de números a la capacidad
             if not embalses_df.empty and 'Capacidad Útil Diaria (GWh)' in embalses_df.columns:
                 embalses_df_formatted = embalses_df.copy()
-                embalses_df_formatted['Capacidad Útil Diaria (GWh)'] = embalses_df['Capacidad Útil Diaria (GWh)'].apply(format_number)
+                embalses_df_formatted['Capacidad Útil Diaria (GWh)'] = format_numbers(embalses_df['Capacidad Útil Diaria (GWh)'])
                 
                 # Agregar fila TOTAL para capacidad de embalses
                 if not embalses_df_formatted.empty:
@@ -616,14 +897,14 @@ def update_content(n_clicks, rio, start_date, end_date, region):
                 embalses_df_formatted = embalses_df
             embalses_region = embalses_df['Embalse'].unique() if not embalses_df.empty else []
 
-        if data_filtered.empty:
+        if caudal_disponible and data_filtered.empty:
             return dbc.Alert("No se encontraron datos para la región seleccionada." if region else "No se encontraron datos.", color="warning")
         
         # Asegurar que embalses_df_formatted esté definido para todos los casos
         if 'embalses_df_formatted' not in locals():
             if not embalses_df.empty and 'Capacidad Útil Diaria (GWh)' in embalses_df.columns:
                 embalses_df_formatted = embalses_df.copy()
-                embalses_df_formatted['Capacidad Útil Diaria (GWh)'] = embalses_df['Capacidad Útil Diaria (GWh)'].apply(format_number)
+                embalses_df_formatted['Capacidad Útil Diaria (GWh)'] = format_numbers(embalses_df['Capacidad Útil Diaria (GWh)'])
                 
                 # Agregar fila TOTAL para capacidad de embalses
                 if not embalses_df_formatted.empty:
@@ -637,20 +918,21 @@ def update_content(n_clicks, rio, start_date, end_date, region):
                 embalses_df_formatted = embalses_df
             
         if 'Name' in data_filtered.columns and 'Value' in data_filtered.columns:
-            bar_df = data_filtered.groupby('Name')['Value'].sum().reset_index()
+            bar_df = data_filtered.groupby('Name', observed=True)['Value'].sum().reset_index()
             bar_df = bar_df.rename(columns={'Name': 'Río', 'Value': 'GWh'})
             
             return html.Div([
                 html.H5(f"🏞️ Contribución Energética por Río {title_suffix.title()}", className="text-center mb-2"),
                 html.P(f"Análisis comparativo de aportes de caudal entre ríos {'de la región seleccionada' if region else 'de todas las regiones de Colombia'}. Haga clic en cualquier punto del gráfico para ver el detalle diario completo del río correspondiente. Los datos están agregados por el período de tiempo seleccionado.", className="text-center text-muted mb-3", style={"fontSize": "0.9rem"}),
                 dbc.Row([
-                    dbc.Col(create_bar_chart(bar_df, f"Aportes por río {title_suffix}"), md=12)
+                    dbc.Col(create_bar_chart(bar_df, f"Aportes por río {title_suffix}") if caudal_disponible else
+                            create_unavailable_card("Aportes de caudal", "La API XM no respondió a tiempo con los aportes de caudal. Intente de nuevo en unos segundos."), md=12)
                 ]),
-                dcc.Store(id="region-data-store", data=data_filtered.to_dict('records')),
+                dcc.Store(id="region-data-store", data=referencia_indice_modal(('region', start_date, end_date, region), data_filtered)),
                 html.Hr(),
                 html.H5(f"⚡ Capacidad Útil Diaria de Energía - Embalses {title_suffix}", className="text-center mt-4 mb-2"),
                 html.P(f"Análisis detallado de la capacidad energética por embalse. Los datos muestran la energía disponible en GWh que puede ser generada diariamente por cada embalse. Incluye participación porcentual y filtros interactivos.", className="text-center text-muted mb-3", style={"fontSize": "0.9rem"}),
-                dbc.Row([
+                create_unavailable_card("Capacidad útil diaria", "La API XM no respondió a tiempo con la capacidad de los embalses. Intente de nuevo en unos segundos.") if not capacidad_disponible else dbc.Row([
                     dbc.Col([
                         html.H6("📊 Participación Porcentual por Embalse", className="text-center mb-2"),
                         html.P("Distribución porcentual de la capacidad energética entre embalses. La tabla incluye una fila TOTAL que suma exactamente 100%.", className="text-muted mb-2", style={"fontSize": "0.8rem"}),
@@ -716,106 +998,73 @@ def update_content(n_clicks, rio, start_date, end_date, region):
 
 # Callback para inicializar las tablas jerárquicas al cargar la página
 @callback(
-    [Output("participacion-jerarquica-data", "data"),
-     Output("capacidad-jerarquica-data", "data")],
+    Output("arbol-embalses-data", "data"),
     [Input("start-date", "date"), Input("end-date", "date")],
     prevent_initial_call=False
 )
 def initialize_hierarchical_tables(start_date, end_date):
-    """Inicializar las tablas jerárquicas con datos de regiones al cargar la página"""
+    """Inicializar el árbol región → embalses que alimenta las dos tablas jerárquicas"""
     try:
         regiones_totales, df_completo_embalses = get_tabla_regiones_embalses()
-        
-        if regiones_totales.empty:
-            return [], [], [], []
-        
-        # Crear datos para tabla de participación (solo regiones inicialmente)
-        participacion_data = []
-        capacidad_data = []
-        
-        for _, row in regiones_totales.iterrows():
-            # Datos de participación
-            participacion_data.append({
-                'nombre': f"▶️ {row['Región']}",  # Flecha indicando que se puede expandir
-                'participacion': f"{row['Participación (%)']}%",
-                'tipo': 'region',
-                'region_name': row['Región'],
-                'expandida': False,
-                'id': f"region_{row['Región']}"
-            })
-            
-            # Datos de capacidad
-            capacidad_data.append({
-                'nombre': f"▶️ {row['Región']}",  # Flecha indicando que se puede expandir
-                'capacidad': f"{format_number(row['Total (GWh)'])} GWh",
-                'tipo': 'region',
-                'region_name': row['Región'],
-                'expandida': False,
-                'id': f"region_{row['Región']}"
-            })
-        
-        # Agregar fila TOTAL al final
-        participacion_data.append({
-            'nombre': 'TOTAL SISTEMA',
-            'participacion': '100.0%',
-            'tipo': 'total',
-            'region_name': '',
-            'expandida': False,
-            'id': 'total'
-        })
-        
-        total_sistema = regiones_totales['Total (GWh)'].sum()
-        capacidad_data.append({
-            'nombre': 'TOTAL SISTEMA',
-            'capacidad': f"{format_number(total_sistema)} GWh",
-            'tipo': 'total',
-            'region_name': '',
-            'expandida': False,
-            'id': 'total'
-        })
-        
-        # Datos completos para los stores (incluye embalses)
-        participacion_completa = participacion_data.copy()
-        capacidad_completa = capacidad_data.copy()
-        
-        # Agregar datos de embalses a los stores completos
-        for region_name in regiones_totales['Región'].unique():
-            embalses_region = get_embalses_by_region(region_name, df_completo_embalses)
-            
-            if not embalses_region.empty:
-                for _, embalse_row in embalses_region.iterrows():
-                    embalse_name = embalse_row['Región'].replace('    └─ ', '')
-                    
-                    # Datos de participación para embalses
-                    participacion_completa.append({
-                        'nombre': f"    └─ {embalse_name}",
-                        'participacion': f"{embalse_row['Participación (%)']}%",
-                        'tipo': 'embalse',
-                        'region_name': region_name,
-                        'expandida': False,
-                        'id': f"embalse_{region_name}_{embalse_name}"
-                    })
-                    
-                    # Datos de capacidad para embalses  
-                    capacidad_completa.append({
-                        'nombre': f"    └─ {embalse_name}",
-                        'capacidad': f"{format_number(embalse_row['Total (GWh)'])} GWh",
-                        'tipo': 'embalse',
-                        'region_name': region_name,
-                        'expandida': False,
-                        'id': f"embalse_{region_name}_{embalse_name}"
-                    })
-        
-        # Retornar: datos completos para stores
-        return participacion_completa, capacidad_completa
-        
+        return construir_arbol_embalses(regiones_totales, df_completo_embalses)
     except Exception as e:
         print(f"Error inicializando tablas jerárquicas: {e}")
-        return [], []
+        return {}
+
+def construir_arbol_embalses(regiones_totales, df_completo):
+    """
+    Árbol numérico región → embalses para las tablas jerárquicas.
+
+    Regiones y embalses quedan ordenados una sola vez (mayor capacidad primero,
+    que es también el orden de participación) y los valores se guardan como
+    números; el formateo se hace solo al dibujar la tabla. Formato:
+    {'regiones': [{'region', 'capacidad', 'participacion',
+                   'embalses': {'nombre': [...], 'capacidad': [...], 'participacion': [...]}}],
+     'capacidad_total': float}
+    """
+    if regiones_totales.empty:
+        return {}
 
-def build_hierarchical_table_view(data_complete, expanded_regions, view_type="participacion"):
+    embalses = df_completo.dropna(subset=['Values_HydroRegion']).sort_values(
+        ['Values_HydroRegion', 'Capacidad Útil Diaria (GWh)'], ascending=[True, False], kind='stable')
+    embalses_por_region = {
+        region: {
+            'nombre': grupo['Embalse'].astype(str).tolist(),
+            'capacidad': grupo['Capacidad Útil Diaria (GWh)'].astype(float).tolist(),
+            'participacion': grupo['Participación (%)'].astype(float).tolist(),
+        }
+        for region, grupo in embalses.groupby('Values_HydroRegion', sort=False)
+    }
+
+    regiones = regiones_totales.sort_values('Total (GWh)', ascending=False, kind='stable')
+    vacio = {'nombre': [], 'capacidad': [], 'participacion': []}
+    return {
+        'regiones': [
+            {'region': region, 'capacidad': float(capacidad), 'participacion': float(part),
+             'embalses': embalses_por_region.get(region, vacio)}
+            for region, capacidad, part in zip(regiones['Región'], regiones['Total (GWh)'],
+                                               regiones['Participación (%)'])
+        ],
+        'capacidad_total': float(regiones['Total (GWh)'].sum()),
+    }
+
+def filas_arbol_embalses(arbol, expanded_regions):
+    """Filas visibles del árbol como (tipo, region, nombre, participacion, capacidad)"""
+    expandidas = set(expanded_regions or [])
+    filas = []
+    for nodo in arbol.get('regiones', []):
+        region = nodo['region']
+        filas.append(('region', region, region, nodo['participacion'], nodo['capacidad']))
+        if region in expandidas:
+            embalses = nodo['embalses']
+            filas.extend(('embalse', region, nombre, part, capacidad) for nombre, part, capacidad
+                         in zip(embalses['nombre'], embalses['participacion'], embalses['capacidad']))
+    filas.append(('total', '', 'TOTAL SISTEMA', 100.0, arbol.get('capacidad_total', 0.0)))
+    return filas
+
+def build_hierarchical_table_view(arbol, expanded_regions, view_type="participacion"):
     """Construir vista de tabla jerárquica con botones integrados en la primera columna"""
-    if not data_complete:
+    if not arbol:
         return dash_table.DataTable(
             data=[],
             columns=[
@@ -824,115 +1073,44 @@ def build_hierarchical_table_view(data_complete, expanded_regions, view_type="pa
             ]
         )
     
+    expandidas = set(expanded_regions or [])
     table_data = []
-    processed_regions = set()
-    
-    # Obtener todas las regiones únicas
-    all_regions = set()
-    for item in data_complete:
-        if item.get('tipo') == 'region':
-            region_name = item.get('region_name')
-            if region_name:
-                all_regions.add(region_name)
-    
-    # Crear lista de regiones con sus valores para ordenar de mayor a menor
-    region_items = []
-    for item in data_complete:
-        if item.get('tipo') == 'region':
-            region_name = item.get('region_name')
-            if region_name and region_name not in processed_regions:
-                # Obtener el valor para ordenar
-                valor_str = item.get('participacion', item.get('capacidad', '0'))
-                try:
-                    # Extraer valor numérico del string (ej: "25.5%" -> 25.5)
-                    if isinstance(valor_str, str):
-                        valor_num = float(valor_str.replace('%', '').replace(',', '').strip())
-                    else:
-                        valor_num = float(valor_str) if valor_str else 0
-                except:
-                    valor_num = 0
-                
-                region_items.append({
-                    'item': item,
-                    'region_name': region_name,
-                    'valor_num': valor_num
-                })
-                processed_regions.add(region_name)
-    
-    # Ordenar regiones por valor de mayor a menor
-    region_items.sort(key=lambda x: x['valor_num'], reverse=True)
-    
-    # Procesar cada región en orden descendente
-    for region_data in region_items:
-        region_item = region_data['item']
-        region_name = region_data['region_name']
-        
-        is_expanded = region_name in expanded_regions
-        
-        # Fila de región con botón integrado en el nombre
-        button_icon = "⊟" if is_expanded else "⊞"  # Símbolos más elegantes
-        table_data.append({
-            "nombre": f"{button_icon} {region_name}",
-            "valor": region_item.get('participacion', region_item.get('capacidad', '')),
-            "tipo": "region",
-            "region_name": region_name,
-            "id": f"region_{region_name}",
-            "clickable": True  # Marcar como clickeable
-        })
-        
-        # Si está expandida, agregar embalses ordenados de mayor a menor
-        if is_expanded:
-            embalses = []
-            processed_embalses = set()
-            
-            for item in data_complete:
-                if (item.get('tipo') == 'embalse' and 
-                    item.get('region_name') == region_name):
-                    embalse_id = item.get('id', '')
-                    if embalse_id not in processed_embalses:
-                        processed_embalses.add(embalse_id)
-                        # Agregar valor numérico para ordenar
-                        valor_str = item.get('participacion', item.get('capacidad', '0'))
-                        try:
-                            if isinstance(valor_str, str):
-                                valor_num = float(valor_str.replace('%', '').replace(',', '').strip())
-                            else:
-                                valor_num = float(valor_str) if valor_str else 0
-                        except:
-                            valor_num = 0
-                        item['valor_num'] = valor_num
-                        embalses.append(item)
-            
-            # Ordenar embalses de mayor a menor
-            embalses.sort(key=lambda x: x.get('valor_num', 0), reverse=True)
-            
-            for embalse in embalses:
-                        embalse_name = embalse.get('nombre', '').replace('    └─ ', '')
-                        table_data.append({
-                            "nombre": f"    └─ {embalse_name}",
-                            "valor": embalse.get('participacion', embalse.get('capacidad', '')),
-                            "tipo": "embalse",
-                            "region_name": region_name,
-                            "id": embalse.get('id', f"embalse_{region_name}_{embalse_name}"),
-                            "clickable": False  # Embalses no son clickeables
-                        })
-    
-    # Agregar fila TOTAL
-    total_item = None
-    for item in data_complete:
-        if item.get('tipo') == 'total':
-            total_item = item
-            break
-    
-    if total_item:
-        table_data.append({
-            "nombre": "TOTAL SISTEMA",
-            "valor": total_item.get('participacion', total_item.get('capacidad', '')),
-            "tipo": "total",
-            "region_name": "",
-            "id": "total",
-            "clickable": False
-        })
+    for tipo, region_name, nombre, participacion_valor, capacidad in filas_arbol_embalses(arbol, expandidas):
+        # Formateo solo al dibujar: los stores guardan números
+        if view_type == "participacion":
+            valor = f"{participacion_valor}%"
+        else:
+            valor = f"{format_number(capacidad)} GWh"
+        
+        if tipo == 'region':
+            # Fila de región con botón integrado en el nombre
+            button_icon = "⊟" if region_name in expandidas else "⊞"
+            table_data.append({
+                "nombre": f"{button_icon} {region_name}",
+                "valor": valor,
+                "tipo": "region",
+                "region_name": region_name,
+                "id": f"region_{region_name}",
+                "clickable": True  # Marcar como clickeable
+            })
+        elif tipo == 'embalse':
+            table_data.append({
+                "nombre": f"    └─ {nombre}",
+                "valor": valor,
+                "tipo": "embalse",
+                "region_name": region_name,
+                "id": f"embalse_{region_name}_{nombre}",
+                "clickable": False  # Embalses no son clickeables
+            })
+        else:
+            table_data.append({
+                "nombre": nombre,
+                "valor": valor,
+                "tipo": "total",
+                "region_name": "",
+                "id": "total",
+                "clickable": False
+            })
     
     # Crear tabla con estructura de 2 columnas
     return dash_table.DataTable(
@@ -988,15 +1166,14 @@ def build_hierarchical_table_view(data_complete, expanded_regions, view_type="pa
      Output("regiones-expandidas", "data")],
     [Input("tabla-participacion-jerarquica-display", "active_cell"),
      Input("tabla-capacidad-jerarquica-display", "active_cell")],
-    [State("participacion-jerarquica-data", "data"),
-     State("capacidad-jerarquica-data", "data"),
+    [State("arbol-embalses-data", "data"),
      State("regiones-expandidas", "data")],
     prevent_initial_call=True
 )
-def toggle_region_from_table(active_cell_part, active_cell_cap, participacion_complete, capacidad_complete, regiones_expandidas):
+def toggle_region_from_table(active_cell_part, active_cell_cap, arbol, regiones_expandidas):
     """Manejar clics en los nombres de región con botones integrados"""
     try:
-        if not participacion_complete or not capacidad_complete:
+        if not arbol:
             return dash.no_update, dash.no_update, regiones_expandidas or []
         
         if regiones_expandidas is None:
@@ -1011,24 +1188,14 @@ def toggle_region_from_table(active_cell_part, active_cell_cap, participacion_co
         if active_cell.get('column_id') != 'nombre':
             return dash.no_update, dash.no_update, regiones_expandidas
         
-        # Obtener el nombre de la celda clicada directamente de la tabla
-        # Construir la tabla actual para obtener los datos exactos
-        current_table = build_hierarchical_table_view(participacion_complete, regiones_expandidas, "participacion")
-        
-        # Obtener los datos de la tabla actual
-        table_data = current_table.data if hasattr(current_table, 'data') else []
-        
-        # Verificar qué fila se clicó
+        # Las dos tablas muestran las mismas filas: ubicar la clicada en el árbol
+        filas = filas_arbol_embalses(arbol, regiones_expandidas)
         row_id = active_cell['row']
-        if row_id < len(table_data):
-            clicked_row = table_data[row_id]
-            clicked_name = clicked_row.get('nombre', '')
-            
-            # Extraer el nombre de la región del texto (remover símbolos ⊞/⊟)
-            region_name = clicked_name.replace('⊞ ', '').replace('⊟ ', '').strip()
+        if row_id < len(filas):
+            tipo, region_name = filas[row_id][:2]
             
             # Verificar si es una fila de región (no embalse ni total)
-            if clicked_row.get('tipo') == 'region' and region_name:
+            if tipo == 'region' and region_name:
                 # Toggle la región
                 if region_name in regiones_expandidas:
                     regiones_expandidas.remove(region_name)
@@ -1036,8 +1203,8 @@ def toggle_region_from_table(active_cell_part, active_cell_cap, participacion_co
                     regiones_expandidas.append(region_name)
         
         # Reconstruir las vistas
-        participacion_view = build_hierarchical_table_view(participacion_complete, regiones_expandidas, "participacion")
-        capacidad_view = build_hierarchical_table_view(capacidad_complete, regiones_expandidas, "capacidad")
+        participacion_view = build_hierarchical_table_view(arbol, regiones_expandidas, "participacion")
+        capacidad_view = build_hierarchical_table_view(arbol, regiones_expandidas, "capacidad")
         
         return participacion_view, capacidad_view, regiones_expandidas
         
@@ -1051,15 +1218,14 @@ def toggle_region_from_table(active_cell_part, active_cell_cap, participacion_co
 @callback(
     [Output("tabla-participacion-jerarquica-container", "children", allow_duplicate=True),
      Output("tabla-capacidad-jerarquica-container", "children", allow_duplicate=True)],
-    [Input("participacion-jerarquica-data", "data"),
-     Input("capacidad-jerarquica-data", "data")],
+    [Input("arbol-embalses-data", "data")],
     [State("regiones-expandidas", "data")],
     prevent_initial_call='initial_duplicate'
 )
-def update_html_tables_from_stores(participacion_complete, capacidad_complete, regiones_expandidas):
-    """Actualizar las vistas HTML basándose en los stores"""
+def update_html_tables_from_stores(arbol, regiones_expandidas):
+    """Actualizar las vistas HTML basándose en el árbol de regiones y embalses"""
     try:
-        if not participacion_complete or not capacidad_complete:
+        if not arbol:
             return (
                 html.Div("No hay datos de participación disponibles", className="text-center text-muted p-3"),
                 html.Div("No hay datos de capacidad disponibles", className="text-center text-muted p-3")
@@ -1069,8 +1235,8 @@ def update_html_tables_from_stores(participacion_complete, capacidad_complete, r
             regiones_expandidas = []
         
         # Construir vistas de tabla iniciales (todas las regiones colapsadas)
-        participacion_view = build_hierarchical_table_view(participacion_complete, regiones_expandidas, "participacion")
-        capacidad_view = build_hierarchical_table_view(capacidad_complete, regiones_expandidas, "capacidad")
+        participacion_view = build_hierarchical_table_view(arbol, regiones_expandidas, "participacion")
+        capacidad_view = build_hierarchical_table_view(arbol, regiones_expandidas, "capacidad")
         
         return participacion_view, capacidad_view
         
@@ -1095,28 +1261,27 @@ def update_html_tables_from_stores(participacion_complete, capacidad_complete, r
 )
 def load_default_data(start_date, end_date):
     """Cargar datos por defecto al inicializar la página"""
+    return vista_memorizada(('inicial', start_date, end_date),
+                            lambda: construir_vista_inicial(start_date, end_date),
+                            [('AporCaudal', 'Rio', start_date, end_date)])
+
+def construir_vista_inicial(start_date, end_date):
     if start_date and end_date:
         try:
-            data = objetoAPI.request_data('AporCaudal', 'Rio', start_date, end_date)
-            if data is None or data.empty:
+            # Series ya agregadas (nacional y por región) en vez de las filas por río
+            nacional, regiones, frecuencia = get_series_nacionales(start_date, end_date)
+            if nacional.empty:
                 return dbc.Alert("No se encontraron datos para mostrar.", color="warning", className="text-center")
             
-            # Agregar información de región
-            data['Region'] = data['Name'].map(RIO_REGION)
-            
             # Mostrar contribución total por región (todas las regiones)
-            if 'Name' in data.columns and 'Value' in data.columns:
-                # Agrupar por región y fecha para crear series temporales
-                region_df = data.groupby(['Region', 'Date'])['Value'].sum().reset_index()
-                region_df = region_df[region_df['Region'].notna()]  # Filtrar regiones válidas
-                
+            if 'Value' in nacional.columns:
                 return html.Div([
                     html.H5("🇨🇴 Contribución Energética por Región Hidrológica de Colombia", className="text-center mb-2"),
-                    html.P("Vista panorámica nacional: Timeline del total nacional de aportes de caudal. Haga clic en cualquier punto para ver el desglose detallado por región para esa fecha específica. Los datos incluyen todos los ríos monitoreados en el período seleccionado, agregados por día.", className="text-center text-muted mb-3", style={"fontSize": "0.9rem"}),
+                    html.P(f"Vista panorámica nacional: Timeline del total nacional de aportes de caudal. Haga clic en cualquier punto para ver el desglose detallado por región para esa fecha específica. Los datos incluyen todos los ríos monitoreados en el período seleccionado, agregados por {'mes' if frecuencia == 'M' else 'día'}.", className="text-center text-muted mb-3", style={"fontSize": "0.9rem"}),
                     dbc.Row([
-                        dbc.Col(create_total_timeline_chart(data, "Aportes totales nacionales"), md=12)
+                        dbc.Col(create_total_timeline_chart(nacional, "Aportes totales nacionales", frecuencia), md=12)
                     ]),
-                    dcc.Store(id="region-data-store", data=data.to_dict('records')),
+                    dcc.Store(id="region-data-store", data=referencia_indice_modal(('nacional', start_date, end_date, None), regiones, frecuencia)),
                     html.Hr(),
                 ])
             else:
@@ -1134,25 +1299,8 @@ def get_participacion_embalses(df_embalses):
     if df_embalses.empty or 'Capacidad Útil Diaria (GWh)' not in df_embalses.columns:
         return pd.DataFrame(columns=['Embalse', 'Participación (%)'])
     
-    df_participacion = df_embalses.copy()
-    total = df_participacion['Capacidad Útil Diaria (GWh)'].sum()
-    
-    if total > 0:
-        # Calcular porcentajes sin redondear primero
-        porcentajes = (df_participacion['Capacidad Útil Diaria (GWh)'] / total * 100)
-        
-        # Ajustar el último valor para que la suma sea exactamente 100%
-        porcentajes_redondeados = porcentajes.round(2)
-        diferencia = 100 - porcentajes_redondeados.sum()
-        
-        # Si hay diferencia por redondeo, ajustar el valor más grande
-        if abs(diferencia) > 0.001:
-            idx_max = porcentajes_redondeados.idxmax()
-            porcentajes_redondeados.loc[idx_max] += diferencia
-            
-        df_participacion['Participación (%)'] = porcentajes_redondeados.round(2)
-    else:
-        df_participacion['Participación (%)'] = 0
+    # Participación que suma exactamente 100% (mayor residuo)
+    df_participacion = agregar_participacion(df_embalses, 'Capacidad Útil Diaria (GWh)')
     
     # Ordenar de mayor a menor por participación
     df_participacion = df_participacion.sort_values('Participación (%)', ascending=False)
@@ -1178,28 +1326,11 @@ def get_tabla_con_participacion(df_embalses):
     if df_embalses.empty or 'Capacidad Útil Diaria (GWh)' not in df_embalses.columns:
         return pd.DataFrame(columns=['Embalse', 'Capacidad Útil Diaria (GWh)', 'Participación (%)'])
     
-    df_resultado = df_embalses.copy()
-    total = df_resultado['Capacidad Útil Diaria (GWh)'].sum()
-    
-    if total > 0:
-        # Calcular porcentajes sin redondear primero
-        porcentajes = (df_resultado['Capacidad Útil Diaria (GWh)'] / total * 100)
-        
-        # Ajustar el último valor para que la suma sea exactamente 100%
-        porcentajes_redondeados = porcentajes.round(2)
-        diferencia = 100 - porcentajes_redondeados.sum()
-        
-        # Si hay diferencia por redondeo, ajustar el valor más grande
-        if abs(diferencia) > 0.001:
-            idx_max = porcentajes_redondeados.idxmax()
-            porcentajes_redondeados.loc[idx_max] += diferencia
-            
-        df_resultado['Participación (%)'] = porcentajes_redondeados.round(2)
-    else:
-        df_resultado['Participación (%)'] = 0
+    # Participación que suma exactamente 100% (mayor residuo)
+    df_resultado = agregar_participacion(df_embalses, 'Capacidad Útil Diaria (GWh)')
     
     # Formatear números en la capacidad
-    df_resultado['Capacidad Útil Diaria (GWh)'] = df_resultado['Capacidad Útil Diaria (GWh)'].apply(format_number)
+    df_resultado['Capacidad Útil Diaria (GWh)'] = format_numbers(df_resultado['Capacidad Útil Diaria (GWh)'])
     
     # Ordenar de mayor a menor por participación
     df_resultado = df_resultado.sort_values('Participación (%)', ascending=False)
@@ -1212,10 +1343,8 @@ def get_tabla_regiones_embalses():
     Crea una tabla jerárquica que muestra primero las regiones y permite expandir para ver embalses.
     """
     try:
-        # Obtener todos los embalses con su información de región
-        embalses_info = objetoAPI.request_data('ListadoEmbalses','Sistema','2024-01-01','2024-01-02')
-        embalses_info['Values_Name'] = embalses_info['Values_Name'].str.strip().str.upper()
-        embalses_info['Values_HydroRegion'] = embalses_info['Values_HydroRegion'].str.strip().str.title()
+        # Todos los embalses con su información de región (catálogo en memoria)
+        embalses_info = catalogo.embalses
         
         # Obtener capacidades por embalse
         embalses_capacidad = get_embalses_capacidad()
@@ -1233,18 +1362,11 @@ def get_tabla_regiones_embalses():
         regiones_totales = regiones_totales.rename(columns={'Values_HydroRegion': 'Región', 'Capacidad Útil Diaria (GWh)': 'Total (GWh)'})
         regiones_totales = regiones_totales.sort_values('Total (GWh)', ascending=False)
         
-        # Calcular participación porcentual de regiones
-        total_general = regiones_totales['Total (GWh)'].sum()
-        if total_general > 0:
-            regiones_totales['Participación (%)'] = (regiones_totales['Total (GWh)'] / total_general * 100).round(2)
-            # Ajustar para que sume exactamente 100%
-            diferencia = 100 - regiones_totales['Participación (%)'].sum()
-            if abs(diferencia) > 0.001:
-                idx_max = regiones_totales['Participación (%)'].idxmax()
-                regiones_totales.loc[idx_max, 'Participación (%)'] += diferencia
-                regiones_totales['Participación (%)'] = regiones_totales['Participación (%)'].round(2)
-        else:
-            regiones_totales['Participación (%)'] = 0
+        # Participación de las regiones en el total y de cada embalse dentro de su
+        # región (todas las regiones en una sola pasada)
+        regiones_totales['Participación (%)'] = participacion(regiones_totales['Total (GWh)'])
+        df_completo['Participación (%)'] = participacion(df_completo['Capacidad Útil Diaria (GWh)'],
+                                                          df_completo['Values_HydroRegion'])
         
         # Agregar identificador de tipo
         regiones_totales['Tipo'] = 'region'
@@ -1272,7 +1394,7 @@ def create_collapsible_regions_table():
         for idx, region_row in regiones_totales.iterrows():
             region_name = region_row['Región']
             total_gwh = region_row['Total (GWh)']
-            participacion = region_row['Participación (%)']
+            participacion_region = region_row['Participación (%)']
             
             # Obtener embalses de la región
             embalses_region = get_embalses_by_region(region_name, df_completo_embalses)
@@ -1441,7 +1563,7 @@ def create_collapsible_regions_table():
                             ], className="d-flex align-items-center"),
                             html.Div([
                                 dbc.Badge(f"{format_number(total_gwh)} GWh", color="primary", className="me-2 px-2 py-1"),
-                                dbc.Badge(f"{participacion}%", color="success", className="px-2 py-1"),
+                                dbc.Badge(f"{participacion_region}%", color="success", className="px-2 py-1"),
                                 html.Small(f" • {num_embalses} embalse{'s' if num_embalses != 1 else ''}", 
                                          className="text-muted ms-2")
                             ], className="d-flex align-items-center mt-1")
@@ -1539,17 +1661,9 @@ def get_embalses_by_region(region, df_completo):
     if embalses_region.empty:
         return pd.DataFrame()
     
-    total_region = embalses_region['Capacidad Útil Diaria (GWh)'].sum()
-    if total_region > 0:
-        embalses_region['Participación (%)'] = (embalses_region['Capacidad Útil Diaria (GWh)'] / total_region * 100).round(2)
-        # Ajustar para que sume exactamente 100%
-        diferencia = 100 - embalses_region['Participación (%)'].sum()
-        if abs(diferencia) > 0.001:
-            idx_max = embalses_region['Participación (%)'].idxmax()
-            embalses_region.loc[idx_max, 'Participación (%)'] += diferencia
-            embalses_region['Participación (%)'] = embalses_region['Participación (%)'].round(2)
-    else:
-        embalses_region['Participación (%)'] = 0
+    # get_tabla_regiones_embalses ya trae la participación de todas las regiones
+    if 'Participación (%)' not in embalses_region.columns:
+        embalses_region = agregar_participacion(embalses_region, 'Capacidad Útil Diaria (GWh)')
     
     # Formatear para mostrar como sub-elementos - usar la columna correcta 'Embalse'
     if 'Embalse' in embalses_region.columns:
@@ -1568,13 +1682,10 @@ def get_embalses_capacidad(region=None):
     Solo incluye embalses que tienen datos de capacidad activos.
     """
     try:
-        df = objetoAPI.request_data('CapaUtilDiarEner','Embalse','2024-01-01','2024-01-02')
+        df = objetoAPI.request_data('CapaUtilDiarEner', 'Embalse', *FECHAS_CAPACIDAD)
         if 'Name' in df.columns and 'Value' in df.columns:
-            # Obtener información de región para embalses
-            embalses_info = objetoAPI.request_data('ListadoEmbalses','Sistema','2024-01-01','2024-01-02')
-            embalses_info['Values_Name'] = embalses_info['Values_Name'].str.strip().str.upper()
-            embalses_info['Values_HydroRegion'] = embalses_info['Values_HydroRegion'].str.strip().str.title()
-            embalse_region_dict = dict(zip(embalses_info['Values_Name'], embalses_info['Values_HydroRegion']))
+            # Información de región para embalses (catálogo en memoria)
+            embalse_region_dict = catalogo.embalse_region
             
             # Solo incluir embalses que tienen datos de capacidad
             embalses_con_datos = set(df['Name'].unique())
@@ -1586,7 +1697,7 @@ def get_embalses_capacidad(region=None):
             df['Region'] = df['Name'].map(embalse_region_dict_filtrado)
             if region:
                 df = df[df['Region'] == region]
-            df_grouped = df.groupby('Name')['Value'].sum().reset_index()
+            df_grouped = df.groupby('Name', observed=True)['Value'].sum().reset_index()
             df_grouped = df_grouped.rename(columns={'Name': 'Embalse', 'Value': 'Capacidad Útil Diaria (GWh)'})
             return df_grouped.sort_values('Embalse')
         else:
@@ -1618,17 +1729,8 @@ def create_data_table(data):
             total = df_no_total['GWh'].sum()
             
             if total > 0:
-                # Calcular porcentajes
-                porcentajes = (df_no_total['GWh'] / total * 100).round(2)
-                
-                # Ajustar para que sume exactamente 100%
-                diferencia = 100 - porcentajes.sum()
-                if abs(diferencia) > 0.001 and len(porcentajes) > 0:
-                    idx_max = porcentajes.idxmax()
-                    porcentajes.loc[idx_max] += diferencia
-                
-                # Agregar la columna de participación
-                df_with_participation.loc[df_no_total.index, 'Participación (%)'] = porcentajes.round(2)
+                # Agregar la columna de participación (suma exactamente 100%)
+                df_with_participation.loc[df_no_total.index, 'Participación (%)'] = participacion(df_no_total['GWh'])
                 
                 # Agregar fila TOTAL si no existe
                 has_total_row = any(df_with_participation.iloc[:, 0] == 'TOTAL')
@@ -1658,9 +1760,8 @@ def create_data_table(data):
     
     for col in numeric_columns:
         if col != 'Participación (%)':  # No formatear porcentajes
-            df_with_participation[col] = df_with_participation[col].apply(
-                lambda x: format_number(x) if pd.notnull(x) and x != 'TOTAL' else x
-            )
+            # Columna completa de una vez; 'TOTAL' y los faltantes quedan igual
+            df_with_participation[col] = format_numbers(df_with_participation[col])
     
     # Detectar si hay columna de totales
     style_data_conditional = []
@@ -1687,6 +1788,64 @@ def create_data_table(data):
         export_headers="display"
     )
 
+def create_unavailable_card(titulo, detalle):
+    """Tarjeta que reemplaza una sección cuya fuente XM no respondió a tiempo"""
+    return dbc.Card([
+        dbc.CardBody([
+            html.Div([
+                html.I(className="bi bi-hourglass-split me-2", style={"color": "#f0ad4e"}),
+                html.Strong(f"{titulo} no disponible", style={"fontSize": "1.1rem"})
+            ], className="d-flex align-items-center justify-content-center"),
+            html.P(detalle, className="text-muted mb-0 mt-2", style={"fontSize": "0.85rem"})
+        ], className="p-4 text-center")
+    ], className="card-modern fuente-no-disponible")
+
+@memorizar_figura
+def figura_evolucion_caudal(data):
+    """Figura de create_line_chart (memorizada por huella de los datos)"""
+    # Rangos largos: a lo sumo XM_PUNTOS_GRAFICO puntos (LTTB, con pico y valle),
+    # enviados compactos y con WebGL por encima de XM_UMBRAL_WEBGL
+    serie = compactar_serie(submuestrear(data, 'Fecha', 'GWh'), 'Fecha', 'GWh')
+    fig = px.line(serie, x='Fecha', y='GWh', 
+                 labels={'GWh': "Energía (GWh)", 'Fecha': "Fecha"}, 
+                 markers=True, render_mode=modo_render(len(serie)))
+    
+    # Aplicar tema moderno
+    fig.update_layout(
+        height=400,
+        margin=dict(l=20, r=20, t=40, b=20),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Inter, Arial, sans-serif", size=12),
+        title_font_size=16,
+        xaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(128,128,128,0.2)',
+            showline=True,
+            linewidth=2,
+            linecolor='rgba(128,128,128,0.3)'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(128,128,128,0.2)',
+            showline=True,
+            linewidth=2,
+            linecolor='rgba(128,128,128,0.3)'
+        )
+    )
+    
+    # Estilo moderno de la línea
+    fig.update_traces(
+        line=dict(width=3, color='#667eea'),
+        marker=dict(size=8, color='#764ba2', 
+                   line=dict(width=2, color='white')),
+        hovertemplate='<b>Fecha:</b> %{x}<br><b>Energía:</b> %{y:.2f} GWh<extra></extra>'
+    )
+    
+    return fig
+
 def create_line_chart(data):
     """Gráfico de líneas moderno de caudal"""
     if data is None or data.empty:
@@ -1694,43 +1853,7 @@ def create_line_chart(data):
     
     # Esperar columnas 'Fecha' y 'GWh' tras el renombrado
     if 'Fecha' in data.columns and 'GWh' in data.columns:
-        fig = px.line(data, x='Fecha', y='GWh', 
-                     labels={'GWh': "Energía (GWh)", 'Fecha': "Fecha"}, 
-                     markers=True)
-        
-        # Aplicar tema moderno
-        fig.update_layout(
-            height=400,
-            margin=dict(l=20, r=20, t=40, b=20),
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(family="Inter, Arial, sans-serif", size=12),
-            title_font_size=16,
-            xaxis=dict(
-                showgrid=True,
-                gridwidth=1,
-                gridcolor='rgba(128,128,128,0.2)',
-                showline=True,
-                linewidth=2,
-                linecolor='rgba(128,128,128,0.3)'
-            ),
-            yaxis=dict(
-                showgrid=True,
-                gridwidth=1,
-                gridcolor='rgba(128,128,128,0.2)',
-                showline=True,
-                linewidth=2,
-                linecolor='rgba(128,128,128,0.3)'
-            )
-        )
-        
-        # Estilo moderno de la línea
-        fig.update_traces(
-            line=dict(width=3, color='#667eea'),
-            marker=dict(size=8, color='#764ba2', 
-                       line=dict(width=2, color='white')),
-            hovertemplate='<b>Fecha:</b> %{x}<br><b>Energía:</b> %{y:.2f} GWh<extra></extra>'
-        )
+        fig = figura_evolucion_caudal(data)
         
         return dbc.Card([
             dbc.CardHeader([
@@ -1744,39 +1867,32 @@ def create_line_chart(data):
     else:
         return dbc.Alert("No se pueden crear gráficos con estos datos.", color="warning", className="alert-modern")
 
-def create_bar_chart(data, metric_name):
-    """Crear gráfico de líneas moderno por región o río"""
-    # Detectar columnas categóricas y numéricas
-    cat_cols = [col for col in data.columns if data[col].dtype == 'object']
-    num_cols = [col for col in data.columns if data[col].dtype in ['float64', 'int64']]
-    
-    if not cat_cols or not num_cols:
-        return dbc.Alert("No se pueden crear gráficos de líneas con estos datos.", 
-                        color="warning", className="alert-modern")
-    
-    cat_col = cat_cols[0]
-    num_col = num_cols[0]
-    
+@memorizar_figura
+def figura_aportes_region(data, cat_col, num_col):
+    """Figura de create_bar_chart (memorizada por huella de los datos)"""
     # Si los datos tienen información de región, crear líneas por región
     if 'Region' in data.columns:
         # Agrupar por región y fecha para crear series temporales por región
         if 'Date' in data.columns:
-            # Datos diarios por región - series temporales
+            # Datos diarios por región - series temporales (cada región submuestreada por separado);
+            # con varias regiones es la figura con más puntos, WebGL según el total
+            series = compactar_serie(submuestrear(data, 'Date', 'Value', grupo='Region'), 'Date', 'Value')
             fig = px.line(
-                data,
+                series,
                 x='Date',
                 y='Value', 
                 color='Region',
                 title="Aportes Energéticos por Región Hidrológica",
                 labels={'Value': "Energía (GWh)", 'Date': "Fecha", 'Region': "Región"},
                 markers=True,
-                color_discrete_sequence=px.colors.qualitative.Set2
+                color_discrete_sequence=px.colors.qualitative.Set2,
+                render_mode=modo_render(len(series))
             )
             # Asegurar que cada línea tenga información de región para el click
             fig.for_each_trace(lambda t: t.update(legendgroup=t.name, customdata=[t.name] * len(t.x)))
         else:
             # Datos agregados por región - convertir a líneas también
-            region_data = data.groupby('Region')[num_col].sum().reset_index()
+            region_data = data.groupby('Region', observed=True)[num_col].sum().reset_index()
             region_data = region_data.sort_values(by=num_col, ascending=False)
             
             fig = px.line(
@@ -1790,7 +1906,7 @@ def create_bar_chart(data, metric_name):
             )
     else:
         # Agrupar y ordenar datos de mayor a menor - usar líneas en lugar de barras
-        grouped_data = data.groupby(cat_col)[num_col].sum().reset_index()
+        grouped_data = data.groupby(cat_col, observed=True)[num_col].sum().reset_index()
         grouped_data = grouped_data.sort_values(by=num_col, ascending=False)
         
         fig = px.line(
@@ -1848,6 +1964,22 @@ def create_bar_chart(data, metric_name):
         hovertemplate='<b>%{fullData.name}</b><br>Valor: %{y:.2f} GWh<extra></extra>'
     )
     
+    return fig
+
+def create_bar_chart(data, metric_name):
+    """Crear gráfico de líneas moderno por región o río"""
+    # Detectar columnas categóricas y numéricas
+    cat_cols = [col for col in data.columns
+                if pd.api.types.is_string_dtype(data[col]) or isinstance(data[col].dtype, pd.CategoricalDtype)]
+    num_cols = [col for col in data.columns
+                if pd.api.types.is_numeric_dtype(data[col]) and not pd.api.types.is_bool_dtype(data[col])]
+    
+    if not cat_cols or not num_cols:
+        return dbc.Alert("No se pueden crear gráficos de líneas con estos datos.", 
+                        color="warning", className="alert-modern")
+    
+    fig = figura_aportes_region(data, cat_cols[0], num_cols[0])
+    
     chart_title = "Aportes de Energía por Región" if 'Region' in data.columns else "Aportes de Energía por Río"
     
     return dbc.Card([
@@ -1863,29 +1995,28 @@ def create_bar_chart(data, metric_name):
         ], className="p-2")
     ], className="card-modern chart-container shadow-lg")
 
-def create_total_timeline_chart(data, metric_name):
-    """Crear gráfico de línea temporal con total nacional por día"""
-    if data is None or data.empty:
-        return dbc.Alert("No se pueden crear gráficos con estos datos.", 
-                        color="warning", className="alert-modern")
-    
-    # Verificar que tengamos las columnas necesarias
-    if 'Date' not in data.columns or 'Value' not in data.columns:
-        return dbc.Alert("No se encuentran las columnas necesarias (Date, Value).", 
-                        color="warning", className="alert-modern")
-    
-    # Agrupar por fecha y sumar todos los valores de todas las regiones
-    daily_totals = data.groupby('Date')['Value'].sum().reset_index()
-    daily_totals = daily_totals.sort_values('Date')
+@memorizar_figura
+def figura_total_nacional(data, frecuencia='D'):
+    """Figura de create_total_timeline_chart (memorizada por huella de los datos)"""
+    # La serie nacional materializada ya trae una fila por fecha; con filas por río se agrupa aquí
+    if data['Date'].is_unique:
+        daily_totals = data[['Date', 'Value']].sort_values('Date')
+    else:
+        daily_totals = data.groupby('Date')['Value'].sum().reset_index()
+        daily_totals = daily_totals.sort_values('Date')
+    # Rangos largos: a lo sumo XM_PUNTOS_GRAFICO puntos; se conservan fechas reales para el clic
+    daily_totals = compactar_serie(submuestrear(daily_totals, 'Date', 'Value'), 'Date', 'Value')
+    periodo = "Mes" if frecuencia == 'M' else "Día"
     
     # Crear gráfico de línea con una sola línea negra
     fig = px.line(
         daily_totals,
         x='Date',
         y='Value',
-        title="Total Nacional de Aportes de Caudal por Día",
+        title=f"Total Nacional de Aportes de Caudal por {periodo}",
         labels={'Value': "Total Energía (GWh)", 'Date': "Fecha"},
-        markers=True
+        markers=True,
+        render_mode=modo_render(len(daily_totals))
     )
     
     # Estilo moderno con línea negra
@@ -1929,11 +2060,27 @@ def create_total_timeline_chart(data, metric_name):
         hovertemplate='<b>Fecha:</b> %{x}<br><b>Total Nacional:</b> %{y:.2f} GWh<extra></extra>'
     )
     
+    return fig
+
+def create_total_timeline_chart(data, metric_name, frecuencia='D'):
+    """Crear gráfico de línea temporal con total nacional por día (o por mes con frecuencia 'M')"""
+    if data is None or data.empty:
+        return dbc.Alert("No se pueden crear gráficos con estos datos.", 
+                        color="warning", className="alert-modern")
+    
+    # Verificar que tengamos las columnas necesarias
+    if 'Date' not in data.columns or 'Value' not in data.columns:
+        return dbc.Alert("No se encuentran las columnas necesarias (Date, Value).", 
+                        color="warning", className="alert-modern")
+    
+    periodo = "Mes" if frecuencia == 'M' else "Día"
+    fig = figura_total_nacional(data, frecuencia)
+    
     return dbc.Card([
         dbc.CardHeader([
             html.Div([
                 html.I(className="bi bi-graph-up me-2", style={"color": "#000"}),
-                html.Strong("Total Nacional por Día", style={"fontSize": "1.2rem"})
+                html.Strong(f"Total Nacional por {periodo}", style={"fontSize": "1.2rem"})
             ], className="d-flex align-items-center"),
             html.Small("Haz clic en cualquier punto para ver detalles por región", className="text-muted")
         ]),
@@ -1976,82 +2123,45 @@ def show_modal_table(timeline_clickData, is_open, region_data):
         point_data = clickData["points"][0]
         print(f"🔍 DEBUG: point_data extraído: {point_data}")
         
-        df = pd.DataFrame(region_data) if region_data else pd.DataFrame()
-        print(f"📊 DEBUG: region_data recibido: {type(region_data)}, length: {len(region_data) if region_data else 'None'}")
-        print(f"📈 DEBUG: DataFrame creado - shape: {df.shape}, columns: {df.columns.tolist() if not df.empty else 'DataFrame vacío'}")
+        # El store solo trae la referencia; el índice fecha×región vive en el servidor
+        try:
+            indice = resultados_servidor.obtener(region_data, calcular_indice_modal) or {}
+        except Exception as e:
+            print(f"❌ DEBUG: No se pudo recuperar el índice del modal: {e}")
+            indice = {}
+        print(f"📊 DEBUG: region_data recibido: {region_data}, {len(indice.get('fechas', {}))} fechas")
         
-        if df.empty:
-            print(f"❌ DEBUG: DataFrame está vacío - retornando mensaje de error")
+        if not indice.get('fechas'):
+            print(f"❌ DEBUG: Índice fecha×región vacío - retornando mensaje de error")
             return False, None, "Sin datos", "No hay información disponible para mostrar."
         
         # Obtener la fecha clicada
         selected_date = point_data['x']
         total_value = point_data['y']
         print(f"📅 DEBUG: Fecha seleccionada: {selected_date}, Total: {total_value}")
-        print(f"📅 DEBUG: Tipo de fecha seleccionada: {type(selected_date)}")
-        
-        # Ver qué fechas están disponibles en el DataFrame
-        unique_dates = df['Date'].unique()[:10]  # Primeras 10 fechas únicas
-        print(f"📆 DEBUG: Primeras fechas disponibles en DataFrame: {unique_dates}")
-        print(f"📆 DEBUG: Tipo de fechas en DataFrame: {type(df['Date'].iloc[0]) if not df.empty else 'N/A'}")
         
-        # Filtrar datos de esa fecha específica
-        df_date = df[df['Date'] == selected_date].copy()
-        print(f"🗓️ DEBUG: Datos filtrados por fecha - shape: {df_date.shape}")
+        # Búsqueda directa en el índice por fecha ('YYYY-MM-DD', sin convertir la serie completa)
+        valores_fecha = indice['fechas'].get(str(selected_date)[:10])
         
-        # Si no hay datos, intentar convertir la fecha a diferentes formatos
-        if df_date.empty:
-            print(f"🔄 DEBUG: Intentando conversiones de fecha...")
-            # Intentar convertir la fecha seleccionada a datetime
-            try:
-                from datetime import datetime
-                if isinstance(selected_date, str):
-                    selected_date_dt = pd.to_datetime(selected_date)
-                    print(f"🔄 DEBUG: Fecha convertida a datetime: {selected_date_dt}")
-                    # Intentar filtrar con la fecha convertida
-                    df_date = df[df['Date'] == selected_date_dt].copy()
-                    print(f"🔄 DEBUG: Datos filtrados con fecha convertida - shape: {df_date.shape}")
-                
-                # Si aún no hay datos, intentar convertir las fechas del DataFrame
-                if df_date.empty:
-                    print(f"🔄 DEBUG: Convirtiendo fechas del DataFrame...")
-                    df['Date'] = pd.to_datetime(df['Date'])
-                    df_date = df[df['Date'] == selected_date_dt].copy()
-                    print(f"🔄 DEBUG: Datos filtrados después de conversión DF - shape: {df_date.shape}")
-                    
-            except Exception as e:
-                print(f"❌ DEBUG: Error en conversión de fechas: {e}")
-        
-        print(f"🔍 DEBUG: Primeras filas de df_date: {df_date.head(3).to_dict() if not df_date.empty else 'No hay datos'}")
-        
-        if df_date.empty:
+        if not valores_fecha:
             print(f"❌ DEBUG: No hay datos para la fecha {selected_date}")
             return False, None, f"Sin datos para {selected_date}", f"No se encontraron datos para la fecha {selected_date}."
         
-        # Agrupar por región para esa fecha
-        region_summary = df_date.groupby('Region')['Value'].sum().reset_index()
-        region_summary = region_summary.sort_values('Value', ascending=False)
-        region_summary = region_summary.rename(columns={'Region': 'Región', 'Value': 'Caudal (GWh)'})
+        # Desglose por región para esa fecha (solo regiones con registros ese día)
+        region_summary = pd.DataFrame({'Región': indice['regiones'], 'Caudal (GWh)': valores_fecha})
+        region_summary = region_summary.dropna(subset=['Caudal (GWh)'])
+        region_summary = region_summary.sort_values('Caudal (GWh)', ascending=False)
         print(f"📊 DEBUG: region_summary creado - shape: {region_summary.shape}")
-        print(f"📈 DEBUG: region_summary contenido: {region_summary.to_dict() if not region_summary.empty else 'Vacío'}")
         
         # Calcular participación porcentual
         total = region_summary['Caudal (GWh)'].sum()
         print(f"💰 DEBUG: Total calculado: {total}")
         
-        if total > 0:
-            region_summary['Participación (%)'] = (region_summary['Caudal (GWh)'] / total * 100).round(2)
-            # Ajustar para que sume exactamente 100%
-            diferencia = 100 - region_summary['Participación (%)'].sum()
-            if abs(diferencia) > 0.001:
-                idx_max = region_summary['Participación (%)'].idxmax()
-                region_summary.loc[idx_max, 'Participación (%)'] += diferencia
-                region_summary['Participación (%)'] = region_summary['Participación (%)'].round(2)
-        else:
-            region_summary['Participación (%)'] = 0
+        # Participación que suma exactamente 100% (0 si el total no es positivo)
+        region_summary['Participación (%)'] = participacion(region_summary['Caudal (GWh)'])
         
         # Formatear números
-        region_summary['Caudal (GWh)'] = region_summary['Caudal (GWh)'].apply(format_number)
+        region_summary['Caudal (GWh)'] = format_numbers(region_summary['Caudal (GWh)'])
         
         # Agregar fila total
         total_row = {
@@ -2087,10 +2197,16 @@ def show_modal_table(timeline_clickData, is_open, region_data):
         )
         
         # Crear título y descripción
-        formatted_date = format_date(selected_date)
         total_regions = len(region_summary) - 1 if len(region_summary) > 0 else 0
-        title = f"📅 Detalles del {formatted_date} - Total Nacional: {format_number(total_value)} GWh"
-        description = f"Detalle por región hidrológica para el día {formatted_date}. Se muestran los aportes de caudal de {total_regions} regiones que registraron actividad en esta fecha, con su respectiva participación porcentual sobre el total nacional de {format_number(total_value)} GWh."
+        if indice.get('frecuencia') == 'M':
+            # Rangos largos: cada punto es el total de un mes
+            formatted_month = format_month(selected_date)
+            title = f"📅 Detalles de {formatted_month} - Total Nacional: {format_number(total_value)} GWh"
+            description = f"Detalle por región hidrológica para el mes de {formatted_month}. Se muestran los aportes de caudal acumulados en el mes de {total_regions} regiones que registraron actividad en ese período, con su respectiva participación porcentual sobre el total nacional mensual de {format_number(total_value)} GWh."
+        else:
+            formatted_date = format_date(selected_date)
+            title = f"📅 Detalles del {formatted_date} - Total Nacional: {format_number(total_value)} GWh"
+            description = f"Detalle por región hidrológica para el día {formatted_date}. Se muestran los aportes de caudal de {total_regions} regiones que registraron actividad en esta fecha, con su respectiva participación porcentual sobre el total nacional de {format_number(total_value)} GWh."
         
         print(f"✅ DEBUG: Título: {title}")
         print(f"✅ DEBUG: Descripción: {description}")
@@ -2108,7 +2224,7 @@ def show_modal_table(timeline_clickData, is_open, region_data):
 
 def create_stats_summary(data):
     """Crear resumen estadístico"""
-    numeric_data = data.select_dtypes(include=['float64', 'int64'])
+    numeric_data = data.select_dtypes(include='number')
     
     if numeric_data.empty:
         return dbc.Alert("No hay datos numéricos para análisis estadístico.", color="warning")
@@ -2154,6 +2270,7 @@ if __name__ == '__main__':
     print(f"📡 Endpoints disponibles:")
     print(f"   - Dashboard: http://{host}:{port}")
     print(f"   - Health Check: http://{host}:{port}/health")
+    print(f"   - Readiness: http://{host}:{port}/ready")
     print(f"   - API Status: http://{host}:{port}/api/status") 
     print(f"   - App Info: http://{host}:{port}/api/info")
     
@@ -0,0 +1,79 @@
+"""
+Compresión de respuestas del servidor Flask del Dashboard Hidrológico MME
+Ministerio de Minas y Energía de Colombia
+
+Las respuestas de los callbacks (tablas, figuras, dcc.Store) y de /api/* son
+JSON grandes y muy repetitivos. `instalar_compresion` registra un
+after_request que las comprime con brotli (si el paquete `brotli` está
+instalado y el navegador lo acepta) o con gzip, a partir de
+XM_COMPRESION_MIN_BYTES. En enlaces regionales lentos la espera es casi
+toda transferencia, no tiempo de servidor.
+"""
+
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin el paquete se usa solo gzip
+    brotli = None
+
+# Respuestas más pequeñas que esto se envían sin comprimir
+MIN_BYTES = int(os.environ.get('XM_COMPRESION_MIN_BYTES', 1024))
+
+# Nivel de gzip (1-9) y de brotli (0-11); niveles altos cuestan CPU por respuesta
+NIVEL_GZIP = int(os.environ.get('XM_COMPRESION_NIVEL', 6))
+NIVEL_BROTLI = int(os.environ.get('XM_COMPRESION_NIVEL_BROTLI', 5))
+
+# Rutas comprimidas: callbacks y layout de Dash, y la API JSON
+RUTAS = ('/_dash-update-component', '/_dash-layout', '/api/')
+
+TIPOS = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+
+def codificacion_aceptada(aceptadas):
+    """'br', 'gzip' o None según el Accept-Encoding del navegador"""
+    if brotli is not None and aceptadas['br'] > 0:
+        return 'br'
+    if aceptadas['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def comprimir(datos, codificacion):
+    """Cuerpo comprimido con 'br' o 'gzip'"""
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=NIVEL_BROTLI)
+    return gzip.compress(datos, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def instalar_compresion(server, rutas=None, min_bytes=None):
+    """Registrar la compresión de respuestas en la aplicación Flask `server`"""
+    rutas = tuple(rutas or RUTAS)
+    min_bytes = MIN_BYTES if min_bytes is None else min_bytes
+
+    @server.after_request
+    def comprimir_respuesta(respuesta):
+        # Con un prefijo de URL (requests_pathname_prefix) la ruta no empieza en '/_dash'
+        if not any(ruta in request.path for ruta in rutas):
+            return respuesta
+        if (respuesta.status_code != 200 or respuesta.direct_passthrough or respuesta.is_streamed
+                or 'Content-Encoding' in respuesta.headers
+                or respuesta.mimetype not in TIPOS):
+            return respuesta
+        respuesta.vary.add('Accept-Encoding')
+        codificacion = codificacion_aceptada(request.accept_encodings)
+        datos = respuesta.get_data()
+        if codificacion is None or len(datos) < min_bytes:
+            return respuesta
+        try:
+            respuesta.set_data(comprimir(datos, codificacion))
+        except Exception as e:
+            print(f"Error comprimiendo respuesta de {request.path}: {e}")
+            return respuesta
+        respuesta.headers['Content-Encoding'] = codificacion
+        return respuesta
+
+    return comprimir_respuesta
@@ -0,0 +1,134 @@
+"""
+Preparación de series para las figuras Plotly del Dashboard Hidrológico MME
+Ministerio de Minas y Energía de Colombia
+
+Por encima de XM_UMBRAL_WEBGL puntos por figura las trazas se dibujan con
+WebGL (Scattergl) en vez de SVG. Las series se mandan compactas: fechas
+como 'YYYY-MM-DD' (sin la hora 'T00:00:00' que agrega el serializador) y
+valores redondeados a XM_DECIMALES_GRAFICO decimales (el hover muestra 2).
+
+Nota: los arreglos binarios en base64 ({'dtype', 'bdata'}) necesitan
+plotly.js >= 2.28; con plotly 5.17 (plotly.js 2.26) el navegador no los
+entiende, por eso aquí se compacta el JSON en lugar de codificarlo.
+
+`memorizar_figura` guarda la figura ya armada y serializada (dict) de una
+función constructora, con clave en la huella de los datos de entrada más los
+demás parámetros: ver otra vez la misma ventana (la vista por defecto, otro
+usuario, el mismo clic) no vuelve a pasar por plotly express ni por los
+update_layout/update_traces.
+"""
+
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Puntos (sumando todas las trazas) desde los que una figura usa WebGL
+UMBRAL_WEBGL = int(os.environ.get('XM_UMBRAL_WEBGL', 1000))
+
+# Decimales de los valores que se envían al navegador
+DECIMALES_GRAFICO = int(os.environ.get('XM_DECIMALES_GRAFICO', 3))
+
+# Figuras serializadas que se conservan en memoria (LRU)
+CACHE_FIGURAS_MAX = int(os.environ.get('XM_CACHE_FIGURAS', 64))
+
+
+def modo_render(puntos):
+    """render_mode de plotly express según el total de puntos de la figura"""
+    return 'webgl' if puntos > UMBRAL_WEBGL else 'svg'
+
+
+def compactar_serie(df, columna_x, columna_y):
+    """
+    Copia de `df` lista para graficar: fechas de `columna_x` como texto ISO
+    corto y `columna_y` redondeada. Las fechas con hora conservan la hora.
+    """
+    if df is None or df.empty:
+        return df
+    df = df.copy()
+    x = df[columna_x]
+    if not pd.api.types.is_numeric_dtype(x):
+        fechas = pd.to_datetime(x)
+        con_hora = (fechas != fechas.dt.normalize()).any()
+        df[columna_x] = fechas.dt.strftime('%Y-%m-%d %H:%M' if con_hora else '%Y-%m-%d')
+    df[columna_y] = pd.to_numeric(df[columna_y], errors='coerce').round(DECIMALES_GRAFICO)
+    return df
+
+
+def huella(df):
+    """
+    Hash corto del contenido de `df` (índice, columnas, tipos y valores),
+    mucho más barato que armar la figura.
+    """
+    if df is None:
+        return None
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class CacheFiguras:
+    """LRU acotado de figuras serializadas, compartido por los callbacks"""
+
+    def __init__(self, max_entradas=None):
+        self.max_entradas = max_entradas or CACHE_FIGURAS_MAX
+        self._figuras = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            figura = self._figuras.get(clave)
+            if figura is None:
+                self.fallos += 1
+                return None
+            self._figuras.move_to_end(clave)
+            self.aciertos += 1
+            return figura
+
+    def guardar(self, clave, figura):
+        with self._lock:
+            self._figuras[clave] = figura
+            self._figuras.move_to_end(clave)
+            while len(self._figuras) > self.max_entradas:
+                self._figuras.popitem(last=False)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._figuras),
+                'max_entradas': self.max_entradas,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+            }
+
+
+cache_figuras = CacheFiguras()
+
+
+def memorizar_figura(funcion):
+    """
+    Decorador para funciones `funcion(data, *args, **kwargs)` que devuelven
+    una figura Plotly. Devuelve la figura como dict (lo que acepta
+    dcc.Graph) y la reutiliza mientras los datos y parámetros sean iguales.
+    El dict se comparte entre llamadas: no se debe modificar.
+    """
+    @functools.wraps(funcion)
+    def envoltura(data, *args, **kwargs):
+        try:
+            clave = (funcion.__name__, huella(data), args, tuple(sorted(kwargs.items())))
+            hash(clave)
+        except TypeError as e:
+            print(f"⚠️ Figura sin memorizar ({funcion.__name__}): {e}")
+            return funcion(data, *args, **kwargs).to_dict()
+        figura = cache_figuras.obtener(clave)
+        if figura is None:
+            figura = funcion(data, *args, **kwargs).to_dict()
+            cache_figuras.guardar(clave, figura)
+        return figura
+    return envoltura
@@ -0,0 +1,76 @@
+"""
+Formateo de números para las tablas del Dashboard Hidrológico MME
+Ministerio de Minas y Energía de Colombia
+
+Los valores se muestran con dos decimales y puntos como separador de miles
+(1234567.891 -> '1.234.567.89'). `format_numbers` da exactamente la misma
+salida que `format_number` para una columna completa, armando los textos en
+bloque con pyarrow en vez de un f-string por celda.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Por debajo de este tamaño el formateo celda por celda es más rápido
+MIN_VECTORIZADO = 64
+
+
+def format_number(value):
+    """Formatear números con separadores de miles usando puntos"""
+    if pd.isna(value) or not pd.api.types.is_number(value):
+        return value
+
+    # Formatear con separador de miles usando puntos (formato colombiano)
+    return f"{value:,.2f}".replace(",", ".")
+
+
+def format_numbers(valores):
+    """
+    `format_number` aplicado a toda una columna (Series, lista o array).
+    Los valores no numéricos (p. ej. 'TOTAL') y los faltantes quedan igual.
+    Devuelve una Series de objetos con el mismo índice.
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    if len(serie) < MIN_VECTORIZADO:
+        return serie.map(format_number).astype(object)
+    if pd.api.types.is_numeric_dtype(serie):
+        es_numero = np.ones(len(serie), dtype=bool)
+    else:
+        es_numero = np.fromiter((pd.api.types.is_number(v) for v in serie), dtype=bool, count=len(serie))
+    es_numero &= serie.notna().to_numpy()
+    resultado = serie.astype(object).to_numpy(copy=True)
+    if es_numero.any():
+        numeros = pd.to_numeric(serie[es_numero]).to_numpy(dtype='float64', na_value=np.nan)
+        resultado[es_numero] = _formatear_bloque(numeros)
+    return pd.Series(resultado, index=serie.index, name=serie.name, dtype=object)
+
+
+def _formatear_bloque(x):
+    """Textos '1.234.567.89' de un array float64 en una pasada"""
+    with np.errstate(invalid='ignore'):
+        y = np.abs(x) * 100
+        centavos = np.round(y)
+        # Faltantes, infinitos, magnitudes enormes y casi empates de redondeo
+        # (donde x*100 puede diferir del redondeo exacto) van uno a uno
+        uno_a_uno = ~np.isfinite(x) | (y >= 1e15) | (np.abs(y - np.floor(y) - 0.5) < 1e-6)
+    centavos = np.where(uno_a_uno, 0, centavos).astype('int64')
+    entero = centavos // 100
+
+    # Grupos de tres cifras rellenos con ceros y unidos con '.'; luego se
+    # quitan los ceros y puntos sobrantes a la izquierda
+    grupos = len(str(int(entero.max()))) // 3 + 1 if len(entero) else 1
+    partes = [pc.utf8_lpad(pa.array((entero // 1000 ** i) % 1000).cast(pa.string()), 3, '0')
+              for i in range(grupos - 1, -1, -1)]
+    texto = pc.utf8_ltrim(pc.binary_join_element_wise(*partes, '.'), '0.')
+    texto = pc.if_else(pc.equal(pc.utf8_length(texto), 0), '0', texto)
+    decimales = pc.utf8_lpad(pa.array(centavos % 100).cast(pa.string()), 2, '0')
+    texto = pc.binary_join_element_wise(texto, decimales, '.')
+    # signbit conserva el '-0.00' de los negativos que redondean a cero
+    texto = pc.if_else(pa.array(np.signbit(x)), pc.binary_join_element_wise('-', texto, ''), texto)
+
+    resultado = np.asarray(texto.to_numpy(zero_copy_only=False), dtype=object)
+    for i in np.flatnonzero(uno_a_uno):
+        resultado[i] = format_number(x[i])
+    return resultado
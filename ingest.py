@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Proceso de ingesta de datos XM para el Dashboard Hidrológico MME
+Ministerio de Minas y Energía de Colombia
+
+Descarga periódicamente AporCaudal, CapaUtilDiarEner y los listados de
+referencia al almacén local, desacoplado de los workers de Dash. Con
+XM_SOLO_LECTURA=true el dashboard solo lee ese almacén y nunca espera a XM.
+
+Uso: python ingest.py [--once]
+"""
+
+import os
+import signal
+import sys
+import time
+from datetime import date, timedelta
+
+from xm_data import ClienteXM, FECHAS_CAPACIDAD, FECHAS_CATALOGO
+from xm_replay import fabrica_api_xm
+from xm_store import AgregadosCaudal, AlmacenLocal, IndiceRios
+
+# Configuración (variables de entorno)
+INTERVALO = float(os.environ.get('XM_INGESTA_INTERVALO', 900))
+DIAS_RECIENTES = int(os.environ.get('XM_INGESTA_DIAS', 30))
+DIAS_HISTORIA = int(os.environ.get('XM_INGESTA_HISTORIA_DIAS', 365))
+REINTENTOS = int(os.environ.get('XM_INGESTA_REINTENTOS', 3))
+
+detener = False
+
+
+def construir_cliente():
+    """Cliente XM con escritura al almacén local, índice de ríos y agregados (sin caché en memoria)"""
+    almacen = AlmacenLocal()
+    indice_rios = IndiceRios(almacen=almacen)
+    indice_rios.reconstruir_si_falta()
+    return ClienteXM(fabrica_api=fabrica_api_xm, almacen=almacen, indice_rios=indice_rios,
+                     agregados=AgregadosCaudal(almacen))
+
+
+def tareas_ingesta(primer_ciclo):
+    """Consultas de cada ciclo: (coleccion, metrica, inicio, fin)"""
+    hoy = date.today()
+    dias_caudal = DIAS_HISTORIA if primer_ciclo else DIAS_RECIENTES
+    return [
+        ('ListadoRios', 'Sistema', *FECHAS_CATALOGO),
+        ('ListadoEmbalses', 'Sistema', *FECHAS_CATALOGO),
+        ('AporCaudal', 'Rio', (hoy - timedelta(days=dias_caudal)).isoformat(), hoy.isoformat()),
+        ('CapaUtilDiarEner', 'Embalse', *FECHAS_CAPACIDAD),
+        ('CapaUtilDiarEner', 'Embalse', (hoy - timedelta(days=DIAS_RECIENTES)).isoformat(), hoy.isoformat()),
+    ]
+
+
+def ejecutar_tarea(cliente, coleccion, metrica, inicio, fin):
+    """Ejecutar una consulta con reintentos y espera exponencial"""
+    for intento in range(1, REINTENTOS + 1):
+        try:
+            t0 = time.time()
+            data = cliente.request_data(coleccion, metrica, inicio, fin)
+            filas = 0 if data is None else len(data)
+            print(f"✅ {coleccion}/{metrica} {inicio} a {fin}: {filas} filas en {time.time() - t0:.1f}s")
+            return True
+        except Exception as e:
+            espera = 5 * 2 ** (intento - 1)
+            print(f"❌ {coleccion}/{metrica} intento {intento}/{REINTENTOS}: {e}")
+            if intento < REINTENTOS and not detener:
+                time.sleep(espera)
+    return False
+
+
+def ejecutar_ciclo(cliente, primer_ciclo=False):
+    """Un ciclo completo de ingesta; devuelve cuántas tareas fallaron"""
+    fallidas = 0
+    for tarea in tareas_ingesta(primer_ciclo):
+        if detener:
+            break
+        if not ejecutar_tarea(cliente, *tarea):
+            fallidas += 1
+    return fallidas
+
+
+def manejar_senal(signum, frame):
+    """Terminar al final de la tarea en curso (SIGTERM/SIGINT)"""
+    global detener
+    print("\n⏹️  Deteniendo ingesta...")
+    detener = True
+
+
+def main():
+    """Función principal"""
+    signal.signal(signal.SIGTERM, manejar_senal)
+    signal.signal(signal.SIGINT, manejar_senal)
+    una_vez = '--once' in sys.argv
+
+    print(f"📥 Iniciando ingesta XM -> {AlmacenLocal().ruta}")
+    print(f"⏱️  Intervalo: {INTERVALO:.0f}s | Días recientes: {DIAS_RECIENTES} | Historia inicial: {DIAS_HISTORIA}")
+
+    cliente = construir_cliente()
+    primer_ciclo = True
+    while not detener:
+        t0 = time.time()
+        fallidas = ejecutar_ciclo(cliente, primer_ciclo)
+        primer_ciclo = False
+        print(f"🔁 Ciclo de ingesta terminado en {time.time() - t0:.1f}s ({fallidas} tareas fallidas)")
+        if una_vez:
+            sys.exit(1 if fallidas else 0)
+
+        siguiente = time.time() + INTERVALO
+        while not detener and time.time() < siguiente:
+            time.sleep(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Cálculo de participación porcentual para el Dashboard Hidrológico MME
+Ministerio de Minas y Energía de Colombia
+
+Un solo motor para todas las tablas de participación: reparte el 100% de
+cada grupo con el método del mayor residuo (Hamilton), de modo que los
+porcentajes redondeados sumen exactamente 100 en cada grupo. Todos los
+grupos de un nivel de la jerarquía (p. ej. los embalses de todas las
+regiones) se calculan en una sola pasada vectorizada.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def participacion(valores, grupos=None, decimales=2):
+    """
+    Participación porcentual de cada valor dentro de su grupo.
+
+    Cada porcentaje se lleva a unidades de 10^-decimales y se trunca; las
+    unidades que faltan para llegar a 100 se reparten a los mayores residuos.
+    Empates (determinista): mayor residuo, luego mayor valor, luego el que
+    aparece primero. Los grupos sin total positivo quedan en 0 y los valores
+    faltantes cuentan como 0.
+
+    Args:
+        valores: secuencia numérica (lista, array o Series)
+        grupos: etiqueta de grupo por valor (None = un solo grupo)
+        decimales: decimales de los porcentajes resultantes
+
+    Returns:
+        np.ndarray de float64 con los porcentajes, en el orden de `valores`
+    """
+    valores = np.nan_to_num(np.asarray(valores, dtype='float64'), nan=0.0)
+    n = len(valores)
+    if n == 0:
+        return np.zeros(0)
+    if grupos is None:
+        codigos = np.zeros(n, dtype='int64')
+    else:
+        codigos = pd.factorize(pd.Series(grupos, copy=False), use_na_sentinel=False)[0]
+    num_grupos = codigos.max() + 1
+
+    escala = 10 ** decimales
+    unidades_total = 100 * escala
+    totales = np.bincount(codigos, weights=valores, minlength=num_grupos)
+    total_fila = totales[codigos]
+    con_total = total_fila > 0
+
+    exactos = np.zeros(n)
+    np.divide(valores * unidades_total, total_fila, out=exactos, where=con_total)
+    unidades = np.floor(exactos)
+    residuos = exactos - unidades
+
+    # Unidades que faltan en cada grupo para llegar exactamente a 100
+    faltantes = unidades_total - np.bincount(codigos, weights=unidades, minlength=num_grupos)
+    faltantes[totales <= 0] = 0
+
+    # Orden dentro de cada grupo: mayor residuo, mayor valor, posición original
+    orden = np.lexsort((np.arange(n), -valores, -residuos, codigos))
+    codigos_ordenados = codigos[orden]
+    inicio_grupo = np.searchsorted(codigos_ordenados, codigos_ordenados, side='left')
+    rango = np.arange(n) - inicio_grupo
+    recibe = rango < faltantes[codigos_ordenados]
+    unidades[orden[recibe]] += 1
+
+    return np.where(con_total, unidades / escala, 0.0)
+
+
+def agregar_participacion(df, columna_valor, grupo=None, columna='Participación (%)', decimales=2):
+    """Copia de `df` con la columna de participación (por grupo si se indica la columna de grupo)"""
+    df = df.copy()
+    grupos = df[grupo] if grupo is not None else None
+    df[columna] = participacion(df[columna_valor], grupos, decimales) if not df.empty else []
+    return df
@@ -69,13 +69,30 @@ def start_production():
         print("\n⏹️  Deteniendo servidor de producción...")
         return None
 
+def start_ingest(once=False):
+    """Iniciar el proceso de ingesta de datos XM (independiente de los workers web)"""
+    env_prefix = check_virtual_env()
+    
+    cmd = f"{env_prefix}python ingest.py{' --once' if once else ''}"
+    
+    print(f"📥 Iniciando ingesta de datos XM...")
+    print(f"🔁 Intervalo: {os.environ.get('XM_INGESTA_INTERVALO', '900')}s")
+    print(f"📝 Comando: {cmd}")
+    
+    try:
+        process = subprocess.Popen(cmd, shell=True)
+        return process
+    except KeyboardInterrupt:
+        print("\n⏹️  Deteniendo ingesta...")
+        return None
+
 def show_status():
     """Mostrar estado de los endpoints"""
     import requests
     import json
     
     base_url = "http://localhost:8050"
-    endpoints = ['/health', '/api/status', '/api/info']
+    endpoints = ['/health', '/ready', '/api/status', '/api/info']
     
     print("📊 Estado de los endpoints:")
     print("=" * 50)
@@ -106,6 +123,7 @@ Comandos disponibles:
   start           - Iniciar en modo desarrollo (debug=False)
   dev             - Iniciar en modo desarrollo (debug=True)
   prod            - Iniciar en modo producción (Gunicorn)
+  ingest          - Iniciar la ingesta periódica de datos XM (--once: un solo ciclo)
   status          - Mostrar estado de endpoints
   help            - Mostrar esta ayuda
 
@@ -113,6 +131,7 @@ Ejemplos:
   python server.py start
   python server.py dev --port 3000
   python server.py prod
+  python server.py ingest
   python server.py status
         """)
         sys.exit(1)
@@ -155,6 +174,14 @@ Ejemplos:
             except KeyboardInterrupt:
                 process.terminate()
     
+    elif command == 'ingest':
+        process = start_ingest(once='--once' in sys.argv)
+        if process:
+            try:
+                process.wait()
+            except KeyboardInterrupt:
+                process.terminate()
+    
     elif command == 'status':
         show_status()
     
@@ -170,6 +197,7 @@ Comandos disponibles:
   start           - Iniciar en modo desarrollo (debug=False)
   dev             - Iniciar en modo desarrollo (debug=True)
   prod            - Iniciar en modo producción (Gunicorn)
+  ingest          - Iniciar la ingesta periódica de datos XM (--once: un solo ciclo)
   status          - Mostrar estado de endpoints
   help            - Mostrar esta ayuda
 
@@ -177,6 +205,7 @@ Ejemplos:
   python server.py start
   python server.py dev --port 3000
   python server.py prod
+  python server.py ingest
   python server.py status
         """)
     
@@ -0,0 +1,96 @@
+"""
+Submuestreo de series largas para los gráficos del Dashboard Hidrológico MME
+Ministerio de Minas y Energía de Colombia
+
+Con rangos de varios años un gráfico diario manda miles de puntos (y
+marcadores) al navegador, más de los que caben en el ancho del gráfico.
+`submuestrear` deja cada traza en XM_PUNTOS_GRAFICO puntos como máximo con
+Largest-Triangle-Three-Buckets (LTTB), que conserva la forma de la serie, y
+agrega siempre el máximo y el mínimo para que no se pierdan picos ni
+valles. Los puntos elegidos son filas reales, así que el hover y el clic
+para ver el detalle de una fecha siguen funcionando igual.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Puntos máximos por traza (del orden del ancho del gráfico en píxeles)
+PUNTOS_GRAFICO = int(os.environ.get('XM_PUNTOS_GRAFICO', 1200))
+
+
+def lttb(x, y, objetivo):
+    """
+    Índices (ordenados) de los puntos elegidos por LTTB.
+
+    `x` e `y` son arrays numéricos de igual largo con `x` ordenado. Se
+    conservan el primer y el último punto; si la serie ya tiene `objetivo`
+    puntos o menos se devuelven todos.
+    """
+    n = len(y)
+    if objetivo >= n or objetivo < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+
+    # Cubetas [bordes[i], bordes[i+1]) para los puntos interiores; después de
+    # la última cubeta sigue el último punto
+    tamano = (n - 2) / (objetivo - 2)
+    bordes = np.append(np.floor(np.arange(objetivo - 1) * tamano).astype('int64') + 1, n)
+    # Promedio de cada cubeta (el triángulo se cierra con el promedio de la siguiente)
+    suma_x = np.concatenate(([0.0], np.cumsum(x)))
+    suma_y = np.concatenate(([0.0], np.cumsum(y)))
+    largo = bordes[1:] - bordes[:-1]
+    promedio_x = (suma_x[bordes[1:]] - suma_x[bordes[:-1]]) / largo
+    promedio_y = (suma_y[bordes[1:]] - suma_y[bordes[:-1]]) / largo
+
+    elegidos = np.empty(objetivo, dtype='int64')
+    elegidos[0], elegidos[-1] = 0, n - 1
+    anterior = 0
+    for i in range(objetivo - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        ax, ay = x[anterior], y[anterior]
+        area = np.abs((ax - promedio_x[i + 1]) * (y[inicio:fin] - ay)
+                      - (ax - x[inicio:fin]) * (promedio_y[i + 1] - ay))
+        anterior = inicio + int(np.argmax(area))
+        elegidos[i + 1] = anterior
+    return elegidos
+
+
+def submuestrear(df, columna_x, columna_y, objetivo=None, grupo=None):
+    """
+    Filas de `df` ordenadas por `columna_x`, con a lo sumo `objetivo` puntos
+    (más el máximo y el mínimo) por traza. Con `grupo` (p. ej. 'Region') cada
+    traza se submuestrea por separado. Si no hace falta, devuelve `df` igual.
+    """
+    objetivo = objetivo or PUNTOS_GRAFICO
+    if df is None or df.empty:
+        return df
+    tamano_traza = df.groupby(grupo, observed=True).size().max() if grupo else len(df)
+    if tamano_traza <= objetivo:
+        return df
+
+    df = df.sort_values(columna_x, kind='stable')
+    if grupo:
+        partes = [_submuestrear_traza(parte, columna_x, columna_y, objetivo)
+                  for _, parte in df.groupby(grupo, observed=True, sort=False)]
+        return pd.concat(partes)
+    return _submuestrear_traza(df, columna_x, columna_y, objetivo)
+
+
+def _submuestrear_traza(df, columna_x, columna_y, objetivo):
+    if len(df) <= objetivo:
+        return df
+    x = df[columna_x]
+    if pd.api.types.is_numeric_dtype(x):
+        x = x.to_numpy(dtype='float64')
+    else:
+        x = pd.to_datetime(x).to_numpy(dtype='datetime64[ns]').astype('int64')
+    y = df[columna_y].to_numpy(dtype='float64', na_value=np.nan)
+    indices = lttb(x, y, objetivo)
+    # El pico y el valle de la traza siempre quedan visibles
+    if not np.isnan(y).all():
+        indices = np.union1d(indices, [np.nanargmax(y), np.nanargmin(y)])
+    return df.iloc[indices]
+
@@ -0,0 +1,52 @@
+"""Pruebas de serie_agregada en workers de solo lectura: no se escribe nada en el almacén"""
+
+import pandas as pd
+import pytest
+
+from xm_data import ClienteXM
+from xm_replay import ReadDBSimulado
+from xm_store import AgregadosCaudal, AlmacenLocal
+
+
+def archivos(ruta):
+    """Ruta relativa y mtime de cada archivo bajo `ruta`"""
+    return {str(p.relative_to(ruta)): p.stat().st_mtime_ns for p in ruta.rglob('*') if p.is_file()}
+
+
+@pytest.fixture
+def ingesta(tmp_path):
+    almacen = AlmacenLocal(ruta=tmp_path, ttl_reciente=1e9)
+    return ClienteXM(api=ReadDBSimulado(modo='sintetico', num_rios=4, num_embalses=2), almacen=almacen,
+                     agregados=AgregadosCaudal(almacen))
+
+
+def lector(ruta):
+    almacen = AlmacenLocal(ruta=ruta, ttl_reciente=1e9)
+    return ClienteXM(almacen=almacen, agregados=AgregadosCaudal(almacen), solo_lectura=True)
+
+
+@pytest.mark.parametrize('nivel', ['nacional', 'region', 'rio'])
+@pytest.mark.parametrize('frecuencia', ['D', 'M'])
+def test_solo_lectura_agrega_en_memoria_sin_escribir(tmp_path, ingesta, nivel, frecuencia):
+    ingesta.serie_agregada('nacional', '2024-01-01', '2024-02-15')
+    # Días guardados por la ingesta que todavía no pasaron a los agregados
+    datos = ingesta.request_data('AporCaudal', 'Rio', '2024-02-16', '2024-03-10')
+    assert not datos.empty
+    antes = archivos(tmp_path)
+
+    serie = lector(tmp_path).serie_agregada(nivel, '2024-01-10', '2024-03-10', frecuencia)
+
+    assert archivos(tmp_path) == antes
+    esperada = ingesta.serie_agregada(nivel, '2024-01-10', '2024-03-10', frecuencia)
+    pd.testing.assert_frame_equal(serie.reset_index(drop=True), esperada.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_solo_lectura_sin_agregados_no_crea_archivos(tmp_path, ingesta):
+    ingesta.request_data('AporCaudal', 'Rio', '2024-01-01', '2024-01-31')
+    antes = archivos(tmp_path)
+
+    serie = lector(tmp_path).serie_agregada('nacional', '2024-01-01', '2024-01-31')
+
+    assert archivos(tmp_path) == antes
+    assert len(serie) == 31
@@ -0,0 +1,81 @@
+"""Pruebas de ida y vuelta del AlmacenLocal (escribir y leer días, marcas de vacío, catálogos)"""
+
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from xm_replay import ReadDBSimulado
+from xm_store import AlmacenLocal
+
+
+@pytest.fixture
+def api():
+    return ReadDBSimulado(modo='sintetico', num_rios=3, num_embalses=2)
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenLocal(ruta=tmp_path, ttl_reciente=1e9)
+
+
+def ordenado(df):
+    return df.sort_values(['Date', 'Name']).reset_index(drop=True)
+
+
+def test_escribir_y_leer_conserva_las_filas(almacen, api):
+    df = api.request_data('AporCaudal', 'Rio', '2024-03-01', '2024-03-31')
+    almacen.escribir('AporCaudal', 'Rio', df, '2024-03-01', '2024-03-31')
+
+    leido = almacen.leer('AporCaudal', 'Rio', '2024-03-01', '2024-03-31')
+
+    pd.testing.assert_frame_equal(ordenado(leido), ordenado(df), check_dtype=False)
+    assert almacen.dias_faltantes('AporCaudal', 'Rio', '2024-03-01', '2024-03-31') == []
+
+
+def test_leer_subrango_y_dias_sin_guardar(almacen, api):
+    df = api.request_data('AporCaudal', 'Rio', '2024-03-01', '2024-03-31')
+    almacen.escribir('AporCaudal', 'Rio', df, '2024-03-01', '2024-03-31')
+
+    leido = almacen.leer('AporCaudal', 'Rio', '2024-03-25', '2024-04-05')
+
+    fechas = pd.to_datetime(leido['Date']).dt.date
+    assert fechas.min() == date(2024, 3, 25) and fechas.max() == date(2024, 3, 31)
+    assert almacen.dias_faltantes('AporCaudal', 'Rio', '2024-03-30', '2024-04-02') == [
+        date(2024, 4, 1), date(2024, 4, 2)]
+    assert almacen.leer('AporCaudal', 'Rio', '2024-05-01', '2024-05-31').empty
+
+
+def test_dias_sin_filas_quedan_marcados_como_vacios(almacen, api):
+    df = api.request_data('AporCaudal', 'Rio', '2024-03-01', '2024-03-10')
+    almacen.escribir('AporCaudal', 'Rio', df, '2024-03-01', '2024-03-15')
+
+    assert almacen.dias_faltantes('AporCaudal', 'Rio', '2024-03-01', '2024-03-15') == []
+    guardados = almacen.dias_guardados('AporCaudal', 'Rio', '2024-03-01', '2024-03-15')
+    assert guardados == {date(2024, 3, d) for d in range(1, 11)}
+
+    # Si XM publica después el día, reemplaza la marca de vacío
+    almacen.escribir('AporCaudal', 'Rio', api.request_data('AporCaudal', 'Rio', '2024-03-12', '2024-03-12'),
+                     '2024-03-12', '2024-03-12')
+    assert date(2024, 3, 12) in almacen.dias_guardados('AporCaudal', 'Rio', '2024-03-01', '2024-03-15')
+    assert not (almacen.ruta / 'AporCaudal' / 'Rio' / '2024-03-12.vacio').exists()
+
+
+def test_reescribir_un_dia_sin_filas_lo_borra(almacen, api):
+    almacen.escribir('AporCaudal', 'Rio', api.request_data('AporCaudal', 'Rio', '2024-03-01', '2024-03-05'),
+                     '2024-03-01', '2024-03-05')
+    almacen.escribir('AporCaudal', 'Rio', pd.DataFrame(), '2024-03-03', '2024-03-03')
+
+    fechas = set(pd.to_datetime(almacen.leer('AporCaudal', 'Rio', '2024-03-01', '2024-03-05')['Date']).dt.date)
+    assert date(2024, 3, 3) not in fechas
+    assert len(fechas) == 4
+
+
+def test_catalogo_ida_y_vuelta(almacen, api):
+    listado = api.request_data('ListadoRios', 'Sistema', '2024-03-01', '2024-03-01')
+    assert almacen.leer_catalogo('ListadoRios', 'Sistema').empty
+
+    almacen.guardar_catalogo('ListadoRios', 'Sistema', listado)
+
+    pd.testing.assert_frame_equal(almacen.leer_catalogo('ListadoRios', 'Sistema').reset_index(drop=True),
+                                  listado.reset_index(drop=True), check_dtype=False)
@@ -0,0 +1,63 @@
+"""Pruebas de CacheConsultas (caché en memoria por rangos de fechas)"""
+
+import pandas as pd
+
+from xm_data import CacheConsultas, ClienteXM
+from xm_replay import ReadDBSimulado
+
+
+def test_rango_vacio_en_cache_sirve_subrangos():
+    # XM respondió un frame vacío (sin columna Date) para todo el mes
+    cache = CacheConsultas(ttl=60, max_entradas=8)
+    cache.guardar('AporCaudal', 'Rio', '2024-03-01', '2024-03-31', pd.DataFrame())
+
+    df = cache.obtener('AporCaudal', 'Rio', '2024-03-10', '2024-03-20')
+
+    assert df is not None
+    assert df.empty
+
+
+class ReadDBVacio:
+    """XM que responde sin filas"""
+
+    def request_data(self, coleccion, metrica, start_date, end_date, filtros=None):
+        return pd.DataFrame()
+
+
+def test_cliente_con_respuesta_vacia_sirve_subrangos():
+    cliente = ClienteXM(api=ReadDBVacio(), cache=CacheConsultas(ttl=60))
+
+    assert cliente.request_data('AporCaudal', 'Rio', '2024-03-01', '2024-03-31').empty
+    assert cliente.request_data('AporCaudal', 'Rio', '2024-03-10', '2024-03-20').empty
+    assert cliente.cache.estadisticas()['hits'] == 1
+
+
+def serie_simulada(inicio, fin):
+    return ReadDBSimulado(modo='sintetico', num_rios=3, num_embalses=2).request_data('AporCaudal', 'Rio', inicio, fin)
+
+
+def test_subrango_se_recorta_de_la_entrada_guardada():
+    cache = CacheConsultas(ttl=60)
+    mes = serie_simulada('2024-03-01', '2024-03-31')
+    cache.guardar('AporCaudal', 'Rio', '2024-03-01', '2024-03-31', mes)
+
+    df = cache.obtener('AporCaudal', 'Rio', '2024-03-10', '2024-03-20')
+
+    fechas = pd.to_datetime(mes['Date'])
+    esperado = mes[(fechas >= '2024-03-10') & (fechas <= '2024-03-20')]
+    assert len(df) == len(esperado) > 0
+    assert pd.to_datetime(df['Date']).between('2024-03-10', '2024-03-20').all()
+    assert cache.estadisticas()['hits'] == 1
+
+
+def test_rango_fuera_de_la_entrada_o_vencido_no_acierta():
+    cache = CacheConsultas(ttl=60)
+    cache.guardar('AporCaudal', 'Rio', '2024-03-01', '2024-03-31', serie_simulada('2024-03-01', '2024-03-31'))
+
+    assert cache.obtener('AporCaudal', 'Rio', '2024-03-20', '2024-04-05') is None
+    assert cache.obtener('AporEnergia', 'Rio', '2024-03-10', '2024-03-20') is None
+
+    cache.ttl = 0
+    assert cache.obtener('AporCaudal', 'Rio', '2024-03-10', '2024-03-20') is None
+    vencida = cache.obtener('AporCaudal', 'Rio', '2024-03-10', '2024-03-20', permitir_vencido=True)
+    assert vencida is not None and vencida.attrs['xm_desactualizado']
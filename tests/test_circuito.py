@@ -0,0 +1,80 @@
+"""Pruebas de las transiciones de estado de CircuitoXM"""
+
+import pytest
+
+from xm_data import CircuitoXM, ClienteXM, XMNoDisponible
+from xm_replay import ReadDBSimulado
+
+
+def abrir(circuito):
+    for _ in range(circuito.umbral):
+        assert circuito.permitir()
+        circuito.registrar(0.1, error=ConnectionError("XM caído"))
+
+
+def vencer_espera(circuito):
+    circuito.abierto_desde -= circuito.espera
+
+
+def test_se_abre_tras_umbral_de_fallos_seguidos():
+    circuito = CircuitoXM(umbral=3, espera=60, lento=10)
+    circuito.registrar(0.1, error=ConnectionError())
+    circuito.registrar(0.1, error=ConnectionError())
+    assert circuito.estado == 'cerrado'
+
+    circuito.registrar(0.1)
+    assert circuito.fallos == 0
+
+    abrir(circuito)
+    assert circuito.estado == 'abierto'
+    assert circuito.rechaza()
+    assert not circuito.permitir()
+    assert circuito.resumen()['rechazadas'] == 1
+    assert circuito.resumen()['aperturas'] == 1
+
+
+def test_llamadas_lentas_cuentan_como_fallos():
+    circuito = CircuitoXM(umbral=2, espera=60, lento=1)
+    circuito.registrar(5)
+    circuito.registrar(5)
+    assert circuito.estado == 'abierto'
+
+
+def test_sondeo_exitoso_cierra_el_circuito():
+    circuito = CircuitoXM(umbral=1, espera=60, lento=10)
+    abrir(circuito)
+    vencer_espera(circuito)
+    assert not circuito.rechaza()
+
+    assert circuito.permitir()
+    assert circuito.estado == 'semiabierto'
+    # Solo pasa una llamada de sondeo a la vez
+    assert circuito.rechaza()
+    assert not circuito.permitir()
+
+    circuito.registrar(0.1)
+    assert circuito.estado == 'cerrado'
+    assert circuito.permitir()
+
+
+def test_sondeo_fallido_vuelve_a_abrir():
+    circuito = CircuitoXM(umbral=3, espera=60, lento=10)
+    abrir(circuito)
+    vencer_espera(circuito)
+    assert circuito.permitir()
+
+    circuito.registrar(0.1, error=ConnectionError())
+    assert circuito.estado == 'abierto'
+    assert circuito.rechaza()
+    assert circuito.aperturas == 2
+
+
+def test_cliente_falla_de_inmediato_con_circuito_abierto():
+    api = ReadDBSimulado(modo='sintetico', num_rios=3, num_embalses=2, tasa_error=1.0)
+    cliente = ClienteXM(api=api, circuito=CircuitoXM(umbral=1, espera=60))
+
+    with pytest.raises(Exception):
+        cliente.request_data('AporCaudal', 'Rio', '2024-03-01', '2024-03-31')
+    assert cliente.circuito.estado == 'abierto'
+    with pytest.raises(XMNoDisponible):
+        cliente.request_data('AporCaudal', 'Rio', '2024-04-01', '2024-04-30')
@@ -0,0 +1,64 @@
+"""Pruebas de las llamadas concurrentes a ReadDB desde ClienteXM"""
+
+import threading
+import time
+
+import pandas as pd
+
+from xm_data import ClienteXM
+
+
+class ReadDBConEstado:
+    """Imita a pydataxm: request_data guarda la url en el objeto y la usa después"""
+
+    instancias = 0
+
+    def __init__(self):
+        ReadDBConEstado.instancias += 1
+        self.url = None
+
+    def request_data(self, coleccion, metrica, start_date, end_date, filtros=None):
+        self.url = '/lists' if coleccion.startswith('Listado') else '/hourly'
+        time.sleep(0.02)
+        return pd.DataFrame({'coleccion': [coleccion], 'url': [self.url]})
+
+
+def llamar_en_paralelo(cliente, colecciones):
+    resultados = {}
+
+    def llamar(i, coleccion):
+        resultados[i] = cliente._llamar_api(coleccion, 'Sistema', '2024-01-01', '2024-01-02')
+
+    hilos = [threading.Thread(target=llamar, args=(i, c)) for i, c in enumerate(colecciones)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return [resultados[i] for i in range(len(colecciones))]
+
+
+def esperada(coleccion):
+    return '/lists' if coleccion.startswith('Listado') else '/hourly'
+
+
+def test_llamadas_simultaneas_no_comparten_readdb():
+    ReadDBConEstado.instancias = 0
+    cliente = ClienteXM(fabrica_api=ReadDBConEstado)
+    colecciones = ['ListadoRios', 'AporCaudal', 'ListadoEmbalses', 'CapaUtilDiarEner'] * 3
+
+    resultados = llamar_en_paralelo(cliente, colecciones)
+
+    assert [df['url'][0] for df in resultados] == [esperada(c) for c in colecciones]
+    # Las instancias se reutilizan: a lo sumo una por llamada simultánea
+    assert ReadDBConEstado.instancias <= len(colecciones)
+    llamar_en_paralelo(cliente, colecciones)
+    assert ReadDBConEstado.instancias <= len(colecciones)
+
+
+def test_api_inyectada_se_usa_en_serie():
+    cliente = ClienteXM(api=ReadDBConEstado())
+    colecciones = ['ListadoRios', 'AporCaudal'] * 4
+
+    resultados = llamar_en_paralelo(cliente, colecciones)
+
+    assert [df['url'][0] for df in resultados] == [esperada(c) for c in colecciones]
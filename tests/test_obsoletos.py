@@ -0,0 +1,86 @@
+"""Pruebas de stale-while-revalidate en ClienteXM: cuándo una consulta queda desactualizada"""
+
+import time
+
+import pytest
+
+from xm_data import CacheConsultas, CircuitoXM, ClienteXM
+from xm_replay import ReadDBSimulado
+
+RANGO = ('AporCaudal', 'Rio', '2024-03-01', '2024-03-31')
+
+
+class ReadDBApagable(ReadDBSimulado):
+    """Backend sintético que se puede 'caer' durante la prueba"""
+
+    def __init__(self):
+        super().__init__(modo='sintetico', num_rios=3, num_embalses=2)
+        self.caido = False
+
+    def request_data(self, coleccion, metrica, start_date, end_date, filtros=None):
+        if self.caido:
+            raise ConnectionError("XM caído")
+        return super().request_data(coleccion, metrica, start_date, end_date, filtros)
+
+
+@pytest.fixture
+def cliente():
+    cliente = ClienteXM(api=ReadDBApagable(), cache=CacheConsultas(ttl=0.05), servir_obsoletos=True,
+                        circuito=CircuitoXM(umbral=1, espera=60))
+    yield cliente
+    cliente._pool_revalidacion.shutdown(wait=True)
+
+
+def esperar_revalidacion(cliente):
+    limite = time.time() + 5
+    while cliente._revalidando and time.time() < limite:
+        time.sleep(0.01)
+
+
+def test_ttl_vencido_con_xm_sano_no_es_desactualizado(cliente):
+    cliente.request_data(*RANGO)
+    time.sleep(0.1)
+    cliente.api.latencia = 0.2
+
+    data = cliente.request_data(*RANGO)
+
+    # Mientras el refresco sigue en curso la vista no debe anunciar una caída
+    assert not data.empty
+    assert cliente._revalidando
+    assert cliente.desactualizado(*RANGO) is None
+    esperar_revalidacion(cliente)
+    assert cliente.desactualizado(*RANGO) is None
+
+
+def test_refresco_fallido_marca_desactualizado(cliente):
+    cliente.request_data(*RANGO)
+    time.sleep(0.1)
+    cliente.api.caido = True
+
+    data = cliente.request_data(*RANGO)
+    esperar_revalidacion(cliente)
+
+    assert not data.empty
+    assert cliente.desactualizado(*RANGO) is not None
+
+
+def test_circuito_abierto_marca_desactualizado_sin_llamar_a_xm(cliente):
+    cliente.request_data(*RANGO)
+    time.sleep(0.1)
+    cliente.circuito.registrar(1.0, error=ConnectionError("XM caído"))
+    assert cliente.circuito.estado == 'abierto'
+
+    cliente.request_data(*RANGO)
+
+    assert cliente.desactualizado(*RANGO) is not None
+    assert not cliente._revalidando
+
+
+def test_listados_vencidos_se_consultan_de_nuevo(cliente):
+    cliente.request_data('ListadoRios', 'Sistema', '2024-01-01', '2024-01-02')
+    time.sleep(0.1)
+    cliente.api.num_rios = 5
+
+    data = cliente.request_data('ListadoRios', 'Sistema', '2024-01-01', '2024-01-02')
+
+    assert len(data) == 5
@@ -0,0 +1,1241 @@
+"""
+Capa de acceso a datos de la API XM para el Dashboard Hidrológico MME
+Ministerio de Minas y Energía de Colombia
+
+`ClienteXM` envuelve a `ReadDB` de pydataxm manteniendo la misma firma de
+`request_data`, de modo que los callbacks de app.py no cambian.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from xm_store import DEFAULT_STORE_DIR, normalizar_serie, partir_en_meses, rangos_contiguos, to_date
+
+# Fechas con las que se consultan los listados de referencia de XM
+FECHAS_CATALOGO = ('2024-01-01', '2024-01-02')
+
+# Fechas de la capacidad útil de embalses que consulta el dashboard
+FECHAS_CAPACIDAD = ('2024-01-01', '2024-01-02')
+
+# Listados de referencia que se guardan completos en el almacén local
+METRICAS_CATALOGO = {
+    ('ListadoRios', 'Sistema'),
+    ('ListadoEmbalses', 'Sistema'),
+}
+
+# Series diarias que se guardan en el almacén local (métrica, entidad)
+METRICAS_DIARIAS = {
+    ('AporCaudal', 'Rio'),
+    ('CapaUtilDiarEner', 'Embalse'),
+}
+
+
+class CacheConsultas:
+    """
+    Caché en memoria de resultados de request_data con TTL y desalojo LRU.
+
+    Entiende rangos de fechas: para las series diarias, una consulta del 10 al
+    20 de marzo se recorta de un resultado guardado del 1 al 31 de marzo.
+    Las demás consultas solo aciertan con la misma clave exacta.
+    """
+
+    def __init__(self, ttl=None, max_entradas=None, ttl_obsoleto=None):
+        self.ttl = float(ttl if ttl is not None else os.environ.get('XM_CACHE_TTL', 300))
+        self.max_entradas = int(max_entradas if max_entradas is not None
+                                else os.environ.get('XM_CACHE_MAX_ENTRADAS', 64))
+        # Tiempo adicional que una entrada vencida se conserva para servirla si XM falla
+        self.ttl_obsoleto = float(ttl_obsoleto if ttl_obsoleto is not None
+                                  else os.environ.get('XM_CACHE_TTL_OBSOLETO', 24 * 3600))
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.obsoletos = 0
+
+    def obtener(self, coleccion, metrica, start_date, end_date, permitir_vencido=False):
+        """
+        Devolver una copia del resultado en caché o None.
+        Con `permitir_vencido=True` también sirve entradas pasadas de TTL,
+        marcadas con df.attrs['xm_desactualizado'] y df.attrs['xm_guardado'].
+        """
+        inicio, fin = to_date(start_date), to_date(end_date)
+        por_rango = (coleccion, metrica) in METRICAS_DIARIAS
+        ahora = time.time()
+        with self._lock:
+            encontrada = None
+            for clave, entrada in list(self._entradas.items()):
+                edad = ahora - entrada['guardado']
+                if edad > self.ttl + self.ttl_obsoleto:
+                    del self._entradas[clave]
+                    continue
+                if clave[:2] != (coleccion, metrica) or (edad > self.ttl and not permitir_vencido):
+                    continue
+                if clave[2:] == (inicio, fin) or (por_rango and clave[2] <= inicio and fin <= clave[3]):
+                    encontrada = clave
+                    break
+            if encontrada is None:
+                if not permitir_vencido:
+                    self.misses += 1
+                return None
+            self._entradas.move_to_end(encontrada)
+            entrada = self._entradas[encontrada]
+            vencida = ahora - entrada['guardado'] > self.ttl
+            if vencida:
+                self.obsoletos += 1
+            else:
+                self.hits += 1
+
+        # Sin columna de fechas (p. ej. XM respondió un frame vacío) no hay qué recortar
+        if encontrada[2:] == (inicio, fin) or entrada['fechas'] is None:
+            df = entrada['df'].copy()
+        else:
+            mascara = (entrada['fechas'] >= inicio) & (entrada['fechas'] <= fin)
+            df = entrada['df'][mascara].reset_index(drop=True)
+        if vencida:
+            df.attrs['xm_desactualizado'] = True
+            df.attrs['xm_guardado'] = entrada['guardado']
+        return df
+
+    def guardar(self, coleccion, metrica, start_date, end_date, df):
+        """Guardar un resultado; reemplaza las entradas que quedan contenidas en él"""
+        if df is None:
+            return
+        inicio, fin = to_date(start_date), to_date(end_date)
+        fechas = None
+        if (coleccion, metrica) in METRICAS_DIARIAS and 'Date' in df.columns:
+            fechas = pd.to_datetime(df['Date']).dt.date.to_numpy()
+        with self._lock:
+            if fechas is not None:
+                for clave in list(self._entradas):
+                    if clave[:2] == (coleccion, metrica) and inicio <= clave[2] and clave[3] <= fin:
+                        del self._entradas[clave]
+            clave = (coleccion, metrica, inicio, fin)
+            self._entradas[clave] = {'guardado': time.time(), 'df': df.copy(), 'fechas': fechas}
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+
+    def limpiar(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        """Contadores de aciertos/fallos para monitoreo"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entradas': len(self._entradas),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'obsoletos': self.obsoletos,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+class ResultadosServidor:
+    """
+    Resultados ya calculados para los callbacks, guardados en el servidor.
+
+    En vez de enviar el resultado completo a un dcc.Store, el navegador
+    guarda solo una referencia {'token', 'consulta'}: el token identifica el
+    resultado en este proceso y la consulta (parámetros JSON) permite
+    recalcularlo si el token no está (otro worker, reinicio o vencido).
+    """
+
+    def __init__(self, ttl=None, max_entradas=None):
+        self.ttl = float(ttl if ttl is not None else os.environ.get('XM_RESULTADOS_TTL', 1800))
+        self.max_entradas = int(max_entradas if max_entradas is not None
+                                else os.environ.get('XM_RESULTADOS_MAX_ENTRADAS', 128))
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def token(consulta):
+        """Token corto y determinista de una consulta"""
+        texto = json.dumps(consulta, sort_keys=True, default=str)
+        return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+    def guardar(self, consulta, valor):
+        """Guardar un resultado y devolver la referencia para el navegador"""
+        consulta = list(consulta)
+        token = self.token(consulta)
+        with self._lock:
+            self._entradas[token] = (time.time(), valor)
+            self._entradas.move_to_end(token)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return {'token': token, 'consulta': consulta}
+
+    def obtener(self, referencia, recalcular):
+        """
+        Resultado de una referencia; si no está guardado (o venció) se
+        recalcula con `recalcular(consulta)` y se guarda de nuevo.
+        """
+        if not referencia or 'consulta' not in referencia:
+            return None
+        consulta = list(referencia['consulta'])
+        token = self.token(consulta)
+        with self._lock:
+            entrada = self._entradas.get(token)
+            if entrada is not None and time.time() - entrada[0] <= self.ttl:
+                self._entradas.move_to_end(token)
+                self.hits += 1
+                return entrada[1]
+            self.misses += 1
+        valor = recalcular(consulta)
+        self.guardar(consulta, valor)
+        return valor
+
+    def estadisticas(self):
+        """Contadores para monitoreo"""
+        with self._lock:
+            return {'entradas': len(self._entradas), 'hits': self.hits, 'misses': self.misses}
+
+
+class CacheVistas:
+    """
+    Contenido ya armado por los callbacks de vista (update_content,
+    load_default_data) según sus entradas y la versión de los datos.
+
+    Cada entrada vence a los `ttl` segundos y se desalojan las menos usadas
+    por encima de `max_entradas`. `version` es una función (p. ej.
+    AlmacenLocal.version): cuando cambia porque llegaron datos nuevos de XM
+    se descarta todo lo guardado.
+    """
+
+    def __init__(self, version=None, ttl=None, max_entradas=None):
+        self.version = version or (lambda: 0)
+        self.ttl = float(ttl if ttl is not None else os.environ.get('XM_VISTAS_TTL', 300))
+        self.max_entradas = int(max_entradas if max_entradas is not None
+                                else os.environ.get('XM_VISTAS_MAX_ENTRADAS', 64))
+        self._entradas = OrderedDict()
+        self._version_actual = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave, construir, guardable=None):
+        """
+        Contenido de `clave`; si no está (o venció) se arma con `construir()`
+        y se guarda, salvo que `guardable(contenido)` diga que no (p. ej.
+        una vista parcial porque XM no respondió).
+        """
+        try:
+            version = self.version()
+        except Exception as e:
+            print(f"Error leyendo la versión de los datos: {e}")
+            return construir()
+        with self._lock:
+            if version != self._version_actual:
+                if self._entradas:
+                    self.invalidaciones += 1
+                self._entradas.clear()
+                self._version_actual = version
+            entrada = self._entradas.get(clave)
+            if entrada is not None and time.time() - entrada[0] <= self.ttl:
+                self._entradas.move_to_end(clave)
+                self.hits += 1
+                return entrada[1]
+            self.misses += 1
+        contenido = construir()
+        # Si llegaron datos mientras se armaba (o los descargó esta misma
+        # consulta) no se guarda: la próxima vez se arma con la versión nueva
+        if (guardable is None or guardable(contenido)) and self.version() == version:
+            with self._lock:
+                if version == self._version_actual:
+                    self._entradas[clave] = (time.time(), contenido)
+                    self._entradas.move_to_end(clave)
+                    while len(self._entradas) > self.max_entradas:
+                        self._entradas.popitem(last=False)
+        return contenido
+
+    def estadisticas(self):
+        """Contadores para monitoreo"""
+        with self._lock:
+            return {'entradas': len(self._entradas), 'hits': self.hits, 'misses': self.misses,
+                    'invalidaciones': self.invalidaciones}
+
+
+class CacheCompartida:
+    """
+    Caché en disco (SQLite) compartida por todos los workers de un mismo host.
+
+    Guarda los resultados de request_data serializados en Parquet, con TTL,
+    límite de tamaño total (XM_CACHE_COMPARTIDA_MB) y desalojo por último uso.
+    Igual que CacheConsultas, las series diarias se recortan de un rango
+    guardado que contenga al pedido. Además lleva reservas por clave para que,
+    si dos workers piden lo mismo a la vez, solo uno consulte a XM y el otro
+    espere el resultado en la caché.
+    """
+
+    def __init__(self, ruta=None, ttl=None, max_mb=None, espera_reserva=None):
+        self.ruta = ruta or os.environ.get('XM_CACHE_COMPARTIDA_RUTA',
+                                           os.path.join(os.environ.get('XM_STORE_DIR', DEFAULT_STORE_DIR),
+                                                        'cache_compartida.sqlite'))
+        self.ttl = float(ttl if ttl is not None else os.environ.get('XM_CACHE_TTL', 300))
+        self.max_bytes = int(float(max_mb if max_mb is not None
+                                   else os.environ.get('XM_CACHE_COMPARTIDA_MB', 256)) * 1024 * 1024)
+        self.espera_reserva = float(espera_reserva if espera_reserva is not None
+                                    else os.environ.get('XM_CACHE_ESPERA_RESERVA', 60))
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+        with self._conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS resultados (
+                    coleccion TEXT, metrica TEXT, inicio TEXT, fin TEXT,
+                    guardado REAL, ultimo_uso REAL, tamano INTEGER, datos BLOB,
+                    PRIMARY KEY (coleccion, metrica, inicio, fin))""")
+            conexion.execute("CREATE INDEX IF NOT EXISTS resultados_uso ON resultados (ultimo_uso)")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS reservas (
+                    clave TEXT PRIMARY KEY, pid INTEGER, expira REAL)""")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS estado (
+                    nombre TEXT PRIMARY KEY, valor TEXT, guardado REAL)""")
+
+    def _conexion(self):
+        """Una conexión por hilo; WAL permite leer mientras otro worker escribe"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def obtener(self, coleccion, metrica, start_date, end_date, contar=True):
+        """Devolver el resultado guardado (recortado si hace falta) o None"""
+        inicio, fin = to_date(start_date), to_date(end_date)
+        por_rango = (coleccion, metrica) in METRICAS_DIARIAS
+        ahora = time.time()
+        try:
+            with self._conexion() as conexion:
+                if por_rango:
+                    fila = conexion.execute(
+                        "SELECT inicio, fin, datos FROM resultados WHERE coleccion = ? AND metrica = ? "
+                        "AND inicio <= ? AND fin >= ? AND guardado >= ? "
+                        # Fechas ISO en TEXT: restarlas directo compara solo el año
+                        "ORDER BY julianday(fin) - julianday(inicio) LIMIT 1",
+                        (coleccion, metrica, inicio.isoformat(), fin.isoformat(), ahora - self.ttl)).fetchone()
+                else:
+                    fila = conexion.execute(
+                        "SELECT inicio, fin, datos FROM resultados WHERE coleccion = ? AND metrica = ? "
+                        "AND inicio = ? AND fin = ? AND guardado >= ?",
+                        (coleccion, metrica, inicio.isoformat(), fin.isoformat(), ahora - self.ttl)).fetchone()
+                if fila is not None:
+                    conexion.execute(
+                        "UPDATE resultados SET ultimo_uso = ? WHERE coleccion = ? AND metrica = ? "
+                        "AND inicio = ? AND fin = ?", (ahora, coleccion, metrica, fila[0], fila[1]))
+        except sqlite3.Error as e:
+            print(f"Error leyendo caché compartida: {e}")
+            return None
+
+        if fila is None:
+            self.misses += contar
+            return None
+        self.hits += contar
+        df = pd.read_parquet(io.BytesIO(fila[2]))
+        if (fila[0], fila[1]) == (inicio.isoformat(), fin.isoformat()) or 'Date' not in df.columns:
+            return df
+        fechas = pd.to_datetime(df['Date']).dt.date
+        return df[(fechas >= inicio) & (fechas <= fin)].reset_index(drop=True)
+
+    def guardar(self, coleccion, metrica, start_date, end_date, df):
+        """Guardar un resultado y desalojar los menos usados si se pasa del límite"""
+        if df is None:
+            return
+        inicio, fin = to_date(start_date).isoformat(), to_date(end_date).isoformat()
+        try:
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, index=False)
+            datos = buffer.getvalue()
+        except Exception as e:
+            print(f"Error serializando {coleccion}/{metrica} para la caché compartida: {e}")
+            return
+        if len(datos) > self.max_bytes:
+            return
+        ahora = time.time()
+        try:
+            with self._conexion() as conexion:
+                conexion.execute("DELETE FROM resultados WHERE guardado < ?", (ahora - self.ttl,))
+                if (coleccion, metrica) in METRICAS_DIARIAS:
+                    # Los rangos contenidos en el nuevo ya no hacen falta
+                    conexion.execute("DELETE FROM resultados WHERE coleccion = ? AND metrica = ? "
+                                     "AND inicio >= ? AND fin <= ?", (coleccion, metrica, inicio, fin))
+                conexion.execute(
+                    "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (coleccion, metrica, inicio, fin, ahora, ahora, len(datos), datos))
+                self._desalojar(conexion)
+        except sqlite3.Error as e:
+            print(f"Error escribiendo caché compartida: {e}")
+
+    def _desalojar(self, conexion):
+        total = conexion.execute("SELECT COALESCE(SUM(tamano), 0) FROM resultados").fetchone()[0]
+        while total > self.max_bytes:
+            fila = conexion.execute(
+                "SELECT coleccion, metrica, inicio, fin, tamano FROM resultados "
+                "ORDER BY ultimo_uso LIMIT 1").fetchone()
+            if fila is None:
+                break
+            conexion.execute("DELETE FROM resultados WHERE coleccion = ? AND metrica = ? "
+                             "AND inicio = ? AND fin = ?", fila[:4])
+            total -= fila[4]
+            self.evictions += 1
+
+    def reservar(self, clave):
+        """Intentar tomar la reserva de una consulta; False si otro worker la tiene"""
+        ahora = time.time()
+        try:
+            with self._conexion() as conexion:
+                conexion.execute("DELETE FROM reservas WHERE expira < ?", (ahora,))
+                cursor = conexion.execute("INSERT OR IGNORE INTO reservas VALUES (?, ?, ?)",
+                                          (repr(clave), os.getpid(), ahora + self.espera_reserva))
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"Error reservando en caché compartida: {e}")
+            return True
+
+    def liberar(self, clave):
+        try:
+            with self._conexion() as conexion:
+                conexion.execute("DELETE FROM reservas WHERE clave = ? AND pid = ?", (repr(clave), os.getpid()))
+        except sqlite3.Error as e:
+            print(f"Error liberando reserva de caché compartida: {e}")
+
+    def liderar(self, clave, duracion):
+        """
+        Tomar (o renovar) por `duracion` segundos un rol que un solo worker del
+        host debe cumplir, p. ej. la sonda de XM. Si el worker que lo tenía
+        muere, otro lo toma cuando vence. Sin la base compartida, True.
+        """
+        ahora = time.time()
+        try:
+            with self._conexion() as conexion:
+                conexion.execute("DELETE FROM reservas WHERE expira < ?", (ahora,))
+                cursor = conexion.execute("UPDATE reservas SET expira = ? WHERE clave = ? AND pid = ?",
+                                          (ahora + duracion, repr(clave), os.getpid()))
+                if cursor.rowcount == 0:
+                    cursor = conexion.execute("INSERT OR IGNORE INTO reservas VALUES (?, ?, ?)",
+                                              (repr(clave), os.getpid(), ahora + duracion))
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"Error tomando el rol {clave} en caché compartida: {e}")
+            return True
+
+    def publicar(self, nombre, valor):
+        """Guardar un estado (JSON) para que lo lean todos los workers"""
+        try:
+            with self._conexion() as conexion:
+                conexion.execute("INSERT OR REPLACE INTO estado VALUES (?, ?, ?)",
+                                 (nombre, json.dumps(valor, default=str), time.time()))
+        except sqlite3.Error as e:
+            print(f"Error publicando {nombre} en caché compartida: {e}")
+
+    def leer_estado(self, nombre, max_edad=None):
+        """Estado publicado por `publicar` (None si no hay o tiene más de `max_edad` segundos)"""
+        try:
+            fila = self._conexion().execute("SELECT valor, guardado FROM estado WHERE nombre = ?",
+                                            (nombre,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error leyendo {nombre} de caché compartida: {e}")
+            return None
+        if fila is None or (max_edad is not None and time.time() - fila[1] > max_edad):
+            return None
+        return json.loads(fila[0])
+
+    def esperar(self, coleccion, metrica, start_date, end_date, clave):
+        """Esperar a que el worker con la reserva publique el resultado (o la suelte)"""
+        limite = time.time() + self.espera_reserva
+        while time.time() < limite:
+            time.sleep(0.2)
+            data = self.obtener(coleccion, metrica, start_date, end_date, contar=False)
+            if data is not None:
+                self.hits += 1
+                return data
+            if self.reservar(clave):
+                return None
+        return None
+
+    def limpiar(self):
+        """Vaciar la caché"""
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM resultados")
+
+    def estadisticas(self):
+        """Contadores de este worker y ocupación total del archivo compartido"""
+        try:
+            with self._conexion() as conexion:
+                entradas, tamano = conexion.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM resultados").fetchone()
+        except sqlite3.Error:
+            entradas, tamano = None, None
+        total = self.hits + self.misses
+        return {
+            'entradas': entradas,
+            'mb': round(tamano / 1024 / 1024, 2) if tamano is not None else None,
+            'max_mb': round(self.max_bytes / 1024 / 1024, 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
+
+
+class SingleFlight:
+    """
+    Coalescencia de consultas idénticas concurrentes.
+
+    El primer hilo que pide una clave ejecuta la función; los demás que llegan
+    mientras está en curso esperan; todos reciben su propia copia del
+    resultado (o la misma excepción).
+    """
+
+    def __init__(self):
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self.compartidas = 0
+
+    def ejecutar(self, clave, funcion):
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = {'evento': threading.Event(), 'resultado': None, 'error': None}
+                self._en_curso[clave] = llamada
+            else:
+                self.compartidas += 1
+
+        if lider:
+            self._ejecutar_lider(clave, llamada, funcion)
+        else:
+            llamada['evento'].wait()
+
+        if llamada['error'] is not None:
+            raise llamada['error']
+        resultado = llamada['resultado']
+        return resultado.copy() if resultado is not None else None
+
+    def _ejecutar_lider(self, clave, llamada, funcion):
+        try:
+            llamada['resultado'] = funcion()
+        except Exception as e:
+            llamada['error'] = e
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            llamada['evento'].set()
+
+
+class XMNoDisponible(ConnectionError):
+    """XM no se consulta porque el circuito está abierto"""
+
+
+class CircuitoXM:
+    """
+    Circuit breaker para las llamadas a XM.
+
+    Tras `umbral` fallos seguidos (errores o llamadas más lentas que `lento`
+    segundos) el circuito se abre y las llamadas fallan de inmediato con
+    XMNoDisponible. Pasados `espera` segundos deja pasar una sola llamada de
+    sondeo: si responde bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, umbral=None, espera=None, lento=None):
+        self.umbral = int(umbral if umbral is not None else os.environ.get('XM_CIRCUITO_UMBRAL', 5))
+        self.espera = float(espera if espera is not None else os.environ.get('XM_CIRCUITO_ESPERA', 30))
+        self.lento = float(lento if lento is not None else os.environ.get('XM_CIRCUITO_LENTO', 45))
+        self.estado = 'cerrado'
+        self.fallos = 0
+        self.abierto_desde = None
+        self.aperturas = 0
+        self.rechazadas = 0
+        self._sondeo_en_curso = False
+        self._lock = threading.Lock()
+
+    def rechaza(self):
+        """True si ahora mismo no se dejaría pasar ninguna llamada (no cambia el estado)"""
+        with self._lock:
+            if self.estado == 'abierto':
+                return time.time() - self.abierto_desde < self.espera
+            return self.estado == 'semiabierto' and self._sondeo_en_curso
+
+    def permitir(self):
+        """Decidir si una llamada puede ir a XM; en semiabierto solo pasa el sondeo"""
+        with self._lock:
+            if self.estado == 'abierto' and time.time() - self.abierto_desde >= self.espera:
+                self.estado = 'semiabierto'
+                self._sondeo_en_curso = False
+            if self.estado == 'cerrado':
+                return True
+            if self.estado == 'semiabierto' and not self._sondeo_en_curso:
+                self._sondeo_en_curso = True
+                return True
+            self.rechazadas += 1
+            return False
+
+    def registrar(self, duracion, error=None):
+        """Registrar el resultado de una llamada permitida"""
+        with self._lock:
+            self._sondeo_en_curso = False
+            if error is None and duracion <= self.lento:
+                self.estado = 'cerrado'
+                self.fallos = 0
+                return
+            self.fallos += 1
+            if self.estado == 'semiabierto' or self.fallos >= self.umbral:
+                if self.estado != 'abierto':
+                    self.aperturas += 1
+                    motivo = error if error is not None else f"{duracion:.1f}s"
+                    print(f"⚠️  Circuito XM abierto tras {self.fallos} fallos ({motivo})")
+                self.estado = 'abierto'
+                self.abierto_desde = time.time()
+
+    def resumen(self):
+        """Estado del circuito para monitoreo"""
+        with self._lock:
+            return {
+                'estado': self.estado,
+                'fallos_seguidos': self.fallos,
+                'aperturas': self.aperturas,
+                'rechazadas': self.rechazadas,
+                'abierto_desde': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.abierto_desde))
+                                 if self.estado != 'cerrado' and self.abierto_desde else None
+            }
+
+
+class MetricasXM:
+    """
+    Latencias y errores recientes de las llamadas a XM por métrica.
+
+    Guarda las llamadas de los últimos `ventana` segundos (como máximo
+    `max_muestras` por métrica) y resume p50/p95/p99 y tasa de error.
+    """
+
+    def __init__(self, ventana=None, max_muestras=1000):
+        self.ventana = float(ventana if ventana is not None else os.environ.get('XM_METRICAS_VENTANA', 900))
+        self.max_muestras = max_muestras
+        self._llamadas = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, coleccion, metrica, duracion, error=None):
+        with self._lock:
+            muestras = self._llamadas.setdefault(f"{coleccion}/{metrica}", deque(maxlen=self.max_muestras))
+            muestras.append((time.time(), duracion, error is not None))
+
+    def resumen(self):
+        """{métrica: llamadas, errores, tasa_error y percentiles en segundos}"""
+        desde = time.time() - self.ventana
+        with self._lock:
+            ventanas = {nombre: [m for m in muestras if m[0] >= desde] for nombre, muestras in self._llamadas.items()}
+        resumen = {}
+        for nombre, muestras in sorted(ventanas.items()):
+            if not muestras:
+                continue
+            duraciones = np.array([m[1] for m in muestras])
+            errores = sum(1 for m in muestras if m[2])
+            p50, p95, p99 = np.percentile(duraciones, [50, 95, 99])
+            resumen[nombre] = {
+                'llamadas': len(muestras),
+                'errores': errores,
+                'tasa_error': round(errores / len(muestras), 3),
+                'p50': round(float(p50), 3),
+                'p95': round(float(p95), 3),
+                'p99': round(float(p99), 3),
+            }
+        return resumen
+
+
+class SondaXM:
+    """
+    Sondeo periódico de la conectividad con XM en segundo plano.
+
+    Cada `intervalo` segundos hace una llamada liviana (ListadoRios, sin
+    caché) y guarda el resultado; /api/status responde con ese estado sin
+    consultar XM. La llamada pasa por el circuito, así que también sirve de
+    sondeo cuando está abierto.
+
+    Con `compartida` (CacheCompartida) sondea un solo worker por host, elegido
+    con `liderar`, y publica el estado para que todos respondan lo mismo; el
+    tráfico de sondeo no crece con el número de workers.
+    """
+
+    def __init__(self, cliente, intervalo=None, compartida=None):
+        self.cliente = cliente
+        self.intervalo = float(intervalo if intervalo is not None
+                               else os.environ.get('XM_SONDA_INTERVALO', 60))
+        self.compartida = compartida
+        self._estado = {'estado': 'desconocido', 'ultima_sonda': None, 'latencia': None, 'error': None}
+        self._hilo = None
+
+    def sondear(self):
+        """Una llamada de prueba a XM; actualiza el estado guardado"""
+        t0 = time.time()
+        try:
+            data = self.cliente._llamar_api('ListadoRios', 'Sistema', *FECHAS_CATALOGO)
+            estado = 'connected' if data is not None and not data.empty else 'disconnected'
+            error = None if estado == 'connected' else 'Respuesta vacía'
+        except Exception as e:
+            estado, error = 'disconnected', str(e)
+        self._estado = {
+            'estado': estado,
+            'ultima_sonda': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'latencia': round(time.time() - t0, 3),
+            'error': error
+        }
+        if self.compartida is not None:
+            self.compartida.publicar('sonda_xm', dict(self._estado, pid=os.getpid()))
+        return estado == 'connected'
+
+    def iniciar(self):
+        """Arrancar (una vez) el hilo de sondeo"""
+        if self._hilo is not None:
+            return
+        self._hilo = threading.Thread(target=self._sondear_siempre, name='sonda-xm', daemon=True)
+        self._hilo.start()
+
+    def _sondear_siempre(self):
+        while True:
+            # El rol dura tres intervalos: si el worker que sondea muere, otro lo reemplaza
+            if self.compartida is None or self.compartida.liderar(('sonda_xm',), 3 * self.intervalo):
+                self.sondear()
+            time.sleep(self.intervalo)
+
+    def estado(self):
+        if self.compartida is not None:
+            publicado = self.compartida.leer_estado('sonda_xm', max_edad=3 * self.intervalo)
+            if publicado is not None:
+                return publicado
+        return dict(self._estado)
+
+
+class ClienteXM:
+    """
+    Envoltorio de ReadDB con almacén local incremental.
+
+    Antes de todo se consulta la caché en memoria y, si hay, la caché en
+    disco compartida entre workers. Las consultas idénticas concurrentes
+    comparten una sola descarga (SingleFlight en el proceso, reservas de la
+    caché compartida entre procesos). Para las series
+    diarias se leen del disco los días ya guardados y solo se piden a XM los
+    días faltantes, partidos en trozos mensuales que se descargan en paralelo
+    con un pool acotado (XM_MAX_CONCURRENCIA); el resultado sale con tipos
+    compactos (`normalizar_serie`) antes de entrar a las cachés. El resto de
+    consultas pasa directo a XM. Si hay un índice de ríos o agregados materializados
+    (AgregadosCaudal), se alimentan con cada frame de AporCaudal descargado
+    y con ListadoRios.
+
+    Con `solo_lectura=True` (web detrás del proceso de ingesta) nunca se
+    consulta XM: las series y los listados se sirven solo desde el almacén.
+
+    Con `servir_obsoletos=True` un resultado vencido de la caché se entrega
+    de inmediato mientras se revalida en segundo plano, y si XM falla se
+    responde con lo último guardado (caché o almacén). Esos resultados llevan
+    df.attrs['xm_desactualizado']; en `desactualizado()` quedan solo las
+    consultas en que XM falló o el circuito estaba abierto.
+    El `circuito` (CircuitoXM) corta las llamadas a XM tras fallos repetidos.
+    """
+
+    def __init__(self, api=None, almacen=None, cache=None, fabrica_api=None, max_concurrencia=None,
+                 indice_rios=None, solo_lectura=False, cache_compartida=None, circuito=None,
+                 servir_obsoletos=False, metricas=None, agregados=None):
+        self._api = api
+        self._fabrica_api = fabrica_api
+        self._lock_api = threading.Lock()
+        self.almacen = almacen
+        self.cache = cache
+        self.cache_compartida = cache_compartida
+        self.indice_rios = indice_rios
+        self.agregados = agregados
+        self.solo_lectura = solo_lectura
+        self.single_flight = SingleFlight()
+        self.max_concurrencia = int(max_concurrencia if max_concurrencia is not None
+                                    else os.environ.get('XM_MAX_CONCURRENCIA', 4))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrencia, thread_name_prefix='xm-trozo')
+        # ReadDB libres para prestar a una llamada a la vez (ver _prestar_api)
+        self._apis_libres = []
+        self._lock_apis = threading.Lock()
+        self._lock_api_unica = threading.Lock()
+        self.circuito = circuito
+        self.metricas = metricas
+        self.servir_obsoletos = servir_obsoletos
+        # Consultas respondidas con datos guardados (LRU acotado: con XM caído y
+        # rangos arbitrarios crecería sin límite)
+        self._desactualizados = OrderedDict()
+        self._lock_desactualizados = threading.Lock()
+        self.max_desactualizados = int(os.environ.get('XM_DESACTUALIZADOS_MAX', 256))
+        self._revalidando = set()
+        self._lock_revalidacion = threading.Lock()
+        self._pool_revalidacion = ThreadPoolExecutor(max_workers=2, thread_name_prefix='xm-revalidar')
+
+    @property
+    def api(self):
+        """ReadDB se crea en el primer uso (su constructor ya consulta XM)"""
+        if self._api is None:
+            with self._lock_api:
+                if self._api is None:
+                    self._api = self._fabrica_api()
+                    print("API XM inicializada correctamente")
+        return self._api
+
+    @contextmanager
+    def _prestar_api(self):
+        """
+        ReadDB para una sola llamada. ReadDB guarda en el propio objeto la url
+        y los filtros de la petición en curso, así que dos llamadas simultáneas
+        (trozos en paralelo, calentamiento, catálogos, sonda) nunca comparten
+        instancia: se reutiliza una libre o se crea otra. Con un `api` inyectado
+        (sin fábrica) hay una sola instancia y las llamadas van en serie.
+        """
+        if self._fabrica_api is None:
+            with self._lock_api_unica:
+                yield self.api
+            return
+        with self._lock_apis:
+            api = self._apis_libres.pop() if self._apis_libres else None
+        if api is None:
+            api = self._fabrica_api()
+        try:
+            yield api
+        finally:
+            with self._lock_apis:
+                self._apis_libres.append(api)
+
+    def request_data(self, coleccion, metrica, start_date, end_date, filtros=None):
+        """Misma firma que ReadDB.request_data"""
+        if filtros and self.solo_lectura:
+            raise RuntimeError("Consulta con filtros no disponible en modo solo lectura")
+        if filtros:
+            with self._prestar_api() as api:
+                return api.request_data(coleccion, metrica, start_date, end_date, filtros)
+
+        clave = (coleccion, metrica, to_date(start_date), to_date(end_date))
+        if self.cache is not None:
+            data = self.cache.obtener(coleccion, metrica, start_date, end_date)
+            if data is not None:
+                self._desactualizados.pop(clave, None)
+                return data
+
+        if not self.servir_obsoletos:
+            return self._consultar_unico(coleccion, metrica, start_date, end_date, clave)
+
+        # Stale-while-revalidate: una entrada vencida se sirve ya y se refresca en
+        # segundo plano. Solo se marca desactualizada si XM falla de verdad (circuito
+        # abierto o el refresco falla): vencer el TTL no es una caída. Los listados no
+        # pasan por aquí: su refresco periódico debe traer la lista nueva, no la vencida
+        if self.cache is not None and (coleccion, metrica) not in METRICAS_CATALOGO:
+            data = self.cache.obtener(coleccion, metrica, start_date, end_date, permitir_vencido=True)
+            if data is not None:
+                self._revalidar(coleccion, metrica, start_date, end_date, clave, data.attrs['xm_guardado'])
+                return data
+
+        try:
+            data = self._consultar_unico(coleccion, metrica, start_date, end_date, clave)
+        except Exception as e:
+            data = self._respaldo(coleccion, metrica, start_date, end_date)
+            if data is None:
+                raise
+            print(f"XM no disponible para {coleccion}/{metrica} ({e}); se sirven datos guardados")
+            self._marcar_desactualizado(clave, data.attrs['xm_guardado'])
+            return data
+        self._desactualizados.pop(clave, None)
+        return data
+
+    def serie_agregada(self, nivel, start_date, end_date, frecuencia='D'):
+        """
+        Serie de AporCaudal ya agregada ('nacional', 'region' o 'rio', diaria
+        o mensual) leída de los agregados materializados. Antes se descargan
+        los días que falten en el almacén; si XM falla y se sirven obsoletos,
+        se responde con lo que haya y la consulta queda como desactualizada.
+        En solo lectura no se descarga ni se escribe nada: los días que la
+        ingesta aún no agregó se agregan en memoria.
+        """
+        if self.agregados is None or self.almacen is None:
+            raise RuntimeError("Agregados de AporCaudal no configurados")
+        if self.solo_lectura:
+            # El almacén es de la ingesta: aquí solo se leen los agregados
+            return self.agregados.leer_sin_escribir(nivel, start_date, end_date, frecuencia)
+        clave = ('AporCaudal', 'Rio', to_date(start_date), to_date(end_date))
+        faltantes = self.almacen.dias_faltantes('AporCaudal', 'Rio', start_date, end_date)
+        if faltantes:
+            try:
+                self.single_flight.ejecutar(('agregados',) + clave[2:], lambda: self._descargar(
+                    'AporCaudal', 'Rio', rangos_contiguos(faltantes)))
+            except Exception as e:
+                if not self.servir_obsoletos:
+                    raise
+                print(f"XM no disponible para AporCaudal/Rio ({e}); se sirven agregados guardados")
+                self.agregados.sincronizar(start_date, end_date)
+                data = self.agregados.leer(nivel, start_date, end_date, frecuencia)
+                self._marcar_desactualizado(clave, 0)
+                data.attrs['xm_desactualizado'] = True
+                return data
+        self.agregados.sincronizar(start_date, end_date)
+        self._desactualizados.pop(clave, None)
+        return self.agregados.leer(nivel, start_date, end_date, frecuencia)
+
+    def _marcar_desactualizado(self, clave, guardado):
+        """Registrar una consulta servida con datos guardados"""
+        with self._lock_desactualizados:
+            self._desactualizados[clave] = guardado
+            self._desactualizados.move_to_end(clave)
+            while len(self._desactualizados) > self.max_desactualizados:
+                self._desactualizados.popitem(last=False)
+
+    def desactualizado(self, coleccion, metrica, start_date, end_date):
+        """
+        Si la última respuesta a esta consulta fueron datos guardados (XM no
+        disponible), devuelve la hora en que se guardaron (o 0 si se
+        desconoce); si fue una respuesta al día, None.
+        """
+        try:
+            clave = (coleccion, metrica, to_date(start_date), to_date(end_date))
+        except Exception:
+            return None
+        return self._desactualizados.get(clave)
+
+    def _revalidar(self, coleccion, metrica, start_date, end_date, clave, guardado):
+        """
+        Refrescar en segundo plano un resultado vencido (una vez por clave).
+        La consulta queda desactualizada (hora `guardado`) solo si el circuito
+        rechaza la llamada o el refresco falla.
+        """
+        if self.circuito is not None and self.circuito.rechaza():
+            self._marcar_desactualizado(clave, guardado)
+            return
+        with self._lock_revalidacion:
+            if clave in self._revalidando:
+                return
+            self._revalidando.add(clave)
+
+        def tarea():
+            try:
+                self._consultar_unico(coleccion, metrica, start_date, end_date, clave)
+                self._desactualizados.pop(clave, None)
+            except Exception as e:
+                print(f"No se pudo revalidar {coleccion}/{metrica}: {e}")
+                self._marcar_desactualizado(clave, guardado)
+            finally:
+                with self._lock_revalidacion:
+                    self._revalidando.discard(clave)
+
+        self._pool_revalidacion.submit(tarea)
+
+    def _respaldo(self, coleccion, metrica, start_date, end_date):
+        """Último dato guardado en el almacén cuando XM falla (o None)"""
+        if self.almacen is None or self.solo_lectura:
+            return None
+        try:
+            if (coleccion, metrica) in METRICAS_CATALOGO:
+                data = self.almacen.leer_catalogo(coleccion, metrica)
+            elif (coleccion, metrica) in METRICAS_DIARIAS:
+                data = self.almacen.leer(coleccion, metrica, start_date, end_date)
+                if not data.empty:
+                    data = normalizar_serie(data.sort_values('Date', kind='stable').reset_index(drop=True))
+            else:
+                return None
+        except Exception as e:
+            print(f"Error leyendo respaldo de {coleccion}/{metrica}: {e}")
+            return None
+        if data.empty:
+            return None
+        data.attrs['xm_desactualizado'] = True
+        data.attrs['xm_guardado'] = 0
+        return data
+
+    def _consultar_unico(self, coleccion, metrica, start_date, end_date, clave):
+        """Consultar compartiendo la descarga con las consultas idénticas en curso"""
+        if self.cache_compartida is None:
+            return self.single_flight.ejecutar(
+                clave, lambda: self._consultar(coleccion, metrica, start_date, end_date))
+        return self.single_flight.ejecutar(
+            clave, lambda: self._consultar_compartido(coleccion, metrica, start_date, end_date, clave))
+
+    def _consultar_compartido(self, coleccion, metrica, start_date, end_date, clave):
+        """Buscar en la caché compartida entre workers antes de consultar"""
+        data = self.cache_compartida.obtener(coleccion, metrica, start_date, end_date)
+        if data is None and not self.cache_compartida.reservar(clave):
+            # Otro worker ya está consultando lo mismo: esperar su resultado
+            data = self.cache_compartida.esperar(coleccion, metrica, start_date, end_date, clave)
+        if data is not None:
+            if self.cache is not None:
+                self.cache.guardar(coleccion, metrica, start_date, end_date, data)
+            return data
+        try:
+            return self._consultar(coleccion, metrica, start_date, end_date)
+        finally:
+            self.cache_compartida.liberar(clave)
+
+    def _consultar(self, coleccion, metrica, start_date, end_date):
+        """Descargar (o leer del almacén) y guardar en caché"""
+        if self.solo_lectura:
+            data = self._leer_almacen(coleccion, metrica, start_date, end_date)
+        elif (coleccion, metrica) not in METRICAS_DIARIAS:
+            data = self._llamar_api(coleccion, metrica, start_date, end_date)
+            if self.almacen is not None and (coleccion, metrica) in METRICAS_CATALOGO:
+                self.almacen.guardar_catalogo(coleccion, metrica, data)
+            if (self.indice_rios is not None and coleccion == 'ListadoRios'
+                    and data is not None and 'Values_Name' in data.columns):
+                self.indice_rios.agregar_catalogo(data['Values_Name'].dropna().str.strip().str.upper())
+            if self.agregados is not None and coleccion == 'ListadoRios':
+                self.agregados.reagrupar()
+        elif self.almacen is None:
+            data = self._descargar(coleccion, metrica, [(to_date(start_date), to_date(end_date))])
+        else:
+            data = self._request_incremental(coleccion, metrica, start_date, end_date)
+        if (coleccion, metrica) in METRICAS_DIARIAS:
+            data = normalizar_serie(data)
+
+        if self.cache is not None and data is not None:
+            self.cache.guardar(coleccion, metrica, start_date, end_date, data)
+        if self.cache_compartida is not None and data is not None:
+            self.cache_compartida.guardar(coleccion, metrica, start_date, end_date, data)
+        return data
+
+    def _leer_almacen(self, coleccion, metrica, start_date, end_date):
+        """Modo solo lectura: responder únicamente con lo que dejó la ingesta"""
+        if self.almacen is None:
+            raise RuntimeError("Modo solo lectura sin almacén local configurado")
+        if (coleccion, metrica) in METRICAS_CATALOGO:
+            return self.almacen.leer_catalogo(coleccion, metrica)
+        if (coleccion, metrica) not in METRICAS_DIARIAS:
+            raise RuntimeError(f"{coleccion}/{metrica} no se ingesta al almacén local")
+        data = self.almacen.leer(coleccion, metrica, start_date, end_date)
+        if data.empty:
+            return data
+        return data.sort_values('Date', kind='stable').reset_index(drop=True)
+
+    def _request_incremental(self, coleccion, metrica, start_date, end_date):
+        """Leer del almacén y descargar de XM solo los días faltantes"""
+        faltantes = self.almacen.dias_faltantes(coleccion, metrica, start_date, end_date)
+        if faltantes:
+            self._descargar(coleccion, metrica, rangos_contiguos(faltantes))
+
+        data = self.almacen.leer(coleccion, metrica, start_date, end_date)
+        if data.empty:
+            return data
+        return data.sort_values('Date', kind='stable').reset_index(drop=True)
+
+    def _descargar(self, coleccion, metrica, rangos):
+        """
+        Descargar de XM los rangos dados en trozos mensuales concurrentes.
+        Cada trozo se guarda en el almacén apenas llega, así un timeout a mitad
+        de camino no pierde los meses ya descargados.
+        """
+        trozos = [trozo for inicio, fin in rangos for trozo in partir_en_meses(inicio, fin)]
+        t0 = time.time()
+        if len(trozos) == 1:
+            futuros = [None]
+        else:
+            futuros = [self._pool.submit(self._descargar_trozo, coleccion, metrica, inicio, fin)
+                       for inicio, fin in trozos]
+        descargados, error = [], None
+        for (inicio, fin), futuro in zip(trozos, futuros):
+            try:
+                df = futuro.result() if futuro is not None else self._descargar_trozo(coleccion, metrica, inicio, fin)
+                descargados.append((df, inicio, fin))
+            except Exception as e:
+                error = error or e
+        if len(trozos) > 1:
+            print(f"XM {coleccion}/{metrica}: {len(trozos)} trozos en {time.time() - t0:.2f}s "
+                  f"(concurrencia {self.max_concurrencia})")
+        # Los agregados se actualizan una vez con todos los trozos que sí llegaron
+        if self.agregados is not None and coleccion == 'AporCaudal' and descargados:
+            self.agregados.actualizar_trozos(descargados)
+        if error is not None:
+            raise error
+
+        frames = [df for df, inicio, fin in descargados if df is not None and not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def _descargar_trozo(self, coleccion, metrica, inicio, fin):
+        """Descargar un trozo y guardarlo en el almacén"""
+        t0 = time.time()
+        df = self._llamar_api(coleccion, metrica, inicio.isoformat(), fin.isoformat())
+        if self.almacen is not None:
+            self.almacen.escribir(coleccion, metrica, df, inicio, fin)
+        if self.indice_rios is not None and coleccion == 'AporCaudal':
+            self.indice_rios.actualizar(df)
+        print(f"XM {coleccion}/{metrica} {inicio} a {fin}: "
+              f"{0 if df is None else len(df)} filas en {time.time() - t0:.2f}s")
+        return df
+
+    def _llamar_api(self, coleccion, metrica, start_date, end_date):
+        """
+        Llamada directa a ReadDB desde cualquier hilo.
+        ReadDB usa el event loop del hilo actual, que no existe fuera del hilo
+        principal; además guarda la petición en curso en el propio objeto, por
+        eso cada llamada usa una instancia prestada (`_prestar_api`).
+        """
+        if self.circuito is not None and not self.circuito.permitir():
+            raise XMNoDisponible(f"Circuito abierto: no se consulta XM para {coleccion}/{metrica}")
+        if threading.current_thread() is not threading.main_thread():
+            try:
+                asyncio.get_event_loop()
+            except RuntimeError:
+                asyncio.set_event_loop(asyncio.new_event_loop())
+        t0 = time.time()
+        try:
+            with self._prestar_api() as api:
+                data = api.request_data(coleccion, metrica, start_date, end_date)
+        except Exception as e:
+            if self.circuito is not None:
+                self.circuito.registrar(time.time() - t0, e)
+            if self.metricas is not None:
+                self.metricas.registrar(coleccion, metrica, time.time() - t0, e)
+            raise
+        if self.circuito is not None:
+            self.circuito.registrar(time.time() - t0)
+        if self.metricas is not None:
+            self.metricas.registrar(coleccion, metrica, time.time() - t0)
+        return data
+
+
+class CatalogoXM:
+    """
+    Registro en memoria de los listados de referencia de XM.
+
+    Carga ListadoRios y ListadoEmbalses una sola vez, los normaliza
+    (nombres en mayúscula, regiones en título) y mantiene los diccionarios
+    nombre→región. Un hilo en segundo plano los refresca periódicamente.
+    La primera carga es perezosa: ocurre al primer acceso a los datos (o
+    antes, si se llama a `cargar()` desde un hilo de calentamiento).
+    """
+
+    # Segundos mínimos entre reintentos de la carga perezosa si XM falla
+    REINTENTO = 60
+
+    def __init__(self, cliente, intervalo=None):
+        self.cliente = cliente
+        self.intervalo = float(intervalo if intervalo is not None
+                               else os.environ.get('XM_CATALOGO_REFRESCO', 6 * 3600))
+        self._rios = pd.DataFrame(columns=['Values_Name', 'Values_HydroRegion'])
+        self._embalses = pd.DataFrame(columns=['Values_Name', 'Values_HydroRegion'])
+        self._rio_region = {}
+        self._embalse_region = {}
+        self.ultima_carga = None
+        self.ultimo_intento = None
+        self.ultimo_error = None
+        self._lock_carga = threading.RLock()
+        self._hilo = None
+
+    @property
+    def cargado(self):
+        return self.ultima_carga is not None
+
+    def asegurar_cargado(self):
+        """Cargar los listados si nunca se han cargado (respetando REINTENTO)"""
+        if self.cargado:
+            return
+        with self._lock_carga:
+            if self.cargado:
+                return
+            if self.ultimo_intento and time.time() - self.ultimo_intento < self.REINTENTO:
+                return
+            self.cargar()
+
+    @property
+    def rios(self):
+        self.asegurar_cargado()
+        return self._rios
+
+    @property
+    def embalses(self):
+        self.asegurar_cargado()
+        return self._embalses
+
+    @property
+    def rio_region(self):
+        self.asegurar_cargado()
+        return self._rio_region
+
+    @property
+    def embalse_region(self):
+        self.asegurar_cargado()
+        return self._embalse_region
+
+    @staticmethod
+    def _normalizar(df):
+        """Normalizar nombres y regiones igual que en los callbacks"""
+        if df is None or 'Values_Name' not in df.columns or 'Values_HydroRegion' not in df.columns:
+            return None
+        df = df.copy()
+        df['Values_Name'] = df['Values_Name'].str.strip().str.upper()
+        df['Values_HydroRegion'] = df['Values_HydroRegion'].str.strip().str.title()
+        return df
+
+    def cargar(self):
+        """Descargar y normalizar ambos listados; conserva los anteriores si falla"""
+        with self._lock_carga:
+            return self._cargar()
+
+    def _cargar(self):
+        self.ultimo_intento = time.time()
+        try:
+            rios = self._normalizar(self.cliente.request_data('ListadoRios', 'Sistema', *FECHAS_CATALOGO))
+            embalses = self._normalizar(self.cliente.request_data('ListadoEmbalses', 'Sistema', *FECHAS_CATALOGO))
+            if rios is not None:
+                self._rio_region = dict(sorted(zip(rios['Values_Name'], rios['Values_HydroRegion'])))
+                self._rios = rios
+            if embalses is not None:
+                self._embalse_region = dict(zip(embalses['Values_Name'], embalses['Values_HydroRegion']))
+                self._embalses = embalses
+            if rios is not None and embalses is not None:
+                self.ultima_carga = time.time()
+                self.ultimo_error = None
+            else:
+                self.ultimo_error = 'Listado incompleto'
+        except Exception as e:
+            print(f"Error cargando catálogos XM: {e}")
+            self.ultimo_error = str(e)
+        return self.ultimo_error is None
+
+    def embalses_de_region(self, region):
+        """Nombres de embalses de una región, ordenados y sin repetir"""
+        embalses = self.embalses
+        return embalses[embalses['Values_HydroRegion'] == region]['Values_Name'].sort_values().unique()
+
+    def iniciar_refresco(self):
+        """Arrancar (una vez) el hilo de refresco periódico"""
+        if self._hilo is not None:
+            return
+        self._hilo = threading.Thread(target=self._refrescar, name='catalogo-xm', daemon=True)
+        self._hilo.start()
+
+    def _refrescar(self):
+        while True:
+            time.sleep(self.intervalo)
+            self.cargar()
+
+    def estado(self):
+        """Resumen del estado de los catálogos para monitoreo"""
+        return {
+            'rios': len(self._rio_region),
+            'embalses': len(self._embalse_region),
+            'ultima_carga': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.ultima_carga))
+                            if self.ultima_carga else None,
+            'error': self.ultimo_error
+        }
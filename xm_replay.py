@@ -0,0 +1,171 @@
+"""
+Grabación/reproducción de la API XM para pruebas de rendimiento sin conexión
+Ministerio de Minas y Energía de Colombia
+
+El backend de `objetoAPI` se elige con la variable de entorno XM_BACKEND:
+  xm         - API XM real (ReadDB), valor por defecto
+  grabar     - API XM real, guardando cada respuesta en XM_REPLAY_DIR
+  replay     - reproduce las respuestas grabadas en XM_REPLAY_DIR
+  sintetico  - genera AporCaudal/CapaUtilDiarEner y listados sintéticos
+
+Los backends simulados aceptan latencia (XM_SIM_LATENCIA, segundos) y una
+tasa de errores inyectados (XM_SIM_TASA_ERROR, entre 0 y 1).
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from xm_store import to_date
+
+DEFAULT_REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'xm_replay')
+
+# Regiones hidrológicas usadas por los datos sintéticos
+REGIONES_SINTETICAS = ['Antioquia', 'Caldas', 'Caribe', 'Centro', 'Oriente', 'Valle']
+
+
+def fabrica_api_xm():
+    """Crear el backend de la API XM según XM_BACKEND"""
+    backend = os.environ.get('XM_BACKEND', 'xm').lower()
+    if backend == 'xm':
+        from pydataxm.pydataxm import ReadDB
+        return ReadDB()
+    if backend == 'grabar':
+        from pydataxm.pydataxm import ReadDB
+        return GrabadorXM(ReadDB())
+    if backend == 'replay':
+        return ReadDBSimulado(modo='replay')
+    if backend == 'sintetico':
+        return ReadDBSimulado(modo='sintetico')
+    raise ValueError(f"XM_BACKEND desconocido: {backend}")
+
+
+def _nombre_archivo(coleccion, metrica, start_date, end_date):
+    limpio = re.sub(r'[^A-Za-z0-9_-]', '', f"{coleccion}__{metrica}")
+    return f"{limpio}__{to_date(start_date).isoformat()}__{to_date(end_date).isoformat()}.parquet"
+
+
+class GrabadorXM:
+    """Envoltorio de ReadDB que guarda en disco cada respuesta de request_data"""
+
+    def __init__(self, api, ruta=None):
+        self.api = api
+        self.ruta = Path(ruta or os.environ.get('XM_REPLAY_DIR', DEFAULT_REPLAY_DIR))
+        self.ruta.mkdir(parents=True, exist_ok=True)
+
+    def request_data(self, coleccion, metrica, start_date, end_date, filtros=None):
+        data = self.api.request_data(coleccion, metrica, start_date, end_date, filtros)
+        if not filtros and data is not None:
+            archivo = self.ruta / _nombre_archivo(coleccion, metrica, start_date, end_date)
+            temporal = archivo.with_name(f".{archivo.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            data.to_parquet(temporal, index=False)
+            os.replace(temporal, archivo)
+        return data
+
+
+class ReadDBSimulado:
+    """
+    Sustituto local de ReadDB con la misma firma de request_data.
+
+    En modo 'replay' responde con las grabaciones: las series diarias se
+    arman uniendo todas las grabaciones de la métrica y recortando al rango
+    pedido, así no importa cómo se partieron las consultas al grabar. En modo
+    'sintetico' genera datos deterministas para XM_SIM_RIOS ríos y
+    XM_SIM_EMBALSES embalses (los mismos valores en cada consulta).
+    """
+
+    def __init__(self, modo='sintetico', ruta=None, latencia=None, tasa_error=None,
+                 num_rios=None, num_embalses=None):
+        self.modo = modo
+        self.ruta = Path(ruta or os.environ.get('XM_REPLAY_DIR', DEFAULT_REPLAY_DIR))
+        self.latencia = float(latencia if latencia is not None else os.environ.get('XM_SIM_LATENCIA', 0))
+        self.tasa_error = float(tasa_error if tasa_error is not None else os.environ.get('XM_SIM_TASA_ERROR', 0))
+        self.num_rios = int(num_rios if num_rios is not None else os.environ.get('XM_SIM_RIOS', 40))
+        self.num_embalses = int(num_embalses if num_embalses is not None else os.environ.get('XM_SIM_EMBALSES', 25))
+        self._grabaciones = {}
+        self._lock = threading.Lock()
+
+    def request_data(self, coleccion, metrica, start_date, end_date, filtros=None):
+        if self.latencia > 0:
+            # Latencia con variación de ±50% alrededor del valor configurado
+            time.sleep(self.latencia * random.uniform(0.5, 1.5))
+        if self.tasa_error > 0 and random.random() < self.tasa_error:
+            raise ConnectionError(f"Error simulado de XM para {coleccion}/{metrica}")
+        if self.modo == 'replay':
+            return self._reproducir(coleccion, metrica, start_date, end_date)
+        return self._sintetico(coleccion, metrica, start_date, end_date)
+
+    # --- Reproducción de grabaciones ---
+
+    def _cargar_grabaciones(self, coleccion, metrica):
+        clave = (coleccion, metrica)
+        with self._lock:
+            if clave not in self._grabaciones:
+                prefijo = _nombre_archivo(coleccion, metrica, '2000-01-01', '2000-01-01').split('__2000')[0]
+                archivos = sorted(self.ruta.glob(f"{prefijo}__*.parquet"))
+                frames = [pd.read_parquet(archivo) for archivo in archivos]
+                frames = [df for df in frames if not df.empty]
+                self._grabaciones[clave] = frames
+            return self._grabaciones[clave]
+
+    def _reproducir(self, coleccion, metrica, start_date, end_date):
+        frames = self._cargar_grabaciones(coleccion, metrica)
+        if not frames:
+            return pd.DataFrame()
+        if coleccion.startswith('Listado') or 'Date' not in frames[-1].columns:
+            return frames[-1].copy()
+        data = pd.concat(frames, ignore_index=True)
+        fechas = pd.to_datetime(data['Date'])
+        data = data[(fechas >= pd.Timestamp(to_date(start_date))) & (fechas <= pd.Timestamp(to_date(end_date)))]
+        columnas = [col for col in ('Date', 'Name', 'Values_code') if col in data.columns]
+        return data.drop_duplicates(subset=columnas or None, keep='last').reset_index(drop=True)
+
+    # --- Datos sintéticos ---
+
+    def _nombres(self, prefijo, cantidad):
+        return [f"{prefijo} {i:03d}" for i in range(1, cantidad + 1)]
+
+    def _listado(self, prefijo, cantidad):
+        nombres = self._nombres(prefijo, cantidad)
+        return pd.DataFrame({
+            'Id': 'Sistema',
+            'Values_Code': [f"{prefijo[:3]}{i:03d}" for i in range(1, cantidad + 1)],
+            'Values_Name': nombres,
+            'Values_HydroRegion': [REGIONES_SINTETICAS[i % len(REGIONES_SINTETICAS)] for i in range(cantidad)],
+            'Date': pd.Timestamp('2024-01-01'),
+        })
+
+    def _serie_diaria(self, prefijo, cantidad, escala, start_date, end_date):
+        """Serie diaria determinista: estacionalidad + ruido pseudoaleatorio por (día, entidad)"""
+        fechas = pd.date_range(to_date(start_date), to_date(end_date), freq='D')
+        nombres = self._nombres(prefijo, cantidad)
+        dias = np.repeat(fechas.to_julian_date().to_numpy(), cantidad)
+        indices = np.tile(np.arange(1, cantidad + 1), len(fechas))
+        base = escala * (1 + (indices * 7919 % 97) / 97)
+        estacion = 1 + 0.35 * np.sin(2 * np.pi * dias / 365.25 + indices)
+        ruido = np.modf(np.abs(np.sin(dias * 12.9898 + indices * 78.233)) * 43758.5453)[0]
+        return pd.DataFrame({
+            'Id': prefijo.title(),
+            'Values_code': np.tile([f"{prefijo[:3]}{i:03d}" for i in range(1, cantidad + 1)], len(fechas)),
+            'Name': np.tile(nombres, len(fechas)),
+            'Value': np.round(base * estacion * (0.8 + 0.4 * ruido), 4),
+            'Date': np.repeat(fechas.to_numpy(), cantidad),
+        })
+
+    def _sintetico(self, coleccion, metrica, start_date, end_date):
+        if coleccion == 'ListadoRios':
+            return self._listado('RIO', self.num_rios)
+        if coleccion == 'ListadoEmbalses':
+            return self._listado('EMBALSE', self.num_embalses)
+        if coleccion == 'AporCaudal':
+            return self._serie_diaria('RIO', self.num_rios, 20.0, start_date, end_date)
+        if coleccion == 'CapaUtilDiarEner':
+            return self._serie_diaria('EMBALSE', self.num_embalses, 150.0, start_date, end_date)
+        print(f"No existe la métrica {coleccion} en el backend sintético")
+        return pd.DataFrame()
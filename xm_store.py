@@ -0,0 +1,659 @@
+"""
+Almacén local de datos XM para el Dashboard Hidrológico MME
+Ministerio de Minas y Energía de Colombia
+
+Guarda en disco (Parquet) las series diarias descargadas de la API XM,
+particionadas por métrica/entidad/día, para no volver a descargar los días
+que ya se consultaron.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo bloqueo entre hilos
+    fcntl = None
+
+# Directorio por defecto del almacén (configurable con XM_STORE_DIR)
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'xm_store')
+
+
+def to_date(value):
+    """Convertir strings 'YYYY-MM-DD', datetime o date a date"""
+    if isinstance(value, date) and not hasattr(value, 'hour'):
+        return value
+    return pd.Timestamp(value).date()
+
+
+def rangos_contiguos(dias):
+    """Agrupar una lista ordenada de días en rangos contiguos (inicio, fin)"""
+    rangos = []
+    for dia in dias:
+        if rangos and rangos[-1][1] + timedelta(days=1) == dia:
+            rangos[-1][1] = dia
+        else:
+            rangos.append([dia, dia])
+    return [(inicio, fin) for inicio, fin in rangos]
+
+
+def partir_en_meses(inicio, fin):
+    """Partir el rango [inicio, fin] en trozos que no cruzan de un mes a otro"""
+    trozos = []
+    while inicio <= fin:
+        siguiente_mes = (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+        fin_trozo = min(fin, siguiente_mes - timedelta(days=1))
+        trozos.append((inicio, fin_trozo))
+        inicio = fin_trozo + timedelta(days=1)
+    return trozos
+
+
+# Esquema de las series diarias: columnas obligatorias y columnas de texto
+# que se guardan como categóricas (pocos valores distintos repetidos por día)
+COLUMNAS_SERIE = ('Date', 'Name', 'Value')
+CATEGORICAS_SERIE = ('Id', 'Values_code', 'Name', 'Region')
+
+
+def normalizar_serie(df, tipo_valor=None):
+    """
+    Tipos compactos para un frame de serie diaria de XM (AporCaudal, CapaUtilDiarEner).
+
+    Valida una vez las columnas obligatorias y deja Date como datetime64,
+    los nombres (Id, Values_code, Name, Region) como categóricas y Value
+    como float64 o float32 (XM_TIPO_VALOR). Un frame vacío se devuelve tal cual.
+    """
+    if df is None or df.empty:
+        return df
+    faltantes = [col for col in COLUMNAS_SERIE if col not in df.columns]
+    if faltantes:
+        raise ValueError(f"Serie de XM sin las columnas {faltantes} (columnas: {list(df.columns)})")
+    tipo_valor = tipo_valor or os.environ.get('XM_TIPO_VALOR', 'float64')
+    df = df.copy(deep=False)
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df['Date'] = pd.to_datetime(df['Date'])
+    if df['Value'].dtype != tipo_valor:
+        df['Value'] = pd.to_numeric(df['Value'], errors='coerce').astype(tipo_valor)
+    for col in CATEGORICAS_SERIE:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+class AlmacenLocal:
+    """
+    Almacén columnar en disco particionado por métrica/entidad/día.
+
+    Cada día consultado se guarda en su propio archivo Parquet
+    ({ruta}/{métrica}/{entidad}/{YYYY-MM-DD}.parquet). Los días que XM devolvió
+    sin datos se marcan con un archivo '.vacio' para no volver a pedirlos.
+    Los días recientes (XM todavía puede publicarlos o corregirlos) se
+    consideran vencidos pasado `ttl_reciente` segundos.
+    """
+
+    def __init__(self, ruta=None, dias_refresco=None, ttl_reciente=None):
+        self.ruta = Path(ruta or os.environ.get('XM_STORE_DIR', DEFAULT_STORE_DIR))
+        self.dias_refresco = int(dias_refresco if dias_refresco is not None
+                                 else os.environ.get('XM_STORE_DIAS_REFRESCO', 3))
+        self.ttl_reciente = float(ttl_reciente if ttl_reciente is not None
+                                  else os.environ.get('XM_STORE_TTL_RECIENTE', 3600))
+        self._lock = threading.Lock()
+        self._listados = {}
+
+    def _directorio(self, coleccion, metrica):
+        return self.ruta / coleccion / metrica
+
+    def version(self):
+        """
+        Versión de los datos guardados: cambia cada vez que este proceso u
+        otro (la ingesta, otro worker) escribe días, catálogos o agregados.
+        """
+        try:
+            return (self.ruta / '.version').stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def marcar_cambio(self):
+        """Avanzar la versión de los datos (ver `version`)"""
+        try:
+            self.ruta.mkdir(parents=True, exist_ok=True)
+            (self.ruta / '.version').touch()
+        except Exception as e:
+            print(f"Error marcando cambio en el almacén local: {e}")
+
+    def _listado(self, coleccion, metrica):
+        """
+        Nombres de archivo del directorio y días con datos. Se reutiliza
+        mientras no cambie la fecha de modificación del directorio (cualquier
+        archivo creado, reemplazado o borrado la cambia).
+        """
+        directorio = self._directorio(coleccion, metrica)
+        try:
+            mtime = directorio.stat().st_mtime_ns
+        except FileNotFoundError:
+            return set(), set()
+        guardado = self._listados.get(directorio)
+        if guardado is not None and guardado[0] == mtime:
+            return guardado[1], guardado[2]
+        nombres = {entrada.name for entrada in os.scandir(directorio)}
+        dias = {date.fromisoformat(nombre[:-8]) for nombre in nombres
+                if nombre.endswith('.parquet') and not nombre.startswith('.')}
+        self._listados[directorio] = (mtime, nombres, dias)
+        return nombres, dias
+
+    def _archivo_dia(self, coleccion, metrica, dia):
+        return self._directorio(coleccion, metrica) / f"{dia.isoformat()}.parquet"
+
+    def _marca_vacio(self, coleccion, metrica, dia):
+        return self._directorio(coleccion, metrica) / f"{dia.isoformat()}.vacio"
+
+    def _dia_vigente(self, archivo, dia):
+        """Un día guardado es vigente si es antiguo o si se descargó hace poco"""
+        if dia < date.today() - timedelta(days=self.dias_refresco):
+            return True
+        return time.time() - archivo.stat().st_mtime < self.ttl_reciente
+
+    def dias_faltantes(self, coleccion, metrica, start_date, end_date):
+        """Listar los días del rango que no están (vigentes) en el almacén"""
+        inicio, fin = to_date(start_date), to_date(end_date)
+        directorio = self._directorio(coleccion, metrica)
+        # Un solo listado del directorio en vez de consultar el disco día por día
+        guardados, _ = self._listado(coleccion, metrica)
+        limite_refresco = date.today() - timedelta(days=self.dias_refresco)
+        faltantes = []
+        dia = inicio
+        while dia <= fin:
+            nombre = dia.isoformat()
+            if f"{nombre}.parquet" in guardados:
+                archivo = f"{nombre}.parquet"
+            elif f"{nombre}.vacio" in guardados:
+                archivo = f"{nombre}.vacio"
+            else:
+                archivo = None
+            # Solo los días recientes necesitan revisar la fecha de descarga
+            if archivo is None or (dia >= limite_refresco and not self._dia_vigente(directorio / archivo, dia)):
+                faltantes.append(dia)
+            dia += timedelta(days=1)
+        return faltantes
+
+    def dias_guardados(self, coleccion, metrica, start_date, end_date):
+        """Días del rango que tienen datos guardados (sin contar los marcados como vacíos)"""
+        inicio, fin = to_date(start_date), to_date(end_date)
+        _, dias = self._listado(coleccion, metrica)
+        return {dia for dia in dias if inicio <= dia <= fin}
+
+    def leer(self, coleccion, metrica, start_date, end_date):
+        """Leer del disco los días guardados del rango, ordenados por fecha"""
+        inicio, fin = to_date(start_date), to_date(end_date)
+        # Un solo listado del directorio en vez de un exists() por día
+        _, dias = self._listado(coleccion, metrica)
+        archivos = [str(self._archivo_dia(coleccion, metrica, dia))
+                    for dia in sorted(dias) if inicio <= dia <= fin]
+        if not archivos:
+            return pd.DataFrame()
+        try:
+            # Un solo escaneo de todos los archivos (mucho más rápido que uno por uno)
+            return ds.dataset(archivos, format='parquet').to_table().to_pandas()
+        except Exception as e:
+            print(f"Error leyendo {coleccion}/{metrica} del almacén local: {e}")
+            return pd.DataFrame()
+
+    def escribir(self, coleccion, metrica, df, start_date, end_date):
+        """
+        Guardar un DataFrame descargado de XM partido por día.
+        Los días del rango sin filas quedan marcados como vacíos.
+        """
+        inicio, fin = to_date(start_date), to_date(end_date)
+        directorio = self._directorio(coleccion, metrica)
+        directorio.mkdir(parents=True, exist_ok=True)
+
+        dias_con_datos = set()
+        if df is not None and not df.empty and 'Date' in df.columns:
+            dias = pd.to_datetime(df['Date']).dt.date
+            with self._lock:
+                for dia, df_dia in df.groupby(dias, sort=False):
+                    if dia < inicio or dia > fin:
+                        continue
+                    self._escribir_archivo(self._archivo_dia(coleccion, metrica, dia),
+                                           df_dia.reset_index(drop=True))
+                    marca = self._marca_vacio(coleccion, metrica, dia)
+                    if marca.exists():
+                        marca.unlink()
+                    dias_con_datos.add(dia)
+
+        with self._lock:
+            dia = inicio
+            while dia <= fin:
+                if dia not in dias_con_datos:
+                    archivo = self._archivo_dia(coleccion, metrica, dia)
+                    if archivo.exists():
+                        archivo.unlink()
+                    self._marca_vacio(coleccion, metrica, dia).touch()
+                dia += timedelta(days=1)
+        self.marcar_cambio()
+
+    def guardar_catalogo(self, coleccion, metrica, df):
+        """Guardar un listado de referencia completo (ListadoRios, ListadoEmbalses)"""
+        if df is None or df.empty:
+            return
+        directorio = self.ruta / 'catalogos'
+        directorio.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._escribir_archivo(directorio / f"{coleccion}_{metrica}.parquet", df.reset_index(drop=True))
+        self.marcar_cambio()
+
+    def leer_catalogo(self, coleccion, metrica):
+        """Leer un listado guardado (DataFrame vacío si no existe)"""
+        archivo = self.ruta / 'catalogos' / f"{coleccion}_{metrica}.parquet"
+        if not archivo.exists():
+            return pd.DataFrame()
+        return pd.read_parquet(archivo)
+
+    @staticmethod
+    def _escribir_archivo(archivo, df):
+        """Escritura atómica: archivo temporal y luego reemplazo"""
+        temporal = archivo.with_name(f".{archivo.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        df.to_parquet(temporal, index=False)
+        os.replace(temporal, archivo)
+
+
+class IndiceRios:
+    """
+    Índice de ríos con la primera y última fecha observada de AporCaudal.
+
+    Se alimenta de forma incremental con cada frame descargado y con los
+    nombres de ListadoRios, y se persiste en JSON junto al almacén. Responde
+    "todos los ríos" y "ríos activos en los últimos N días" sin descargar
+    el histórico.
+    """
+
+    def __init__(self, ruta=None, almacen=None):
+        if ruta is None:
+            ruta = almacen.ruta if almacen is not None else os.environ.get('XM_STORE_DIR', DEFAULT_STORE_DIR)
+        self.archivo = Path(ruta) / 'indice_rios.json'
+        self._lock = threading.Lock()
+        self._rios = {}
+        self._mtime = None
+        self.almacen = almacen
+        # Sin JSON guardado el índice se reconstruye con `reconstruir_si_falta`, fuera
+        # del constructor (recorre todo el almacén y no debe frenar el arranque)
+        if self.archivo.exists():
+            self._recargar_si_cambio()
+
+    def reconstruir_si_falta(self):
+        """Reconstruir desde el almacén si todavía no hay índice guardado"""
+        if self.archivo.exists() or self.almacen is None:
+            return False
+        self.reconstruir(self.almacen)
+        return True
+
+    def _recargar_si_cambio(self):
+        """Releer el JSON si otro proceso (la ingesta) lo actualizó"""
+        try:
+            mtime = self.archivo.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with self._lock:
+                self._rios = json.loads(self.archivo.read_text(encoding='utf-8'))
+                self._mtime = mtime
+        except Exception as e:
+            print(f"Error leyendo índice de ríos: {e}")
+
+    def reconstruir(self, almacen):
+        """Construir el índice a partir de los días ya guardados en el almacén"""
+        directorio = almacen.ruta / 'AporCaudal' / 'Rio'
+        archivos = sorted(str(archivo) for archivo in directorio.glob('*.parquet')) if directorio.exists() else []
+        if not archivos:
+            return
+        try:
+            df = ds.dataset(archivos, format='parquet').to_table(columns=['Name', 'Date']).to_pandas()
+            self.actualizar(df)
+        except Exception as e:
+            print(f"Error reconstruyendo índice de ríos: {e}")
+
+    def actualizar(self, df):
+        """Extender primera/última fecha de cada río con un frame de AporCaudal"""
+        if df is None or df.empty or 'Name' not in df.columns or 'Date' not in df.columns:
+            return
+        fechas = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+        rangos = fechas.groupby(df['Name']).agg(['min', 'max'])
+        with self._lock:
+            cambios = False
+            for rio, primera, ultima in zip(rangos.index, rangos['min'], rangos['max']):
+                actual = self._rios.setdefault(rio, {'primera': None, 'ultima': None})
+                if actual['primera'] is None or primera < actual['primera']:
+                    actual['primera'], cambios = primera, True
+                if actual['ultima'] is None or ultima > actual['ultima']:
+                    actual['ultima'], cambios = ultima, True
+            if cambios:
+                self._guardar()
+
+    def agregar_catalogo(self, nombres):
+        """Registrar ríos del catálogo aunque todavía no tengan observaciones"""
+        with self._lock:
+            nuevos = [nombre for nombre in nombres if nombre not in self._rios]
+            for nombre in nuevos:
+                self._rios[nombre] = {'primera': None, 'ultima': None}
+            if nuevos:
+                self._guardar()
+
+    def todos(self, solo_observados=False):
+        """Nombres de todos los ríos conocidos, ordenados"""
+        self._recargar_si_cambio()
+        with self._lock:
+            return sorted(rio for rio, fechas in self._rios.items()
+                          if not solo_observados or fechas['ultima'] is not None)
+
+    def activos(self, dias):
+        """Ríos con observaciones en los últimos `dias` días"""
+        desde = (date.today() - timedelta(days=dias)).isoformat()
+        self._recargar_si_cambio()
+        with self._lock:
+            return sorted(rio for rio, fechas in self._rios.items()
+                          if fechas['ultima'] is not None and fechas['ultima'] >= desde)
+
+    def fechas(self, rio):
+        """Primera y última fecha observada de un río (o None)"""
+        self._recargar_si_cambio()
+        with self._lock:
+            return dict(self._rios[rio]) if rio in self._rios else None
+
+    def _guardar(self):
+        self.archivo.parent.mkdir(parents=True, exist_ok=True)
+        temporal = self.archivo.with_name(f".{self.archivo.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temporal.write_text(json.dumps(self._rios, ensure_ascii=False, sort_keys=True), encoding='utf-8')
+        os.replace(temporal, self.archivo)
+        self._mtime = self.archivo.stat().st_mtime
+
+
+def mapa_rio_region(df):
+    """Relación río→región de un ListadoRios, normalizada como en el catálogo"""
+    if df is None or df.empty or 'Values_Name' not in df.columns or 'Values_HydroRegion' not in df.columns:
+        return {}
+    df = df.dropna(subset=['Values_Name', 'Values_HydroRegion'])
+    return dict(zip(df['Values_Name'].str.strip().str.upper(), df['Values_HydroRegion'].str.strip().str.title()))
+
+
+class AgregadosCaudal:
+    """
+    Agregados materializados de AporCaudal: totales diarios y mensuales,
+    nacionales, por región y por río.
+
+    La base es el total diario por río, particionado por año
+    ({ruta}/agregados/AporCaudal/diario_rio/{YYYY}.parquet). Cada trozo
+    descargado reemplaza sus días en la base y se recalculan solo esas fechas
+    (tablas diarias) y esos meses (tablas mensuales). Las regiones salen del
+    ListadoRios guardado en el almacén; si cambian, se reagrupan las tablas
+    por región. `sincronizar` agrega los días del almacén que falten (primer
+    uso o una descarga interrumpida). Las vistas leen series ya agregadas, de costo proporcional al
+    número de fechas y no al de filas por río.
+    """
+
+    NIVELES = {'nacional': [], 'region': ['Region'], 'rio': ['Name']}
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self.ruta = almacen.ruta / 'agregados' / 'AporCaudal'
+        self._lock = threading.RLock()
+        self._tablas = {}
+
+    # --- Archivos ---
+
+    def _archivo(self, nombre):
+        return self.ruta / f"{nombre}.parquet"
+
+    def _archivo_anio(self, anio):
+        return self.ruta / 'diario_rio' / f"{anio}.parquet"
+
+    @contextmanager
+    def _bloqueo(self):
+        """Bloqueo entre hilos y, donde se puede, entre procesos (web e ingesta)"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            self.ruta.mkdir(parents=True, exist_ok=True)
+            with open(self.ruta / '.lock', 'w') as candado:
+                fcntl.flock(candado, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(candado, fcntl.LOCK_UN)
+
+    def _leer_tabla(self, nombre, archivo=None):
+        """Leer una tabla; se reutiliza la copia en memoria mientras el archivo no cambie"""
+        archivo = archivo or self._archivo(nombre)
+        try:
+            mtime = archivo.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        guardada = self._tablas.get(nombre)
+        if guardada is not None and guardada[0] == mtime:
+            return guardada[1]
+        df = pd.read_parquet(archivo)
+        self._tablas[nombre] = (mtime, df)
+        return df
+
+    def _escribir_tabla(self, nombre, df, archivo=None):
+        archivo = archivo or self._archivo(nombre)
+        archivo.parent.mkdir(parents=True, exist_ok=True)
+        df = df.reset_index(drop=True)
+        AlmacenLocal._escribir_archivo(archivo, df)
+        self._tablas[nombre] = (archivo.stat().st_mtime, df)
+        self.almacen.marcar_cambio()
+
+    def _leer_anios(self, anios=None):
+        """Base diaria por río de los años dados (todos si es None)"""
+        directorio = self.ruta / 'diario_rio'
+        if anios is None:
+            anios = sorted(int(a.stem) for a in directorio.glob('*.parquet')) if directorio.exists() else []
+        frames = [self._leer_tabla(f"diario_rio/{anio}", self._archivo_anio(anio)) for anio in anios]
+        frames = [df for df in frames if df is not None and not df.empty]
+        if not frames:
+            return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), 'Name': pd.Series(dtype=object),
+                                 'Value': pd.Series(dtype='float64')})
+        return pd.concat(frames, ignore_index=True)
+
+    def _regiones(self):
+        return mapa_rio_region(self.almacen.leer_catalogo('ListadoRios', 'Sistema'))
+
+    # --- Mantenimiento ---
+
+    def actualizar(self, df, start_date, end_date):
+        """Reemplazar los días [inicio, fin] de la base con un trozo de AporCaudal descargado"""
+        self.actualizar_trozos([(df, start_date, end_date)])
+
+    def actualizar_trozos(self, trozos):
+        """
+        Reemplazar en la base los días de varios trozos (df, inicio, fin) y
+        recalcular sus fechas en una sola pasada por año.
+        """
+        rangos, nuevos = [], []
+        for df, start_date, end_date in trozos:
+            inicio, fin = pd.Timestamp(to_date(start_date)), pd.Timestamp(to_date(end_date))
+            diario = self._diario_por_rio(df)
+            nuevos.append(diario[(diario['Date'] >= inicio) & (diario['Date'] <= fin)])
+            rangos.append((inicio, fin))
+        if not rangos:
+            return
+        nuevos = pd.concat(nuevos, ignore_index=True)
+        rangos = [(pd.Timestamp(inicio), pd.Timestamp(fin))
+                  for inicio, fin in rangos_contiguos(sorted(dia.date() for inicio, fin in rangos
+                                                             for dia in pd.date_range(inicio, fin)))]
+        anios = sorted({anio for inicio, fin in rangos for anio in range(inicio.year, fin.year + 1)})
+        with self._bloqueo():
+            for anio in anios:
+                base = self._leer_anios([anio])
+                reemplazados = pd.Series(False, index=base.index)
+                for inicio, fin in rangos:
+                    reemplazados |= (base['Date'] >= inicio) & (base['Date'] <= fin)
+                base = pd.concat([base[~reemplazados], nuevos[nuevos['Date'].dt.year == anio]], ignore_index=True)
+                self._escribir_tabla(f"diario_rio/{anio}", base.sort_values(['Date', 'Name'], kind='stable'),
+                                     self._archivo_anio(anio))
+            regiones = self._regiones()
+            for inicio, fin in rangos:
+                self._recalcular(inicio, fin, regiones)
+
+    def dias_sin_agregar(self, start_date, end_date):
+        """Días del rango que están en el almacén pero todavía no en los agregados"""
+        inicio, fin = pd.Timestamp(to_date(start_date)), pd.Timestamp(to_date(end_date))
+        guardados = self.almacen.dias_guardados('AporCaudal', 'Rio', start_date, end_date)
+        if not guardados:
+            return []
+        nacional = self._recortar(self._leer_tabla('diario_nacional'), inicio, fin)
+        return sorted(guardados - set(nacional['Date'].dt.date))
+
+    def sincronizar(self, start_date, end_date):
+        """Agregar los días del rango que están en el almacén pero no en los agregados"""
+        faltan = self.dias_sin_agregar(start_date, end_date)
+        if not faltan:
+            return
+        trozos = [(self.almacen.leer('AporCaudal', 'Rio', desde, hasta), desde, hasta)
+                  for desde, hasta in rangos_contiguos(faltan)]
+        self.actualizar_trozos(trozos)
+        print(f"Agregados de AporCaudal: {len(faltan)} días agregados desde el almacén")
+
+    @staticmethod
+    def _diario_por_rio(df):
+        if df is None or df.empty or not {'Date', 'Name', 'Value'}.issubset(df.columns):
+            return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), 'Name': pd.Series(dtype=object),
+                                 'Value': pd.Series(dtype='float64')})
+        diario = pd.DataFrame({
+            'Date': pd.to_datetime(df['Date']).dt.normalize(),
+            'Name': df['Name'].astype(object),
+            'Value': pd.to_numeric(df['Value'], errors='coerce').astype('float64'),
+        })
+        return diario.groupby(['Date', 'Name'], as_index=False, sort=True)['Value'].sum()
+
+    def _recalcular(self, inicio, fin, regiones):
+        """Recalcular las fechas [inicio, fin] de las tablas diarias y sus meses en las mensuales"""
+        mes_inicio = inicio.to_period('M').to_timestamp()
+        mes_fin = (fin.to_period('M') + 1).to_timestamp() - pd.Timedelta(days=1)
+        base = self._leer_anios(list(range(mes_inicio.year, mes_fin.year + 1)))
+        base = base[(base['Date'] >= mes_inicio) & (base['Date'] <= mes_fin)].copy()
+        base['Region'] = base['Name'].map(regiones)
+        dias = base[(base['Date'] >= inicio) & (base['Date'] <= fin)]
+        base['Mes'] = base['Date'].dt.to_period('M').dt.to_timestamp()
+
+        for nivel, columnas in self.NIVELES.items():
+            if nivel != 'rio':
+                diario = dias.groupby(['Date'] + columnas, as_index=False, sort=True)['Value'].sum()
+                self._reemplazar(f"diario_{nivel}", diario, inicio, fin)
+            mensual = (base.groupby(['Mes'] + columnas, as_index=False, sort=True)['Value'].sum()
+                       .rename(columns={'Mes': 'Date'}))
+            self._reemplazar(f"mensual_{nivel}", mensual, mes_inicio, mes_fin)
+        self._guardar_regiones(regiones)
+
+    def _reemplazar(self, nombre, filas, inicio, fin):
+        actual = self._leer_tabla(nombre)
+        if actual is not None:
+            actual = actual[(actual['Date'] < inicio) | (actual['Date'] > fin)]
+            filas = pd.concat([actual, filas], ignore_index=True)
+        columnas = [col for col in ('Date', 'Region', 'Name') if col in filas.columns]
+        self._escribir_tabla(nombre, filas.sort_values(columnas, kind='stable'))
+
+    def _guardar_regiones(self, regiones):
+        archivo = self.ruta / 'regiones.json'
+        temporal = archivo.with_name(f".{archivo.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temporal.write_text(json.dumps(regiones, ensure_ascii=False, sort_keys=True), encoding='utf-8')
+        os.replace(temporal, archivo)
+
+    def reagrupar(self):
+        """Recalcular todo si cambió la relación río→región del ListadoRios guardado"""
+        regiones = self._regiones()
+        archivo = self.ruta / 'regiones.json'
+        anteriores = json.loads(archivo.read_text(encoding='utf-8')) if archivo.exists() else None
+        if not regiones or regiones == anteriores:
+            return False
+        with self._bloqueo():
+            base = self._leer_anios()
+            if base.empty:
+                self._guardar_regiones(regiones)
+                return True
+            self._recalcular(base['Date'].min(), base['Date'].max(), regiones)
+        return True
+
+    # --- Lectura ---
+
+    def leer(self, nivel, start_date, end_date, frecuencia='D'):
+        """
+        Serie agregada del rango (Date, [Region|Name], Value). Con frecuencia
+        'M' se devuelve un total por mes (Date = primer día del mes); los
+        meses incompletos de los extremos se suman solo con los días del rango.
+        """
+        if nivel not in self.NIVELES:
+            raise ValueError(f"Nivel de agregación desconocido: {nivel}")
+        inicio, fin = pd.Timestamp(to_date(start_date)), pd.Timestamp(to_date(end_date))
+        if frecuencia == 'D':
+            return self._recortar(self._tabla_diaria(nivel, inicio, fin), inicio, fin)
+
+        mes_inicio = inicio if inicio.day == 1 else (inicio.to_period('M') + 1).to_timestamp()
+        mes_fin = (fin + pd.Timedelta(days=1)).to_period('M').to_timestamp() - pd.Timedelta(days=1)
+        partes = []
+        if mes_inicio <= mes_fin:
+            partes.append(self._recortar(self._leer_tabla(f"mensual_{nivel}"), mes_inicio, mes_fin))
+        for borde_inicio, borde_fin in ((inicio, min(fin, mes_inicio - pd.Timedelta(days=1))),
+                                        (max(inicio, mes_fin + pd.Timedelta(days=1)), fin)):
+            if borde_inicio <= borde_fin:
+                dias = self._recortar(self._tabla_diaria(nivel, borde_inicio, borde_fin), borde_inicio, borde_fin)
+                if dias.empty:
+                    continue
+                dias = dias.assign(Date=dias['Date'].dt.to_period('M').dt.to_timestamp())
+                partes.append(dias.groupby(['Date'] + self.NIVELES[nivel], as_index=False)['Value'].sum())
+        partes = [parte for parte in partes if not parte.empty]
+        if not partes:
+            return self._recortar(None, inicio, fin)
+        columnas = ['Date'] + self.NIVELES[nivel]
+        return pd.concat(partes, ignore_index=True).sort_values(columnas, kind='stable').reset_index(drop=True)
+
+    def leer_sin_escribir(self, nivel, start_date, end_date, frecuencia='D'):
+        """
+        Como `leer`, pero sin tocar los archivos (workers de solo lectura: los
+        agregados los mantiene la ingesta). Los días del almacén que la ingesta
+        aún no agregó se suman en memoria a lo materializado.
+        """
+        agregada = self.leer(nivel, start_date, end_date, frecuencia)
+        faltan = self.dias_sin_agregar(start_date, end_date)
+        if not faltan:
+            return agregada
+        columnas = ['Date'] + self.NIVELES[nivel]
+        partes = [agregada] if not agregada.empty else []
+        regiones = self._regiones() if nivel == 'region' else None
+        for desde, hasta in rangos_contiguos(faltan):
+            dias = self._diario_por_rio(self.almacen.leer('AporCaudal', 'Rio', desde, hasta))
+            dias = dias[(dias['Date'] >= pd.Timestamp(desde)) & (dias['Date'] <= pd.Timestamp(hasta))]
+            if regiones is not None:
+                dias = dias.assign(Region=dias['Name'].map(regiones))
+            if frecuencia == 'M':
+                dias = dias.assign(Date=dias['Date'].dt.to_period('M').dt.to_timestamp())
+            partes.append(dias.groupby(columnas, as_index=False, sort=True)['Value'].sum())
+        partes = [parte for parte in partes if not parte.empty]
+        if not partes:
+            return agregada
+        # Los días que faltan no están en lo materializado: sumar no cuenta nada dos veces
+        return (pd.concat(partes, ignore_index=True).groupby(columnas, as_index=False, sort=True)['Value'].sum()
+                .reset_index(drop=True))
+
+    def _tabla_diaria(self, nivel, inicio, fin):
+        if nivel == 'rio':
+            return self._leer_anios(list(range(inicio.year, fin.year + 1)))
+        return self._leer_tabla(f"diario_{nivel}")
+
+    def _recortar(self, df, inicio, fin):
+        """Recorte por fecha con búsqueda binaria (las tablas están ordenadas por Date)"""
+        if df is None or df.empty:
+            return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), 'Value': pd.Series(dtype='float64')})
+        fechas = df['Date'].to_numpy()
+        desde = fechas.searchsorted(inicio.to_datetime64(), side='left')
+        hasta = fechas.searchsorted(fin.to_datetime64(), side='right')
+        return df.iloc[desde:hasta].reset_index(drop=True)